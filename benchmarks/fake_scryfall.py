@@ -0,0 +1,179 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import logging
+
+# Local stand-in for the Scryfall API, so benchmarks measure the catalog service and not the internet.
+# Answers the endpoint services/scryfall_api.py uses (POST /cards/collection)
+# with made-up card objects, after a configurable delay, and throttles a configurable share of requests with 429.
+# The image URLs in those cards are served too (GET /images/<size>/<id>.jpg), like Scryfall's image CDN:
+# delayed, but never throttled.
+
+stub_logger = logging.getLogger(__name__)
+stub_logger.setLevel(logging.INFO)
+
+# An 8x11 pixel JPEG; served images are padded to a realistic size with comment segments
+_TINY_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/"
+    "2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAALAAgDASIAAhEBAxEB/8QA"
+    "HwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkK"
+    "FhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXG"
+    "x8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAEC"
+    "AxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOE"
+    "hYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDmqKKK1IP/2Q=="
+)
+
+def fake_card_image(scryfall_id: str, size_bytes: int) -> bytes:
+    """A valid JPEG of about size_bytes, different per card (the catalog service stores images by content)."""
+    padding = (scryfall_id.encode() * (size_bytes // max(1, len(scryfall_id)) + 1))[:max(0, size_bytes - len(_TINY_JPEG))]
+    segments = []
+    for start in range(0, len(padding), 65533): # A COM segment holds at most 65533 bytes
+        block = padding[start:start + 65533]
+        segments.append(b"\xff\xfe" + (len(block) + 2).to_bytes(2, 'big') + block)
+    return _TINY_JPEG[:2] + b"".join(segments) + _TINY_JPEG[2:]
+
+class FakeScryfallServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms: float = 50.0, throttle_rate: float = 0.0, retry_after: str = '1',
+                 image_size_bytes: int = 100_000):
+        super().__init__(address, FakeScryfallHandler)
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.image_size_bytes = image_size_bytes
+        # Tests shape the stub's answers through these: IDs reported as 'not_found', and IDs answered
+        # as double-faced cards (images per face, none at the top level)
+        self.not_found_ids = set()
+        self.double_faced_ids = set()
+        self.collection_batch_sizes = [] # Identifiers per /cards/collection request, in arrival order
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def reset_stats(self) -> dict:
+        with self.stats_lock:
+            stats, self.stats = dict(self.stats), Counter()
+        return stats
+
+class FakeScryfallHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass # One line per request would drown the benchmark output
+
+    def _card(self, scryfall_id: str) -> dict:
+        if scryfall_id in self.server.double_faced_ids:
+            return {
+                "object": "card",
+                "id": scryfall_id,
+                "name": f"Card {scryfall_id[:8]} // Back {scryfall_id[:8]}",
+                "card_faces": [
+                    {"name": f"Card {scryfall_id[:8]}",
+                     "image_uris": {"normal": f"{self.server.base_url}/images/normal/front/{scryfall_id}.jpg"}},
+                    {"name": f"Back {scryfall_id[:8]}",
+                     "image_uris": {"normal": f"{self.server.base_url}/images/normal/back/{scryfall_id}.jpg"}}
+                ]
+            }
+        return {
+            "object": "card",
+            "id": scryfall_id,
+            "name": f"Card {scryfall_id[:8]}",
+            "image_uris": {"normal": f"{self.server.base_url}/images/normal/{scryfall_id}.jpg"}
+        }
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate_latency(self):
+        """Sleeps for the configured latency (+/- 50%)."""
+        time.sleep(self.server.latency_ms / 1000 * random.uniform(0.5, 1.5))
+
+    def _simulate_upstream(self) -> bool:
+        """Sleeps for the configured latency. Returns False if the request was throttled."""
+        self.server.count('requests')
+        self._simulate_latency()
+        if random.random() < self.server.throttle_rate:
+            self.server.count('throttled')
+            self._send_json(429, {"object": "error", "code": "rate_limited", "status": 429},
+                            {"Retry-After": self.server.retry_after})
+            return False
+        return True
+
+    def _send_image(self, scryfall_id: str):
+        body = fake_card_image(scryfall_id, self.server.image_size_bytes)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not (self.path.startswith('/images/') and self.path.endswith('.jpg')):
+            self._send_json(404, {"object": "error", "code": "not_found", "status": 404})
+            return
+        self.server.count('images')
+        self._simulate_latency()
+        self._send_image(self.path.rsplit('/', 1)[-1][:-len('.jpg')])
+
+    def do_POST(self):
+        if self.path != '/cards/collection':
+            self._send_json(404, {"object": "error", "code": "not_found", "status": 404})
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self._simulate_upstream():
+            identifiers = payload.get('identifiers', [])
+            self.server.count('collection_batches')
+            with self.server.stats_lock:
+                self.server.collection_batch_sizes.append(len(identifiers))
+            ids = [identifier['id'] for identifier in identifiers if identifier.get('id')]
+            self._send_json(200, {
+                "object": "list",
+                "not_found": [{"id": scryfall_id} for scryfall_id in ids if scryfall_id in self.server.not_found_ids],
+                "data": [self._card(scryfall_id) for scryfall_id in ids if scryfall_id not in self.server.not_found_ids]
+            })
+
+def start_fake_scryfall(host: str = '127.0.0.1', port: int = 0, latency_ms: float = 50.0,
+                        throttle_rate: float = 0.0, retry_after: str = '1', image_size_bytes: int = 100_000) -> FakeScryfallServer:
+    """Starts the stub on a background thread (port 0 picks a free port) and returns the server."""
+    server = FakeScryfallServer((host, port), latency_ms, throttle_rate, retry_after, image_size_bytes)
+    threading.Thread(target=server.serve_forever, name='fake-scryfall', daemon=True).start()
+    stub_logger.info(f"Fake Scryfall API listening on {server.base_url} "
+                     f"(latency {latency_ms}ms, {throttle_rate:.0%} throttled)")
+    return server
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='[%(asctime)s] %(levelname)s in %(name)s: %(message)s')
+    parser = argparse.ArgumentParser(description="Run a local fake of the Scryfall API.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Mean response delay (default: 50)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of requests answered with 429 (default: 0)")
+    parser.add_argument('--retry-after', default='1', help="Retry-After header sent with 429s (default: 1)")
+    parser.add_argument('--image-size', type=int, default=100_000, help="Bytes per served card image (default: 100000)")
+    args = parser.parse_args()
+    server = start_fake_scryfall('127.0.0.1', args.port, args.latency_ms, args.throttle_rate, args.retry_after,
+                                 args.image_size)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,83 @@
+import csv
+import random
+from collections import namedtuple
+
+# The request mix replayed by run_benchmarks.py, built from the cards of a ManaBox CSV export so the
+# queries hit real names, sets, rarities and cards. Weights approximate how the frontend uses the API:
+# mostly typed searches, the result thumbnails they show, and autocomplete; some filtered searches,
+# the odd decklist check or stats view.
+
+BenchmarkRequest = namedtuple('BenchmarkRequest', ['label', 'method', 'path', 'params', 'json'])
+
+# The fields the frontend asks for (see RESULT_FIELDS in frontend/index.html, with USE_IMAGE_PROXY on):
+# the Scryfall ID instead of the image URL, as images are loaded through /api/images/<scryfall_id>
+RESULT_FIELDS = 'name,set_code,rarity,scryfall_id,oracle_text'
+
+MIX_WEIGHTS = {
+    'search_substring': 35,
+    'search_prefix': 10,
+    'search_structured': 15,
+    'search_counted': 5,
+    'suggest': 20,
+    'image': 25,
+    'lookup': 5,
+    'stats': 10,
+}
+
+def load_collection_sample(csv_path: str) -> dict:
+    """Reads the card names, set codes, rarities and Scryfall IDs the queries are built from."""
+    names, sets, rarities, scryfall_ids = set(), set(), set(), set()
+    with open(csv_path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.DictReader(csv_file):
+            if row.get('Name'):
+                names.add(row['Name'])
+            if row.get('Set code'):
+                sets.add(row['Set code'])
+            if row.get('Rarity'):
+                rarities.add(row['Rarity'])
+            if row.get('Scryfall ID'):
+                scryfall_ids.add(row['Scryfall ID'])
+    if not names:
+        raise ValueError(f"No card names found in {csv_path}.")
+    return {"names": sorted(names), "sets": sorted(sets), "rarities": sorted(rarities), "scryfall_ids": sorted(scryfall_ids)}
+
+def _name_fragment(rng: random.Random, name: str) -> str:
+    words = [word for word in name.split() if len(word) >= 4] or [name]
+    word = rng.choice(words)
+    length = rng.randint(4, max(4, min(8, len(word))))
+    start = rng.randint(0, max(0, len(word) - length))
+    return word[start:start + length]
+
+def _build_request(rng: random.Random, label: str, sample: dict) -> BenchmarkRequest:
+    name = rng.choice(sample["names"])
+    if label == 'search_substring':
+        return BenchmarkRequest(label, 'GET', '/api/cards', {"query": _name_fragment(rng, name), "fields": RESULT_FIELDS}, None)
+    if label == 'search_prefix':
+        return BenchmarkRequest(label, 'GET', '/api/cards', {"query": name[:rng.randint(3, 6)], "mode": "prefix", "fields": RESULT_FIELDS}, None)
+    if label == 'search_structured':
+        query = rng.choice([
+            f"set:{rng.choice(sample['sets'])} r:{rng.choice(sample['rarities'])}",
+            f"set:{rng.choice(sample['sets'])} {_name_fragment(rng, name)}",
+            f"r:{rng.choice(sample['rarities'])} price>{rng.choice([0.5, 1, 2, 5])}",
+            f"is:foil {_name_fragment(rng, name)}",
+        ])
+        return BenchmarkRequest(label, 'GET', '/api/cards', {"query": query, "fields": RESULT_FIELDS}, None)
+    if label == 'search_counted':
+        return BenchmarkRequest(label, 'GET', '/api/cards', {"query": _name_fragment(rng, name)[:3], "count": "estimated", "fields": RESULT_FIELDS}, None)
+    if label == 'suggest':
+        return BenchmarkRequest(label, 'GET', '/api/cards/suggest', {"query": name[:rng.randint(3, 5)]}, None)
+    if label == 'image':
+        # A result grid thumbnail, as the frontend loads it
+        return BenchmarkRequest(label, 'GET', f"/api/images/{rng.choice(sample['scryfall_ids'])}", {"size": "small"}, None)
+    if label == 'lookup':
+        decklist = "\n".join(f"{rng.randint(1, 4)} {card_name}" for card_name in rng.sample(sample["names"], min(15, len(sample["names"]))))
+        return BenchmarkRequest(label, 'POST', '/api/cards/lookup', {}, {"decklist": decklist})
+    if label == 'stats':
+        return BenchmarkRequest(label, 'GET', rng.choice(['/api/stats', '/api/stats/set', '/api/stats/rarity']), {}, None)
+    raise ValueError(f"Unknown request type '{label}'.")
+
+def build_query_mix(sample: dict, count: int, seed: int = 42) -> list[BenchmarkRequest]:
+    """Builds a deterministic list of requests, so cold and warm runs (and baseline runs) replay the same traffic."""
+    rng = random.Random(seed)
+    labels = rng.choices(list(MIX_WEIGHTS), weights=list(MIX_WEIGHTS.values()), k=count)
+    return [_build_request(rng, label, sample) for label in labels]
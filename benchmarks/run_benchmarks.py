@@ -0,0 +1,297 @@
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import logging
+import requests
+
+from fake_scryfall import start_fake_scryfall
+from query_mix import load_collection_sample, build_query_mix, MIX_WEIGHTS
+
+# Load and latency benchmarks for the catalog service. Not tests: they measure the running service.
+#
+# 1. Connects to a local mongod (or starts a throwaway one with --start-mongod) and seeds a separate
+#    benchmark database from a ManaBox CSV with ingestion-script/ingest_data.py.
+# 2. Starts a fake Scryfall API (fake_scryfall.py, including its image CDN) with configurable latency and 429 rate.
+# 3. For every concurrency level, starts a fresh catalog service process with empty caches, replays the
+#    query mix once (cold caches) and once more (warm caches), and records throughput and latency percentiles.
+# 4. Compares the results with the stored baselines and exits with status 1 on a regression.
+
+bench_logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(name)s: %(message)s')
+bench_logger.setLevel(logging.INFO)
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+SERVICE_DIR = os.path.join(REPO_DIR, 'card_catalog_service')
+INGEST_SCRIPT = os.path.join(REPO_DIR, 'ingestion-script', 'ingest_data.py')
+DEFAULT_CSV = os.path.join(REPO_DIR, 'ingestion-script', 'ManaBox_Collection.csv')
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baselines.json')
+# Output of the catalog service processes, kept after the run for troubleshooting
+SERVICE_LOG_PATH = os.path.join(tempfile.gettempdir(), 'mtg-bench-service.log')
+
+BENCHMARK_DB_NAME = 'mtg_benchmark_db' # Never the real collection: the benchmark drops its caches
+SERVICE_START_TIMEOUT_SECONDS = 60
+
+# Default command serving the catalog service; '{port}' is replaced with --service-port.
+DEFAULT_SERVICE_COMMAND = f"{sys.executable} -m flask --app app run --port {{port}} --no-reload --no-debugger --with-threads"
+
+# Metrics compared against the baseline: name -> True if higher is better
+BASELINE_METRICS = {'throughput_rps': True, 'p50_ms': False, 'p95_ms': False}
+# Error rates are compared in absolute terms: fail if they rise by more than this
+ERROR_RATE_TOLERANCE = 0.01
+
+# --- Throwaway MongoDB and seeding ---
+
+def start_mongod(mongod_binary: str, port: int) -> tuple[subprocess.Popen, str]:
+    """Starts a mongod on a temporary data directory. Returns the process and the directory."""
+    db_path = tempfile.mkdtemp(prefix='mtg-bench-mongod-')
+    process = subprocess.Popen([mongod_binary, '--dbpath', db_path, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    bench_logger.info(f"Started throwaway mongod on port {port} (data in {db_path}).")
+    return process, db_path
+
+def wait_for_mongo(host: str, port: int, timeout_seconds: float = 30) -> MongoClient:
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        client = MongoClient(host, port, serverSelectionTimeoutMS=1000)
+        try:
+            client.admin.command('ping')
+            return client
+        except ConnectionFailure:
+            client.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+def seed_database(client: MongoClient, env: dict, csv_path: str, reseed: bool):
+    """Loads the CSV into the benchmark database with the regular ingestion script, unless it is already there."""
+    if reseed:
+        client.drop_database(BENCHMARK_DB_NAME)
+    if client[BENCHMARK_DB_NAME]['cards'].estimated_document_count() > 0:
+        bench_logger.info(f"Benchmark database '{BENCHMARK_DB_NAME}' is already seeded; use --reseed to reload it.")
+        return
+    bench_logger.info(f"Seeding '{BENCHMARK_DB_NAME}' from {csv_path}...")
+    result = subprocess.run([sys.executable, INGEST_SCRIPT, csv_path], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    seeded = client[BENCHMARK_DB_NAME]['cards'].estimated_document_count()
+    if result.returncode != 0 or seeded == 0:
+        raise RuntimeError(f"Seeding the benchmark database failed (exit status {result.returncode}, {seeded} cards written). "
+                           f"Ingestion output:\n{result.stdout[-5000:]}")
+    bench_logger.info(f"Seeded {seeded} cards.")
+
+def clear_service_caches(client: MongoClient, image_store_dir: str):
+    """Drops the shared image URL cache and the stored images, so the next service process starts completely cold."""
+    client[BENCHMARK_DB_NAME]['scryfall_cache'].drop()
+    shutil.rmtree(image_store_dir, ignore_errors=True)
+
+# --- Catalog service process ---
+
+def start_service(command: str, port: int, env: dict, log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, 'ab')
+    process = subprocess.Popen(command.format(port=port).split(), cwd=SERVICE_DIR, env=env,
+                               stdout=log_file, stderr=subprocess.STDOUT)
+    log_file.close()
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVICE_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Catalog service exited with status {process.returncode}; see {log_path}.")
+        try:
+            # Ready once the database is reachable and the autocomplete index is loaded
+            if (requests.get(f"{base_url}/health", timeout=1).status_code == 200
+                    and requests.get(f"{base_url}/api/cards/suggest", params={"query": "a"}, timeout=1).status_code != 503):
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.25)
+    stop_service(process)
+    raise RuntimeError(f"Catalog service did not become ready within {SERVICE_START_TIMEOUT_SECONDS}s; see {log_path}.")
+
+def stop_service(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+# --- Load generation ---
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: list[float], elapsed_seconds: float, errors: int) -> dict:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 2),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 2),
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+    }
+
+def replay(base_url: str, mix: list, concurrency: int) -> dict:
+    """Sends every request of the mix with the given number of concurrent clients."""
+    sessions = threading.local()
+
+    def send(bench_request):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = sessions.session.request(bench_request.method, base_url + bench_request.path,
+                                                params=bench_request.params, json=bench_request.json, timeout=30)
+            response.content # Include reading the body in the latency
+            ok = response.status_code < 400 or response.status_code == 404 # 404: no cards matched
+        except requests.exceptions.RequestException:
+            ok = False
+        return bench_request.label, time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, mix)) # (label, latency, ok) per request
+    elapsed = time.perf_counter() - started
+
+    report = summarize([latency for _, latency, _ in results], elapsed, sum(1 for _, _, ok in results if not ok))
+    report["by_type"] = {}
+    for label in MIX_WEIGHTS:
+        typed = [(latency, ok) for result_label, latency, ok in results if result_label == label]
+        if typed:
+            report["by_type"][label] = summarize([latency for latency, _ in typed], elapsed,
+                                                 sum(1 for _, ok in typed if not ok))
+            del report["by_type"][label]["throughput_rps"] # Not meaningful for a slice of a mixed run
+    return report
+
+# --- Baselines ---
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a description of every metric that regressed past the tolerance."""
+    regressions = []
+    for run_name, run in results["runs"].items():
+        expected = baseline.get("runs", {}).get(run_name)
+        if expected is None:
+            bench_logger.warning(f"No baseline for run '{run_name}'; not compared.")
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            if higher_is_better and run[metric] < expected[metric] * (1 - tolerance):
+                regressions.append(f"{run_name}: {metric} {run[metric]} < baseline {expected[metric]} (-{tolerance:.0%} allowed)")
+            elif not higher_is_better and run[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(f"{run_name}: {metric} {run[metric]} > baseline {expected[metric]} (+{tolerance:.0%} allowed)")
+        if run["error_rate"] > expected["error_rate"] + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{run_name}: error_rate {run['error_rate']} > baseline {expected['error_rate']}")
+    return regressions
+
+def print_report(results: dict):
+    print()
+    print(f"{'run':<16}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'scryfall':>10}{'429s':>7}{'images':>8}")
+    for run_name, run in results["runs"].items():
+        print(f"{run_name:<16}{run['requests']:>10}{run['throughput_rps']:>10}{run['p50_ms']:>10}{run['p95_ms']:>10}"
+              f"{run['p99_ms']:>10}{run['error_rate']:>9.2%}{run['scryfall'].get('requests', 0):>10}{run['scryfall'].get('throttled', 0):>7}"
+              f"{run['scryfall'].get('images', 0):>8}")
+    print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the catalog service against a seeded MongoDB and a fake Scryfall API.")
+    parser.add_argument('--mongo-host', default='localhost')
+    parser.add_argument('--mongo-port', type=int, default=27017)
+    parser.add_argument('--start-mongod', metavar='MONGOD_BINARY', nargs='?', const='mongod',
+                        help="Start a throwaway mongod (on --mongo-port, in a temporary directory) instead of using a running one")
+    parser.add_argument('--csv', default=DEFAULT_CSV, help="ManaBox CSV the benchmark database is seeded from")
+    parser.add_argument('--reseed', action='store_true', help="Drop and reload the benchmark database")
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per run (default: 500)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the query mix (default: 42)")
+    parser.add_argument('--scryfall-latency-ms', type=float, default=50.0, help="Mean latency of the fake Scryfall API (default: 50)")
+    parser.add_argument('--scryfall-429-rate', type=float, default=0.02, help="Share of fake Scryfall requests answered with 429 (default: 0.02)")
+    parser.add_argument('--service-port', type=int, default=5055)
+    parser.add_argument('--service-command', default=DEFAULT_SERVICE_COMMAND,
+                        help="Command serving the catalog service from card_catalog_service/, with '{port}' for the port "
+                             "(e.g. 'gunicorn -w 4 -b 127.0.0.1:{port} app:app')")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f"Baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative regression per metric (default: 0.25)")
+    parser.add_argument('--output', help="Also write the full results (including per request type) to this JSON file")
+    args = parser.parse_args()
+
+    mongod_process, mongod_path = None, None
+    if args.start_mongod:
+        mongod_process, mongod_path = start_mongod(args.start_mongod, args.mongo_port)
+    work_dir = tempfile.mkdtemp(prefix='mtg-bench-')
+    open(SERVICE_LOG_PATH, 'wb').close()
+    exit_code = 0
+    try:
+        mongo_client = wait_for_mongo(args.mongo_host, args.mongo_port)
+        scryfall = start_fake_scryfall(latency_ms=args.scryfall_latency_ms, throttle_rate=args.scryfall_429_rate)
+
+        env = dict(os.environ,
+                   MONGO_HOST=args.mongo_host, MONGO_PORT=str(args.mongo_port), MONGO_DB_NAME=BENCHMARK_DB_NAME,
+                   SCRYFALL_API_BASE_URL=scryfall.base_url,
+                   SCRYFALL_RATE_LIMIT_STATE_PATH=os.path.join(work_dir, 'scryfall_rate_limit.state'),
+                   SCRYFALL_CACHE_BACKEND='mongo',
+                   IMAGE_STORE_DIR=os.path.join(work_dir, 'image_store'))
+        seed_database(mongo_client, env, args.csv, args.reseed)
+        mix = build_query_mix(load_collection_sample(args.csv), args.requests, args.seed)
+
+        results = {
+            "settings": {"requests": args.requests, "seed": args.seed, "scryfall_latency_ms": args.scryfall_latency_ms,
+                         "scryfall_429_rate": args.scryfall_429_rate, "service_command": args.service_command},
+            "runs": {}
+        }
+        for concurrency in [int(level) for level in args.concurrency.split(',') if level.strip()]:
+            clear_service_caches(mongo_client, env['IMAGE_STORE_DIR'])
+            service = start_service(args.service_command, args.service_port, env, SERVICE_LOG_PATH)
+            try:
+                for phase in ('cold', 'warm'):
+                    scryfall.reset_stats()
+                    bench_logger.info(f"Replaying {len(mix)} requests, {phase} caches, concurrency {concurrency}...")
+                    run = replay(f"http://127.0.0.1:{args.service_port}", mix, concurrency)
+                    run["scryfall"] = scryfall.reset_stats()
+                    results["runs"][f"{phase}@{concurrency}"] = run
+            finally:
+                stop_service(service)
+
+        print_report(results)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+
+        if args.save_baseline:
+            with open(args.baseline, 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+            bench_logger.info(f"Saved the results as the new baseline in {args.baseline}.")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+            if baseline.get("settings") != results["settings"]:
+                bench_logger.warning(f"Baseline was recorded with different settings ({baseline.get('settings')}); comparison may be meaningless.")
+            regressions = compare_with_baseline(results, baseline, args.tolerance)
+            for regression in regressions:
+                bench_logger.error(f"Regression: {regression}")
+            if regressions:
+                exit_code = 1
+            else:
+                bench_logger.info("No regressions against the baseline.")
+        else:
+            bench_logger.info(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+    finally:
+        if mongod_process is not None:
+            stop_service(mongod_process)
+            shutil.rmtree(mongod_path, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(exit_code)
@@ -1,8 +1,18 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g, Response
 import logging
-from database import initialize_mongodb_connection, close_mongodb_connection # Import database functions
+import os
+import threading
+import time
+import click
+from database import (initialize_mongodb_connection, close_mongodb_connection, get_cards_collection,
+                      on_mongodb_connected, get_mongodb_status) # Import database functions
+from services.card_search import prepare_card_search # Import search index setup
+from services.suggest_index import start_suggest_index, stop_suggest_index # Import the autocomplete index
+from services.image_store import prefetch_card_images # Import the image cache warm-up
 from routes import api_bp # Import the API blueprint
-from config import FRONTEND_ORIGIN # Import the frontend origin for CORS
+from services.metrics import (start_request_timing, finish_request_timing, format_server_timing,
+                              http_request_duration, render_metrics) # Request instrumentation
+from config import FRONTEND_ORIGIN, METRICS_ENABLED # Import the frontend origin for CORS
 from flask_cors import CORS # Import CORS
 
 # --- Flask Application Setup ---
@@ -11,7 +21,10 @@ app = Flask(__name__)
 # --- Configure CORS ---
 # This allows your frontend (FRONTEND_ORIGIN) to make requests to this Flask app.
 # Adjust origins in config.py if your frontend is hosted elsewhere.
-CORS(app, resources={r"/api/*": {"origins": FRONTEND_ORIGIN}})
+# The paging headers of /api/cards have to be exposed explicitly to be readable from JavaScript.
+CORS(app, resources={r"/api/*": {"origins": FRONTEND_ORIGIN}},
+     expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Exact", "Link", "ETag", "X-Cache", "Server-Timing",
+                     "X-Images-Pending"])
 
 # --- Configure Root Logging ---
 # This sets up the basic logging for the entire application.
@@ -21,32 +34,111 @@ logging.basicConfig(level=logging.INFO,
 # Set Flask's default logger level
 app.logger.setLevel(logging.INFO)
 
-# --- Initialize MongoDB Connection at App Startup ---
-# This ensures the database connection is ready before handling requests.
-with app.app_context():
-    initialize_mongodb_connection()
+# --- Per-Process Startup ---
+# Nothing touches MongoDB at import time: under gunicorn the app may be imported before the workers
+# are forked, and neither PyMongo clients nor background threads survive a fork. Instead, each process
+# creates its client and starts its background work when it handles its first request.
+
+# Make sure every card has the normalized search fields and that their indexes exist. Usually the
+# ingest did this already and it costs one metadata lookup; on a dump-loaded database it backfills.
+# Started whenever the database becomes reachable (so an outage at startup only delays it) until it
+# has succeeded once in this process, on its own thread so the health monitor keeps checking meanwhile.
+_search_prepared = False
+_search_setup_thread = None
+
+def _run_search_setup():
+    global _search_prepared
+    _search_prepared = prepare_card_search(get_cards_collection())
+
+def _start_search_setup():
+    global _search_setup_thread
+    if _search_prepared or (_search_setup_thread is not None and _search_setup_thread.is_alive()):
+        return
+    _search_setup_thread = threading.Thread(target=_run_search_setup, name="card-search-setup", daemon=True)
+    _search_setup_thread.start()
+
+on_mongodb_connected(_start_search_setup)
+_started_pid = None
+_startup_lock = threading.Lock()
+
+@app.before_request
+def start_worker_services():
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _startup_lock:
+        if _started_pid != os.getpid():
+            initialize_mongodb_connection()
+            # Load the distinct card names for /api/cards/suggest into memory.
+            start_suggest_index()
+            _started_pid = os.getpid()
 
 # --- Register Blueprints ---
 # This connects the routes defined in routes.py to your Flask app.
 app.register_blueprint(api_bp)
 
+# --- Request Instrumentation ---
+# Times every request and the phases it went through (MongoDB, Scryfall, rate limiter, serialization),
+# reports them in a Server-Timing header and records them for /metrics.
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        start_request_timing()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        timings = finish_request_timing()
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_duration.observe(total, (request.method, endpoint, response.status_code))
+        response.headers['Server-Timing'] = format_server_timing(timings, total)
+        response.headers['Timing-Allow-Origin'] = FRONTEND_ORIGIN # Lets the frontend's devtools show the timings
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Exposes the service's metrics in the Prometheus text format."""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # --- Basic Health Check Endpoint ---
 # This endpoint allows you to check if your service and its database connection are healthy.
+# It reports the result of the last background check (see database.py), so frequent probes
+# don't add load on MongoDB.
 @app.route('/health', methods=['GET'])
 def health_check():
     """Provides a simple health check for the service."""
+    database_status = get_mongodb_status()
+    checked_seconds_ago = round(time.time() - database_status["checked_at"], 1) if database_status["checked_at"] else None
+    if database_status["healthy"]:
+        return jsonify({"status": "ok", "database_connection": "healthy",
+                        "latency_ms": database_status["latency_ms"], "checked_seconds_ago": checked_seconds_ago}), 200
+    if database_status["healthy"] is None:
+        return jsonify({"status": "starting", "database_connection": "not checked yet"}), 503
+    app.logger.warning(f"Health check: Database connection unhealthy. Details: {database_status['error']}")
+    return jsonify({"status": "degraded", "database_connection": f"unhealthy: {database_status['error']}",
+                    "checked_seconds_ago": checked_seconds_ago}), 503
+
+# --- Image Cache Warm-Up ---
+# Downloads every card image of the collection into the local image store, so the frontend never has
+# to wait for Scryfall. Run it after an ingest: `flask --app app prefetch-images`
+# (in Docker: `docker compose exec card-catalog-service flask --app app prefetch-images`).
+@app.cli.command('prefetch-images')
+@click.option('--thumbnails/--no-thumbnails', default=True, help="Also generate the 'small' thumbnails (needs Pillow).")
+@click.option('--workers', default=8, show_default=True, help="Concurrent image downloads.")
+def prefetch_images(thumbnails, workers):
+    """Warms the local image store for the whole collection."""
+    initialize_mongodb_connection()
     try:
-        from database import _mongo_client # Access the global client directly for health check
-        if _mongo_client:
-            _mongo_client.admin.command('ping') # Attempt a simple database operation
-            app.logger.info("Health check: Database connection is healthy.")
-            return jsonify({"status": "ok", "database_connection": "healthy"}), 200
-        else:
-            app.logger.warning("Health check: Database connection not established at service startup.")
-            return jsonify({"status": "degraded", "database_connection": "not established"}), 500
-    except Exception as e:
-        app.logger.error(f"Health check: Database connection unhealthy. Details: {e}", exc_info=True)
-        return jsonify({"status": "degraded", "database_connection": f"unhealthy: {e}"}), 500
+        sizes = ('normal', 'small') if thumbnails else ('normal',)
+        stats = prefetch_card_images(get_cards_collection(), sizes, workers)
+        click.echo(f"Images stored: {stats['stored']}, already cached: {stats['skipped']}, "
+                   f"without image: {stats['no_image']}, failed: {stats['failed']}.")
+    finally:
+        close_mongodb_connection()
 
 # --- Run the Flask Application ---
 if __name__ == '__main__':
@@ -56,5 +148,6 @@ if __name__ == '__main__':
         app.run(debug=True, host='0.0.0.0', port=5000)
     finally:
         # Ensure MongoDB connection is closed when the app shuts down,
-        # preventing resource leaks.
+        # preventing resource leaks. The suggest refresher is stopped first, as it reads from MongoDB.
+        stop_suggest_index(timeout=5)
         close_mongodb_connection()
\ No newline at end of file
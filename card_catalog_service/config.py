@@ -1,9 +1,30 @@
+import os
+import tempfile
+
 # MongoDB Connection Details
 # These should match your local MongoDB setup
-MONGO_HOST = 'mongodb'
-MONGO_PORT = 27017
-DB_NAME = 'mtg_collection_db'
+# Can be overridden through the environment, e.g. to run against a throwaway benchmark database.
+MONGO_HOST = os.environ.get('MONGO_HOST', 'mongodb')
+MONGO_PORT = int(os.environ.get('MONGO_PORT', 27017))
+DB_NAME = os.environ.get('MONGO_DB_NAME', 'mtg_collection_db')
+# Connection pool of each worker process's client (see database.py). With gunicorn, every worker
+# has its own pool, so the server sees up to workers * MONGO_MAX_POOL_SIZE connections.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 20))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+# How long a request waits for a free pooled connection before failing (milliseconds)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+# 'primary', 'primaryPreferred', 'secondary', 'secondaryPreferred' or 'nearest' (replica sets only)
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+# The connection is checked in the background; /health reports the last result.
+MONGO_HEALTH_CHECK_INTERVAL_SECONDS = float(os.environ.get('MONGO_HEALTH_CHECK_INTERVAL_SECONDS', 10))
+MONGO_RECONNECT_INTERVAL_SECONDS = float(os.environ.get('MONGO_RECONNECT_INTERVAL_SECONDS', 2)) # While unreachable
 COLLECTION_NAME = 'cards'
+SCRYFALL_CACHE_COLLECTION_NAME = 'scryfall_cache' # Shared image URL cache (see SCRYFALL_CACHE_BACKEND)
+METADATA_COLLECTION_NAME = 'collection_metadata' # Holds the data version stamp bumped by each ingest
+STATS_COLLECTION_NAME = 'collection_stats' # Summaries maintained by ingest_data.py, served by /api/stats
+# Breakdowns available under /api/stats/<dimension> (see ingestion-script/collection_stats.py)
+STATS_DIMENSIONS = ('set', 'rarity', 'foil', 'binder')
 
 # --- Optional: MongoDB Authentication (uncomment and fill if enabled) ---
 # MONGO_USER = 'mtgAdmin'
@@ -12,13 +33,110 @@ COLLECTION_NAME = 'cards'
 
 # --- Scryfall API Configuration ---
 # Base URL for Scryfall API
-SCRYFALL_API_BASE_URL = "https://api.scryfall.com"
+# Can be overridden through the environment, e.g. to point at a local stub server while testing.
+SCRYFALL_API_BASE_URL = os.environ.get('SCRYFALL_API_BASE_URL', "https://api.scryfall.com")
 # Scryfall recommends a User-Agent. Replace with your app's name/version.
 SCRYFALL_USER_AGENT = "MTGCardApp/1.0"
-# Scryfall rate limit: 10 requests per second. We'll add a small delay.
-SCRYFALL_REQUEST_DELAY_SECONDS = 0.11 # Slightly more than 0.1 to be safe (1/10 RPS = 0.1s per request)
+# Scryfall rate limit: 10 requests per second. We stay slightly below it.
+# This budget is shared by every thread and worker process through a token bucket (see services/rate_limiter.py).
+SCRYFALL_RATE_LIMIT_PER_SECOND = 9
+SCRYFALL_RATE_LIMIT_BURST = 5 # Requests that may go out back-to-back after an idle period
+# State file the workers coordinate through; all workers on a host must point at the same path.
+SCRYFALL_RATE_LIMIT_STATE_PATH = os.environ.get('SCRYFALL_RATE_LIMIT_STATE_PATH',
+                                                os.path.join(tempfile.gettempdir(), 'mtg_scryfall_rate_limit.state'))
+# Retries for 429 and 5xx responses, with jittered exponential backoff (Retry-After takes precedence).
+SCRYFALL_MAX_RETRIES = 3
+SCRYFALL_BACKOFF_BASE_SECONDS = 0.5
+SCRYFALL_BACKOFF_MAX_SECONDS = 10
+# Longest pause honored from a Retry-After header (seconds). A 429 pauses every worker, so a bogus
+# header (e.g. 'Retry-After: 86400') must not stop image lookups for longer than this.
+SCRYFALL_RETRY_AFTER_MAX_SECONDS = 60
+# Scryfall's /cards/collection endpoint accepts at most 75 identifiers per request.
+SCRYFALL_COLLECTION_BATCH_SIZE = 75
+# Timeout (seconds) for requests to the Scryfall API.
+SCRYFALL_REQUEST_TIMEOUT_SECONDS = 5
+# Size of the pooled keep-alive connection pool used for Scryfall requests.
+SCRYFALL_POOL_MAXSIZE = 10
+# Background threads fetching image URLs that aren't cached yet (see services/scryfall_api.py).
+SCRYFALL_RESOLVER_THREADS = 4
+# How long a request waits for uncached image URLs (seconds). Cards still unresolved by then are
+# answered with IMAGE_PLACEHOLDER_URL and the fetch finishes in the background for the next request.
+IMAGE_RESOLUTION_DEADLINE_SECONDS = float(os.environ.get('IMAGE_RESOLUTION_DEADLINE_SECONDS', 1.0))
+# Image URL sent for cards whose image isn't resolved yet (None: the frontend shows 'No Image').
+IMAGE_PLACEHOLDER_URL = os.environ.get('IMAGE_PLACEHOLDER_URL') or None
+
+# --- Scryfall Image URL Cache ---
+# Where resolved image URLs are stored so every worker (and every restart) starts warm:
+# 'mongo' (the 'scryfall_cache' collection), 'sqlite' (a local file) or 'memory' (per-process only).
+SCRYFALL_CACHE_BACKEND = os.environ.get('SCRYFALL_CACHE_BACKEND', 'mongo')
+SCRYFALL_CACHE_SQLITE_PATH = os.environ.get('SCRYFALL_CACHE_SQLITE_PATH', 'scryfall_cache.sqlite3')
+SCRYFALL_CACHE_TTL_SECONDS = 7 * 24 * 3600 # Image URLs rarely change; refresh them weekly
+SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS = 600 # Failed lookups (404/429/timeout) are retried after 10 minutes
+SCRYFALL_CACHE_MAX_ENTRIES = 50000 # Entries expiring soonest are evicted beyond this size
+# Small per-process cache in front of the shared backend, to avoid a round-trip for hot cards.
+SCRYFALL_CACHE_L1_MAXSIZE = 1024
+SCRYFALL_CACHE_L1_TTL_SECONDS = 300
+# If the shared backend can't be set up (e.g. MongoDB is briefly unreachable), retry after this long (seconds).
+SCRYFALL_CACHE_BACKEND_RETRY_SECONDS = 30
+
+# --- Local Image Store ---
+# Card image files served by /api/images/<scryfall_id>, so page loads don't depend on Scryfall's CDN
+# (see services/image_store.py). Warm it after an ingest with `flask --app app prefetch-images`.
+IMAGE_STORE_DIR = os.environ.get('IMAGE_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_store'))
+# Least recently used images are deleted beyond this total size (bytes).
+IMAGE_STORE_MAX_BYTES = int(os.environ.get('IMAGE_STORE_MAX_BYTES', 2 * 1024 ** 3))
+# Width (px) of the 'small' thumbnails used by the result grid. Needs Pillow; without it, full images are served.
+IMAGE_THUMBNAIL_WIDTH = 244
+# How long browsers may reuse an image without revalidating it (seconds). Card images rarely change.
+IMAGE_STORE_MAX_AGE_SECONDS = 7 * 24 * 3600
+# Downloads larger than this (bytes) are rejected; Scryfall's 'normal' images are around 100 KB.
+IMAGE_DOWNLOAD_MAX_BYTES = 5 * 1024 * 1024
+
+# --- Card Name Search ---
+# Default search mode for /api/cards: 'substring' (trigram index), 'prefix' (index range scan).
+CARD_SEARCH_DEFAULT_MODE = os.environ.get('CARD_SEARCH_DEFAULT_MODE', 'substring')
+# The old unindexed case-insensitive $regex search, kept for comparing results ('mode=regex').
+CARD_SEARCH_LEGACY_REGEX_ENABLED = os.environ.get('CARD_SEARCH_LEGACY_REGEX_ENABLED', 'false').lower() == 'true'
+# Debugging aid: lets '/api/cards?...&explain=true' return the compiled filter and MongoDB's query plan.
+CARD_SEARCH_EXPLAIN_ENABLED = os.environ.get('CARD_SEARCH_EXPLAIN_ENABLED', 'false').lower() == 'true'
+# How often the list of existing indexes (the only ones structured queries may hint) is re-read (seconds).
+CARD_SEARCH_INDEX_REFRESH_SECONDS = 30
+
+# --- Result Paging ---
+CARD_PAGE_DEFAULT_LIMIT = 20
+CARD_PAGE_MAX_LIMIT = 100
+# 'count=estimated' stops counting matches at this number, so it stays cheap on broad queries.
+CARD_COUNT_ESTIMATE_CAP = 1000
+
+# --- Response Cache ---
+# Memory budget (bytes of response bodies) of the in-process /api/cards response cache.
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Cached responses are dropped when the data version changes, and at the latest after this long
+# (they embed image URLs that may have been unavailable when the response was built).
+RESPONSE_CACHE_TTL_SECONDS = 600
+# How long the data version read from MongoDB is trusted before it is read again (seconds).
+DATA_VERSION_CHECK_INTERVAL_SECONDS = 5
+# Browsers and proxies may store responses but must revalidate them with the ETag (cheap 304s).
+RESPONSE_CACHE_CONTROL = 'public, no-cache'
+
+# --- Decklist Lookup ---
+# Upper bound on distinct cards in one /api/cards/lookup request (a 100-card deck plus sideboard fits easily).
+DECKLIST_MAX_ENTRIES = 250
+
+# --- Autocomplete Suggestions ---
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+# How often the in-process suggestion index checks the data version for changes (seconds).
+SUGGEST_REFRESH_INTERVAL_SECONDS = 30
+SUGGEST_RETRY_INTERVAL_SECONDS = 2 # Until the first build succeeded (e.g. while MongoDB is unreachable)
+# Minimum share (0-1) of the query's trigrams a name must contain to count as a typo-tolerant match.
+SUGGEST_MIN_SIMILARITY = 0.5
 
 # --- Frontend CORS Origin ---
 # IMPORTANT: Replace 'http://localhost:8000' with the actual URL your frontend is served from.
 # If you deploy your frontend to a different IP or domain, this MUST be updated.
-FRONTEND_ORIGIN = 'http://localhost'
\ No newline at end of file
+FRONTEND_ORIGIN = 'http://localhost'
+
+# --- Instrumentation ---
+# Per-request phase timings (Server-Timing header) and the Prometheus /metrics endpoint.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
\ No newline at end of file
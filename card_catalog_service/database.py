@@ -1,78 +1,202 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 import logging # Use standard logging here as this module doesn't depend on Flask's app.logger
+import os
+import threading
+import time
 
 # Import configuration from config.py
-from config import MONGO_HOST, MONGO_PORT, DB_NAME, COLLECTION_NAME
+from config import (MONGO_HOST, MONGO_PORT, DB_NAME, COLLECTION_NAME, SCRYFALL_CACHE_COLLECTION_NAME,
+                    METADATA_COLLECTION_NAME, STATS_COLLECTION_NAME, METRICS_ENABLED,
+                    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_READ_PREFERENCE,
+                    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_HEALTH_CHECK_INTERVAL_SECONDS, MONGO_RECONNECT_INTERVAL_SECONDS)
+from services.metrics import MongoCommandTimer, MongoPoolMetrics
 # from config import MONGO_USER, MONGO_PASS, MONGO_AUTH_SOURCE # Uncomment if using authentication
 
 # Setup a logger for this module
 db_logger = logging.getLogger(__name__)
 db_logger.setLevel(logging.INFO)
 
-# Global variables to hold the MongoDB client and collection instance
+# The MongoDB client of this process. PyMongo clients must not be shared across fork(), so the client
+# is created lazily, on first use, by the process that uses it (i.e. in each gunicorn worker after the fork),
+# and forgotten in a forked child (see _reset_after_fork below).
 _mongo_client = None
-_cards_collection = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# Result of the last background health check, served by /health without touching the database.
+# 'healthy' is None until the first check has finished.
+_status = {"healthy": None, "checked_at": None, "latency_ms": None, "error": None}
+_status_lock = threading.Lock()
+_monitor_thread = None
+_monitor_stop = threading.Event() # Set by close_mongodb_connection()
+_connected_callbacks = [] # Run by the monitor each time the database becomes reachable
+
+def _create_client() -> MongoClient:
+    """Creates a client without connecting; the driver connects (and reconnects) in the background."""
+    # With metrics enabled, the driver reports command timings and pool usage (see services/metrics.py).
+    event_listeners = [MongoCommandTimer(), MongoPoolMetrics()] if METRICS_ENABLED else []
+    return MongoClient(
+        MONGO_HOST, MONGO_PORT,
+        connect=False,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        readPreference=MONGO_READ_PREFERENCE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=event_listeners
+    )
+    # If you enabled authentication, also pass:
+    #     username=MONGO_USER,
+    #     password=MONGO_PASS,
+    #     authSource=MONGO_AUTH_SOURCE,
+
+def get_mongo_client() -> MongoClient:
+    """
+    Returns this process's MongoDB client, creating it (and starting the health monitor) on first use.
+    """
+    global _mongo_client, _client_pid
+    if _mongo_client is not None and _client_pid == os.getpid():
+        return _mongo_client
+    with _client_lock:
+        if _mongo_client is None or _client_pid != os.getpid():
+            _mongo_client = _create_client()
+            _client_pid = os.getpid()
+            db_logger.info(f"Database: created MongoDB client for '{MONGO_HOST}:{MONGO_PORT}' in process {_client_pid} "
+                           f"(pool {MONGO_MIN_POOL_SIZE}-{MONGO_MAX_POOL_SIZE}, read preference '{MONGO_READ_PREFERENCE}').")
+            _start_monitor()
+    return _mongo_client
+
+def _reset_after_fork():
+    """Forgets the parent's client and monitor in a forked child; the child creates its own on first use."""
+    global _mongo_client, _client_pid, _monitor_thread, _monitor_stop, _client_lock, _status_lock
+    _mongo_client = None # Not closed: its sockets and threads belong to the parent
+    _client_pid = None
+    _monitor_thread = None
+    _monitor_stop = threading.Event()
+    _client_lock = threading.Lock()
+    _status_lock = threading.Lock()
+    _status.update({"healthy": None, "checked_at": None, "latency_ms": None, "error": None})
+
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 def initialize_mongodb_connection():
     """
-    Initializes the MongoDB client and collection.
-    This function should be called once at application startup.
+    Creates the MongoDB client of this process and starts checking the connection in the background.
+    Doesn't wait for the database: requests fail fast while it is known to be unreachable,
+    and the service recovers by itself once it is back.
     """
-    global _mongo_client, _cards_collection
+    get_mongo_client()
 
-    if _mongo_client is not None:
-        db_logger.info("MongoDB client already initialized. Skipping re-initialization.")
-        return
+# --- Background health monitor ---
 
+def check_mongodb_connection(client: MongoClient | None = None) -> bool:
+    """Pings MongoDB once (with this process's client by default) and records the result as the cached status."""
+    started = time.perf_counter()
     try:
-        # Connect to MongoDB
-        # For local setup without authentication:
-        _mongo_client = MongoClient(MONGO_HOST, MONGO_PORT, serverSelectionTimeoutMS=5000)
-
-        # If you enabled authentication, use this instead:
-        # _mongo_client = MongoClient(
-        #     MONGO_HOST, MONGO_PORT,
-        #     username=MONGO_USER,
-        #     password=MONGO_PASS,
-        #     authSource=MONGO_AUTH_SOURCE,
-        #     serverSelectionTimeoutMS=5000
-        # )
-
-        # The ping command verifies that the connection is actually established
-        _mongo_client.admin.command('ping')
-        db = _mongo_client[DB_NAME]
-        _cards_collection = db[COLLECTION_NAME]
-        db_logger.info(f"Database: Successfully connected to MongoDB database '{DB_NAME}' and collection '{COLLECTION_NAME}'.")
+        (client or get_mongo_client()).admin.command('ping')
+        healthy, error = True, None
     except ConnectionFailure as cf:
-        db_logger.error(f"Database ERROR: MongoDB Connection Failure. "
-                        f"Is the server running? Check host/port '{MONGO_HOST}:{MONGO_PORT}'. Details: {cf}")
-        _mongo_client = None
-        _cards_collection = None
+        healthy, error = False, f"connection failure: {cf}"
     except OperationFailure as of:
-        db_logger.error(f"Database ERROR: MongoDB Operation Failure (e.g., Authentication/Permissions). "
-                        f"Check username/password if authentication is enabled. Details: {of}")
-        _mongo_client = None
-        _cards_collection = None
+        # E.g. authentication/permissions
+        healthy, error = False, f"operation failure: {of}"
     except Exception as e:
-        db_logger.error(f"Database ERROR: An unexpected error occurred during MongoDB initialization. Details: {e}", exc_info=True)
-        _mongo_client = None
-        _cards_collection = None
+        healthy, error = False, f"unexpected error: {e}"
+    with _status_lock:
+        was_healthy = _status["healthy"]
+        _status.update({"healthy": healthy, "checked_at": time.time(), "error": error,
+                        "latency_ms": round((time.perf_counter() - started) * 1000, 2) if healthy else None})
+    if healthy and not was_healthy:
+        db_logger.info(f"Database: connected to MongoDB database '{DB_NAME}' at '{MONGO_HOST}:{MONGO_PORT}'.")
+        for callback in list(_connected_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                db_logger.error(f"Database: error in connection callback {callback.__name__}. Details: {e}", exc_info=True)
+    elif not healthy and was_healthy is not False:
+        db_logger.error(f"Database ERROR: MongoDB is unreachable at '{MONGO_HOST}:{MONGO_PORT}'; "
+                        f"retrying every {MONGO_RECONNECT_INTERVAL_SECONDS}s. Details: {error}")
+    return healthy
+
+def _monitor_loop(client: MongoClient, stop: threading.Event):
+    # Pings the client it was started for, so it never creates a new one after close_mongodb_connection()
+    while not stop.is_set():
+        healthy = check_mongodb_connection(client)
+        stop.wait(MONGO_HEALTH_CHECK_INTERVAL_SECONDS if healthy else MONGO_RECONNECT_INTERVAL_SECONDS)
+
+def _start_monitor():
+    global _monitor_thread, _monitor_stop
+    if _monitor_thread is None or not _monitor_thread.is_alive():
+        _monitor_stop = threading.Event()
+        _monitor_thread = threading.Thread(target=_monitor_loop, args=(_mongo_client, _monitor_stop),
+                                           name="mongodb-health-monitor", daemon=True)
+        _monitor_thread.start()
+
+def on_mongodb_connected(callback):
+    """
+    Registers a function run (on the monitor thread) whenever the database becomes reachable:
+    at startup and after every outage, in every worker process. E.g. index setup.
+    """
+    _connected_callbacks.append(callback)
+
+def get_mongodb_status() -> dict:
+    """Returns the cached result of the last health check (no database round-trip)."""
+    with _status_lock:
+        return dict(_status)
+
+# --- Collections ---
+
+def _get_collection(name: str):
+    """
+    Returns a collection of the service's database.
+    Raises ConnectionError while the health monitor knows the database to be unreachable,
+    so requests fail fast instead of each waiting for the server selection timeout.
+    """
+    client = get_mongo_client()
+    if _status["healthy"] is False:
+        db_logger.error(f"Attempted to use the '{name}' collection while MongoDB is unreachable.")
+        raise ConnectionError(f"MongoDB is unreachable: {_status['error']}")
+    return client[DB_NAME][name]
 
 def get_cards_collection():
     """
     Returns the MongoDB cards collection instance.
-    Raises an error if the connection has not been successfully initialized.
+    Raises an error if the database is currently unreachable.
+    """
+    return _get_collection(COLLECTION_NAME)
+
+def get_scryfall_cache_collection():
+    """
+    Returns the MongoDB collection used as the shared Scryfall image URL cache.
+    Raises an error if the database is currently unreachable.
+    """
+    return _get_collection(SCRYFALL_CACHE_COLLECTION_NAME)
+
+def get_data_version() -> int:
+    """
+    Returns the data version of the cards collection. ingest_data.py increments it after
+    every ingest, so in-process indexes and caches can tell when the collection changed.
+    Returns 0 if no ingest has stamped a version yet.
+    """
+    metadata = _get_collection(METADATA_COLLECTION_NAME).find_one({"_id": COLLECTION_NAME}, {"data_version": 1})
+    return metadata.get("data_version", 0) if metadata else 0
+
+def get_stats_collection():
+    """
+    Returns the MongoDB collection holding the precomputed collection statistics.
+    Raises an error if the database is currently unreachable.
     """
-    if _cards_collection is None:
-        db_logger.error("Attempted to get cards_collection before MongoDB connection was established.")
-        raise ConnectionError("MongoDB cards collection is not initialized. Database connection failed.")
-    return _cards_collection
+    return _get_collection(STATS_COLLECTION_NAME)
 
 def close_mongodb_connection():
-    """Closes the MongoDB client connection if it's open."""
-    global _mongo_client
-    if _mongo_client:
+    """Stops the health monitor and closes the MongoDB client connection if it's open."""
+    global _mongo_client, _monitor_thread
+    if _mongo_client is not None and _client_pid == os.getpid():
+        _monitor_stop.set()
+        if _monitor_thread is not None and _monitor_thread is not threading.current_thread():
+            _monitor_thread.join(timeout=MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000 + 1) # At most one ping in flight
+        _monitor_thread = None
         _mongo_client.close()
         _mongo_client = None
-        db_logger.info("MongoDB connection closed.")
\ No newline at end of file
+        db_logger.info("MongoDB connection closed.")
@@ -0,0 +1,16 @@
+import os
+
+# Gunicorn settings for the catalog service (see Dockerfile.backend).
+# Run with: gunicorn -c gunicorn.conf.py app:app
+# Every setting can be overridden through the environment.
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+# Worker processes, each with its own MongoDB client and pool (created after the fork, see database.py)
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# Threads per worker: requests mostly wait on MongoDB and Scryfall, so threads keep a worker busy cheaply.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Safe either way: nothing connects to MongoDB or starts threads at import time.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') # e.g. '-' for stdout; off by default
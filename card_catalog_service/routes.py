@@ -1,7 +1,21 @@
-from flask import Blueprint, request, jsonify
-from database import get_cards_collection # Import the function to get the collection
+from flask import Blueprint, request, jsonify, url_for, Response, send_file
+from bson import json_util
+from database import get_cards_collection, get_stats_collection # Import the functions to get the collections
 import logging # Use standard logging here
-from services.scryfall_api import get_card_image_url # Import the new function for images
+from services.scryfall_api import resolve_card_image_urls # Import the batch function for images
+from services.card_search import SEARCH_MODES, SEARCH_FIELDS_EXCLUDED_PROJECTION, CARD_RESPONSE_FIELDS, get_existing_indexes
+from services.query_language import parse_query, plan_query, QuerySyntaxError
+from services.pagination import PAGE_SORT, apply_cursor, encode_cursor, InvalidCursorError
+from services.suggest_index import suggest_index
+from services.response_cache import cached_json_response
+from services.metrics import timed
+from services.image_store import get_card_image_file, ImageUnavailableError, IMAGE_SIZES, SCRYFALL_ID_PATTERN
+from services.decklist import parse_decklist, build_lookup_pipeline, match_lookup_results, DecklistParseError
+from config import (CARD_SEARCH_DEFAULT_MODE, CARD_SEARCH_LEGACY_REGEX_ENABLED, CARD_SEARCH_EXPLAIN_ENABLED,
+                    CARD_PAGE_DEFAULT_LIMIT, CARD_PAGE_MAX_LIMIT, CARD_COUNT_ESTIMATE_CAP,
+                    SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT, SUGGEST_MIN_SIMILARITY, STATS_DIMENSIONS,
+                    DECKLIST_MAX_ENTRIES, IMAGE_RESOLUTION_DEADLINE_SECONDS, IMAGE_PLACEHOLDER_URL,
+                    IMAGE_STORE_MAX_AGE_SECONDS)
 
 # Create a Blueprint for your API routes
 # Blueprints help organize routes into modular components
@@ -11,11 +25,36 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 routes_logger = logging.getLogger(__name__)
 routes_logger.setLevel(logging.INFO)
 
+def _search_cache_key():
+    """
+    Response cache key for /api/cards: all query parameters, with the search query in its canonical
+    spelling, so 'Bolt r:rare' and ' bolt  rarity:Rare' share one cache entry.
+    """
+    args = {name: value.strip() for name, value in request.args.items() if value.strip()}
+    args['mode'] = args.get('mode', CARD_SEARCH_DEFAULT_MODE).lower()
+    if 'query' in args:
+        try:
+            args['query'] = parse_query(args['query']).canonical(normalize_text=args['mode'] != 'regex')
+        except QuerySyntaxError:
+            pass # Answered with a 400, which isn't cached
+    return tuple(sorted(args.items()))
+
 @api_bp.route('/cards', methods=['GET'])
+@cached_json_response(_search_cache_key)
 def search_cards():
     """
     Handles GET requests to search for Magic: The Gathering cards.
     Expects a 'query' parameter in the URL (e.g., /api/cards?query=lightning)
+    The query may also filter on card fields, e.g. 'set:KHC r:rare is:foil price>1 lang:en bolt'
+    (see services/query_language.py for the syntax).
+    Optional parameters:
+    - 'mode': how the name text is matched: 'substring' (default), 'prefix', or 'regex' (legacy, if enabled in config).
+    - 'limit': page size (default 20); 'cursor': the X-Next-Cursor header of the previous page.
+    - 'fields': comma-separated card fields to return (e.g. fields=name,set_code,image_url).
+    - 'count': 'exact' or 'estimated' to get the number of matches in the X-Total-Count header.
+    - 'explain': 'true' returns the compiled filter and query plan instead of cards (if enabled in config).
+    The response body stays a plain list of cards; paging details are sent as headers.
+    Responses are cached per normalized query until the next ingest, and carry an ETag for 304s.
     """
     try:
         cards_collection = get_cards_collection() # Get the initialized collection
@@ -29,40 +68,304 @@ def search_cards():
         routes_logger.warning("Search request received with no 'query' parameter.")
         return jsonify({"message": "Please provide a 'query' parameter."}), 400
 
-    routes_logger.info(f"Received search query: '{search_query}'")
+    search_mode = request.args.get('mode', CARD_SEARCH_DEFAULT_MODE).strip().lower()
+    if search_mode not in SEARCH_MODES or (search_mode == 'regex' and not CARD_SEARCH_LEGACY_REGEX_ENABLED):
+        routes_logger.warning(f"Search request received with unsupported mode '{search_mode}'.")
+        return jsonify({"message": f"Unsupported search mode '{search_mode}'."}), 400
 
     try:
-        # Use a case-insensitive regex search for card names
-        # For more complex searches, you'd build a more sophisticated query
-        query_filter = {"name": {"$regex": search_query, "$options": "i"}}
-        
-        # Find documents matching the query, limit to a reasonable number for display
-        # In a real app, you'd implement pagination if dealing with many results
-        found_cards = list(cards_collection.find(query_filter).limit(20))
+        limit = int(request.args.get('limit', CARD_PAGE_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"message": "'limit' must be an integer."}), 400
+    limit = max(1, min(limit, CARD_PAGE_MAX_LIMIT))
+    cursor = request.args.get('cursor', '').strip() or None
+
+    count_mode = request.args.get('count', '').strip().lower() or None
+    if count_mode not in (None, 'exact', 'estimated'):
+        return jsonify({"message": "'count' must be 'exact' or 'estimated'."}), 400
+
+    requested_fields = None
+    if request.args.get('fields'):
+        requested_fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown_fields = [field for field in requested_fields if field not in CARD_RESPONSE_FIELDS]
+        if unknown_fields:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown_fields)}."}), 400
+    include_image_url = requested_fields is None or 'image_url' in requested_fields
+
+    try:
+        parsed_query = parse_query(search_query)
+    except QuerySyntaxError as qse:
+        routes_logger.warning(f"Search request received with an invalid query '{search_query}': {qse}")
+        return jsonify({"message": str(qse)}), 400
+    if parsed_query.is_empty():
+        routes_logger.warning(f"Search request received with a query without search terms: '{search_query}'.")
+        return jsonify({"message": "The query has no search terms."}), 400
+    explain = CARD_SEARCH_EXPLAIN_ENABLED and request.args.get('explain', 'false').lower() == 'true'
+
+    routes_logger.info(f"Received search query: '{search_query}' (mode: {search_mode}, limit: {limit}, cursor: {cursor is not None})")
+
+    try:
+        # Compile the query: field filters most selective first, and the name text matched on the
+        # normalized (casefolded, accent-stripped) name through its indexes.
+        # See services/query_language.py and services/card_search.py for how each part is translated.
+        query_filter, index_hint = plan_query(parsed_query, search_mode, get_existing_indexes(cards_collection))
+        query_options = {"hint": index_hint} if index_hint else {}
+
+        # Only fetch what the response needs: the requested fields, plus the sort key for the
+        # cursor and the Scryfall ID if image URLs have to be resolved.
+        if requested_fields is None:
+            projection = SEARCH_FIELDS_EXCLUDED_PROJECTION
+        else:
+            projection = {field: 1 for field in requested_fields}
+            projection['name_normalized'] = 1
+            if include_image_url:
+                projection['scryfall_id'] = 1
+
+        # Keyset pagination: seek past the cursor in the sort index and read one page.
+        # One extra card is read to know whether there is a next page.
+        page_filter = apply_cursor(query_filter, cursor)
+        page_query = cards_collection.find(page_filter, projection, **query_options).sort(PAGE_SORT).limit(limit + 1)
+        if explain:
+            explanation = {"query": parsed_query.canonical(), "filter": page_filter, "hint": index_hint, "plan": page_query.explain()}
+            response = Response(json_util.dumps(explanation), mimetype='application/json')
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        found_cards = list(page_query)
+        has_next_page = len(found_cards) > limit
+        found_cards = found_cards[:limit]
+        next_cursor = encode_cursor(found_cards[-1]) if has_next_page else None
+
+        pending_image_ids = set()
+        if include_image_url:
+            # Cards enriched from Scryfall bulk data already carry their image URL. Resolve the rest
+            # for the whole result page at once, so cache misses cost a single batched Scryfall request.
+            # If Scryfall is slow, stop waiting at the deadline and send placeholders for what's missing.
+            image_urls, pending_image_ids = resolve_card_image_urls(
+                [card['scryfall_id'] for card in found_cards if not card.get('image_url') and card.get('scryfall_id')],
+                timeout=IMAGE_RESOLUTION_DEADLINE_SECONDS)
 
         # MongoDB's ObjectId is not directly JSON serializable, so convert it to string
         # before sending the response.
         processed_cards = []
         for card in found_cards:
             card['_id'] = str(card['_id'])
-            
-            # Fetch image URL using the Scryfall Image Service 
-            scryfall_id = card.get('scryfall_id')
-            if scryfall_id:
-                card['image_url'] = get_card_image_url(scryfall_id)
-            else:
-                routes_logger.warning(f"Card '{card.get('name')}' (ID: {card['_id']}) is missing 'scryfall_id'. Cannot fetch image.")
-                card['image_url'] = None # Or a URL to a generic "image not available" placeholder
+            card.pop('name_normalized', None)
+
+            if include_image_url and not card.get('image_url'):
+                # Attach the image URL fetched by the Scryfall Image Service
+                scryfall_id = card.get('scryfall_id')
+                if scryfall_id in pending_image_ids:
+                    card['image_url'] = IMAGE_PLACEHOLDER_URL
+                elif scryfall_id:
+                    card['image_url'] = image_urls.get(scryfall_id)
+                else:
+                    routes_logger.warning(f"Card '{card.get('name')}' (ID: {card['_id']}) is missing 'scryfall_id'. Cannot fetch image.")
+                    card['image_url'] = None # Or a URL to a generic "image not available" placeholder
+            if requested_fields is not None and 'scryfall_id' not in requested_fields:
+                card.pop('scryfall_id', None) # Only fetched for the image lookup
 
             processed_cards.append(card)
 
-        if processed_cards:
-            routes_logger.info(f"Found and processed {len(processed_cards)} cards for query '{search_query}'")
-            return jsonify(processed_cards), 200
-        else:
+        if not processed_cards and cursor is None:
             routes_logger.info(f"No cards found for query '{search_query}'")
             return jsonify({"message": "No cards found matching your query."}), 404
 
+        routes_logger.info(f"Found and processed {len(processed_cards)} cards for query '{search_query}'")
+        with timed('serialize'):
+            response = jsonify(processed_cards)
+        if pending_image_ids:
+            # Incomplete: tell the client how many images are still coming, and keep this response out of
+            # every cache so the next request picks up the resolved URLs.
+            response.headers['X-Images-Pending'] = str(len(pending_image_ids))
+            response.headers['Cache-Control'] = 'no-store'
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{url_for("api.search_cards", **{**request.args.to_dict(), "cursor": next_cursor})}>; rel="next"'
+        if count_mode == 'exact':
+            response.headers['X-Total-Count'] = str(cards_collection.count_documents(query_filter, **query_options))
+        elif count_mode == 'estimated':
+            # Counting stops at the cap; X-Total-Count-Exact tells the client whether it was reached.
+            total = cards_collection.count_documents(query_filter, limit=CARD_COUNT_ESTIMATE_CAP, **query_options)
+            response.headers['X-Total-Count'] = str(total)
+            response.headers['X-Total-Count-Exact'] = 'false' if total >= CARD_COUNT_ESTIMATE_CAP else 'true'
+        return response, 200
+
+    except InvalidCursorError as ice:
+        routes_logger.warning(f"Search request received with an invalid cursor: {ice}")
+        return jsonify({"message": "Invalid 'cursor' parameter."}), 400
     except Exception as e:
         routes_logger.error(f"Error during card search for query '{search_query}': {e}", exc_info=True)
-        return jsonify({"error": "An internal server error occurred during search."}), 500
\ No newline at end of file
+        return jsonify({"error": "An internal server error occurred during search."}), 500
+
+@api_bp.route('/cards/lookup', methods=['POST'])
+def lookup_decklist():
+    """
+    Handles POST requests checking a decklist against the collection.
+    Accepts JSON ({"decklist": "...", "include_images": true}) or the pasted list as plain text.
+    Every name is resolved in a single aggregation on the indexed normalized name; the response
+    lists owned against required quantity per entry, plus totals.
+    """
+    try:
+        cards_collection = get_cards_collection() # Get the initialized collection
+    except ConnectionError as ce:
+        routes_logger.error(f"Decklist lookup failed: {ce}")
+        return jsonify({"error": "Database connection not established."}), 500
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        decklist_text = payload.get('decklist') or ''
+        include_images = bool(payload.get('include_images', False))
+    else:
+        decklist_text = request.get_data(as_text=True)
+        include_images = request.args.get('include_images', 'false').lower() == 'true'
+
+    try:
+        entries = parse_decklist(decklist_text)
+    except DecklistParseError as dpe:
+        routes_logger.warning(f"Decklist lookup received an unusable decklist: {dpe}")
+        return jsonify({"message": str(dpe)}), 400
+    if len(entries) > DECKLIST_MAX_ENTRIES:
+        return jsonify({"message": f"Decklists are limited to {DECKLIST_MAX_ENTRIES} distinct cards."}), 400
+
+    routes_logger.info(f"Received decklist lookup for {len(entries)} distinct cards.")
+
+    try:
+        groups = list(cards_collection.aggregate(build_lookup_pipeline(entries)))
+        results = match_lookup_results(entries, groups)
+
+        if include_images:
+            # Cards without a stored image URL are resolved together in one batch, up to the deadline
+            image_urls, pending_image_ids = resolve_card_image_urls(
+                [result['scryfall_id'] for result in results if not result['image_url'] and result['scryfall_id']],
+                timeout=IMAGE_RESOLUTION_DEADLINE_SECONDS)
+            for result in results:
+                if not result['image_url'] and result['scryfall_id']:
+                    result['image_url'] = (IMAGE_PLACEHOLDER_URL if result['scryfall_id'] in pending_image_ids
+                                           else image_urls.get(result['scryfall_id']))
+        else:
+            for result in results:
+                del result['image_url']
+
+        summary = {
+            "entries": len(results),
+            "required": sum(result['required'] for result in results),
+            "owned": sum(min(result['owned'], result['required']) for result in results),
+            "missing": sum(result['missing'] for result in results),
+            "complete_entries": sum(1 for result in results if result['missing'] == 0)
+        }
+        routes_logger.info(f"Decklist lookup: {summary['complete_entries']} of {summary['entries']} entries fully owned.")
+        with timed('serialize'):
+            response = jsonify({"summary": summary, "entries": results})
+        return response, 200
+
+    except Exception as e:
+        routes_logger.error(f"Error during decklist lookup: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred during the decklist lookup."}), 500
+
+@api_bp.route('/cards/suggest', methods=['GET'])
+def suggest_card_names():
+    """
+    Handles GET requests for autocomplete suggestions while the user types.
+    Expects a 'query' parameter (e.g., /api/cards/suggest?query=light) and an optional 'limit'.
+    Answers from the in-process name index only; it never queries MongoDB or Scryfall.
+    """
+    search_query = request.args.get('query', '').strip()
+    if not search_query:
+        return jsonify([]), 200
+
+    try:
+        limit = int(request.args.get('limit', SUGGEST_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"message": "'limit' must be an integer."}), 400
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+    if not suggest_index.built:
+        routes_logger.warning("Suggest request received before the suggestion index was built.")
+        return jsonify({"error": "Suggestions are not available yet."}), 503
+
+    suggestions = suggest_index.suggest(search_query, limit, SUGGEST_MIN_SIMILARITY)
+    return jsonify(suggestions), 200
+
+@api_bp.route('/images/<scryfall_id>', methods=['GET'])
+def card_image(scryfall_id):
+    """
+    Handles GET requests for a card image, e.g. /api/images/<scryfall_id>?size=small.
+    Serves the file from the local image store (downloading it from Scryfall on a miss), with the
+    content digest as ETag, so browsers revalidate with If-None-Match and get a 304 back.
+    'size' is 'normal' (default) or 'small', a thumbnail for result grids.
+    """
+    scryfall_id = scryfall_id.lower()
+    if not SCRYFALL_ID_PATTERN.match(scryfall_id):
+        return jsonify({"message": "Invalid Scryfall ID."}), 400
+    size = request.args.get('size', 'normal').lower()
+    if size not in IMAGE_SIZES:
+        return jsonify({"message": f"Unknown image size '{size}'. Available: {', '.join(IMAGE_SIZES)}."}), 400
+
+    try:
+        image = get_card_image_file(scryfall_id, size)
+    except ImageUnavailableError as iue:
+        routes_logger.info(f"Image request: {iue}")
+        response = jsonify({"error": "The image is not available yet. Try again shortly."})
+        response.headers['Retry-After'] = '2'
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 503
+    except Exception as e:
+        routes_logger.error(f"Error serving the image of {scryfall_id}: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred while serving the image."}), 500
+
+    if image is None:
+        return jsonify({"message": f"No image found for Scryfall ID {scryfall_id}."}), 404
+    path, digest, content_type = image
+    # send_file hands the open file to the WSGI server's file wrapper (sendfile() where supported),
+    # and answers If-None-Match / If-Modified-Since / Range requests itself
+    return send_file(path, mimetype=content_type, etag=digest, conditional=True, max_age=IMAGE_STORE_MAX_AGE_SECONDS)
+
+def _format_stats_bucket(bucket: dict) -> dict:
+    """Strips a summary document down to what the API returns."""
+    return {
+        "value": bucket.get("value"),
+        "entries": bucket.get("entries", 0), # Rows in the collection (distinct printing/finish/condition/language)
+        "cards": bucket.get("cards", 0), # Sum of quantities
+        "purchase_price_total": round(bucket.get("purchase_price_total", 0.0), 2)
+    }
+
+@api_bp.route('/stats', methods=['GET'])
+def collection_stats_overview():
+    """
+    Handles GET requests for the collection totals.
+    Reads the summaries precomputed at ingest time; never scans the cards collection.
+    """
+    try:
+        stats_collection = get_stats_collection()
+        total = stats_collection.find_one({"dimension": "total"})
+    except ConnectionError as ce:
+        routes_logger.error(f"Stats request failed: {ce}")
+        return jsonify({"error": "Database connection not established."}), 500
+    except Exception as e:
+        routes_logger.error(f"Error reading collection stats: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred while reading stats."}), 500
+
+    if total is None:
+        return jsonify({"message": "No statistics available yet. Run the ingestion script to build them."}), 404
+    total = _format_stats_bucket(total)
+    total.pop("value")
+    return jsonify({"total": total, "dimensions": list(STATS_DIMENSIONS)}), 200
+
+@api_bp.route('/stats/<dimension>', methods=['GET'])
+def collection_stats_by_dimension(dimension):
+    """
+    Handles GET requests for a breakdown of the collection, e.g. /api/stats/set or /api/stats/rarity.
+    Buckets are sorted by card count, largest first.
+    """
+    if dimension not in STATS_DIMENSIONS:
+        return jsonify({"message": f"Unknown stats dimension '{dimension}'. Available: {', '.join(STATS_DIMENSIONS)}."}), 404
+
+    try:
+        buckets = get_stats_collection().find({"dimension": dimension}).sort([("cards", -1), ("value", 1)])
+        return jsonify([_format_stats_bucket(bucket) for bucket in buckets]), 200
+    except ConnectionError as ce:
+        routes_logger.error(f"Stats request failed: {ce}")
+        return jsonify({"error": "Database connection not established."}), 500
+    except Exception as e:
+        routes_logger.error(f"Error reading collection stats for '{dimension}': {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred while reading stats."}), 500
@@ -0,0 +1,184 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from pymongo import ASCENDING, UpdateOne
+from services.scryfall_card_fields import ENRICHMENT_FIELDS
+from config import CARD_SEARCH_INDEX_REFRESH_SECONDS, METADATA_COLLECTION_NAME
+
+# Setup a logger for this module
+search_logger = logging.getLogger(__name__)
+search_logger.setLevel(logging.INFO)
+
+# Bump this whenever the derived search fields below change, so existing documents get recomputed.
+SEARCH_FIELDS_VERSION = 1
+
+# Compound indexes for the structured query filters (see services/query_language.py): equality
+# fields first, then the paging sort key, so a filtered page is read in index order without a sort.
+# (A set_code+rarity index would need an in-memory sort for 'set:' alone, the most common filter.)
+FILTER_INDEXES = [
+    (("set_code",), "set_code_1_name_normalized_1__id_1"),
+    (("binder_name",), "binder_name_1_name_normalized_1__id_1"),
+    (("rarity",), "rarity_1_name_normalized_1__id_1"),
+]
+
+# Indexes backing the search modes. Created by ensure_search_indexes() at ingestion and app startup.
+SEARCH_INDEXES = [
+    # Prefix search (index range scan) and the paging sort order (see services/pagination.py)
+    ([("name_normalized", ASCENDING), ("_id", ASCENDING)], "name_normalized_1__id_1"),
+    ([("name_trigrams", ASCENDING)], "name_trigrams_1"), # Substring search: multikey trigram index
+    ([("name_tokens", ASCENDING)], "name_tokens_1"), # Short queries: word-prefix range scan
+    ([("purchase_price", ASCENDING)], "purchase_price_1"), # Price ranges ('price>1')
+] + [
+    ([(field, ASCENDING) for field in fields] + [("name_normalized", ASCENDING), ("_id", ASCENDING)], name)
+    for fields, name in FILTER_INDEXES
+]
+
+SEARCH_MODES = ('substring', 'prefix', 'regex')
+
+# The derived fields are only for querying; leave them out of API responses.
+# (name_normalized is still fetched, because paging cursors are built from it.)
+SEARCH_FIELDS_EXCLUDED_PROJECTION = {"name_trigrams": 0, "name_tokens": 0, "search_fields_version": 0}
+
+# Card fields a client may ask for with 'fields='. 'image_url' is stored by the bulk data enrichment
+# (see ingestion-script/enrich_data.py) and resolved from Scryfall for cards without it.
+CARD_RESPONSE_FIELDS = (
+    "binder_name", "binder_type", "name", "set_code", "set_name", "collector_number", "foil", "rarity",
+    "quantity", "manabox_id", "scryfall_id", "purchase_price", "misprint", "altered", "condition",
+    "language", "purchase_price_currency", "image_url", "card_faces"
+) + ENRICHMENT_FIELDS
+
+_TOKEN_SPLIT_PATTERN = re.compile(r"[^\w]+")
+
+def normalize_name(name: str) -> str:
+    """
+    Casefolds a card name and strips accents, so 'Lim-Dûl' and 'lim-dul' compare equal.
+    Used both when storing the search fields and when normalizing user queries.
+    """
+    decomposed = unicodedata.normalize('NFKD', str(name).casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.split()) # Collapse runs of whitespace
+
+def name_trigrams(normalized_name: str) -> list[str]:
+    """Returns the distinct 3-character substrings of an already normalized name."""
+    return sorted({normalized_name[i:i + 3] for i in range(len(normalized_name) - 2)})
+
+def name_tokens(normalized_name: str) -> list[str]:
+    """Returns the distinct words of an already normalized name."""
+    return sorted({token for token in _TOKEN_SPLIT_PATTERN.split(normalized_name) if token})
+
+def build_search_fields(name: str) -> dict:
+    """Returns the derived search fields to store on a card document with the given name."""
+    normalized = normalize_name(name)
+    return {
+        "name_normalized": normalized,
+        "name_trigrams": name_trigrams(normalized),
+        "name_tokens": name_tokens(normalized),
+        "search_fields_version": SEARCH_FIELDS_VERSION
+    }
+
+def build_name_filter(search_query: str, mode: str) -> dict:
+    """
+    Builds the MongoDB filter for a name search.
+
+    - 'prefix': names starting with the query, as a range scan on name_normalized.
+    - 'substring': names containing the query. Queries of 3+ characters are narrowed with the
+      trigram index and then verified against name_normalized; shorter queries match word prefixes.
+    - 'regex': the old unanchored case-insensitive $regex on 'name' (full collection scan).
+    """
+    if mode == 'regex':
+        return {"name": {"$regex": re.escape(search_query), "$options": "i"}}
+
+    normalized_query = normalize_name(search_query)
+    if mode == 'prefix':
+        # '\uffff' sorts after every character that appears in card names, closing the range.
+        return {"name_normalized": {"$gte": normalized_query, "$lt": normalized_query + "\uffff"}}
+
+    trigrams = name_trigrams(normalized_query)
+    if not trigrams:
+        return {"name_tokens": {"$gte": normalized_query, "$lt": normalized_query + "\uffff"}}
+    return {
+        "name_trigrams": {"$all": trigrams},
+        # Having every trigram doesn't guarantee they are contiguous, so confirm the actual substring.
+        "name_normalized": {"$regex": re.escape(normalized_query)}
+    }
+
+def ensure_search_indexes(cards_collection):
+    """Creates the search indexes if they don't exist yet. Safe to call repeatedly."""
+    for keys, name in SEARCH_INDEXES:
+        cards_collection.create_index(keys, name=name)
+    refresh_existing_indexes(cards_collection)
+
+# Names of the indexes that exist on the cards collection, as last read. MongoDB rejects a hint naming
+# a missing index, so structured queries only hint these (e.g. not before ensure_search_indexes() ran).
+_existing_indexes = frozenset()
+_existing_indexes_checked_at = None
+_existing_indexes_lock = threading.Lock()
+
+def refresh_existing_indexes(cards_collection) -> frozenset:
+    """Re-reads the index names of the cards collection. Returns them."""
+    global _existing_indexes, _existing_indexes_checked_at
+    with _existing_indexes_lock:
+        try:
+            _existing_indexes = frozenset(cards_collection.index_information())
+        except Exception as e:
+            search_logger.warning(f"Search: could not list the card indexes; queries run without hints until the next check. Details: {e}")
+            _existing_indexes = frozenset()
+        _existing_indexes_checked_at = time.monotonic()
+        return _existing_indexes
+
+def get_existing_indexes(cards_collection) -> frozenset:
+    """Returns the index names of the cards collection, re-reading them every CARD_SEARCH_INDEX_REFRESH_SECONDS."""
+    checked_at = _existing_indexes_checked_at
+    if checked_at is None or time.monotonic() - checked_at > CARD_SEARCH_INDEX_REFRESH_SECONDS:
+        return refresh_existing_indexes(cards_collection)
+    return _existing_indexes
+
+def backfill_search_fields(cards_collection, batch_size: int = 1000) -> int:
+    """
+    Adds (or refreshes) the derived search fields on documents that lack the current version,
+    e.g. documents loaded from the pre-built MongoDB image. Returns the number of documents updated.
+    """
+    outdated = cards_collection.find(
+        {"search_fields_version": {"$ne": SEARCH_FIELDS_VERSION}},
+        {"name": 1}
+    )
+    updated = 0
+    operations = []
+    for card in outdated:
+        if not card.get("name"):
+            continue
+        operations.append(UpdateOne({"_id": card["_id"]}, {"$set": build_search_fields(card["name"])}))
+        if len(operations) >= batch_size:
+            updated += cards_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += cards_collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+def prepare_card_search(cards_collection) -> bool:
+    """
+    Backfills the search fields and ensures the search indexes exist, then records SEARCH_FIELDS_VERSION
+    in the collection's metadata document. Once that stamp is current, this only re-reads the index names,
+    so the full scan for outdated documents runs once per database, not in every process.
+    Called by ingest_data.py and at app startup. Returns False if the setup failed.
+    """
+    metadata_collection = cards_collection.database[METADATA_COLLECTION_NAME]
+    try:
+        metadata = metadata_collection.find_one({"_id": cards_collection.name}, {"search_fields_version": 1})
+        if metadata and metadata.get("search_fields_version") == SEARCH_FIELDS_VERSION:
+            refresh_existing_indexes(cards_collection)
+            search_logger.info("Search: search fields and indexes are up to date.")
+            return True
+        updated = backfill_search_fields(cards_collection)
+        if updated:
+            search_logger.info(f"Search: backfilled search fields on {updated} card documents.")
+        ensure_search_indexes(cards_collection)
+        metadata_collection.update_one({"_id": cards_collection.name},
+                                       {"$set": {"search_fields_version": SEARCH_FIELDS_VERSION}}, upsert=True)
+        search_logger.info("Search: search indexes are ready.")
+        return True
+    except Exception as e:
+        search_logger.error(f"Search ERROR: could not prepare search fields/indexes. Searches will be slower. Details: {e}", exc_info=True)
+        return False
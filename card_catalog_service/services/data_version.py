@@ -0,0 +1,36 @@
+import logging
+import threading
+import time
+from database import get_data_version
+from config import DATA_VERSION_CHECK_INTERVAL_SECONDS
+
+# Setup a logger for this module
+version_logger = logging.getLogger(__name__)
+version_logger.setLevel(logging.INFO)
+
+# The last data version read from MongoDB and when it was read
+_data_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def get_current_data_version():
+    """
+    Returns the collection's data version, reading it from MongoDB at most once every
+    DATA_VERSION_CHECK_INTERVAL_SECONDS, so hot paths can check it on every request.
+    If MongoDB can't be reached, the last known version is returned (None if there is none).
+    """
+    global _data_version, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < DATA_VERSION_CHECK_INTERVAL_SECONDS:
+        return _data_version
+    with _lock:
+        if now - _checked_at >= DATA_VERSION_CHECK_INTERVAL_SECONDS:
+            try:
+                version = get_data_version()
+                if version != _data_version:
+                    version_logger.info(f"Collection data version is now {version}.")
+                _data_version = version
+            except Exception as e:
+                version_logger.warning(f"Could not read the collection data version, keeping {_data_version}. Details: {e}")
+            _checked_at = now
+    return _data_version
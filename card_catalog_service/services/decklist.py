@@ -0,0 +1,97 @@
+import re
+from services.card_search import normalize_name
+
+# Quantity at the start of a line: '4 ', '4x ', '4X '
+_QUANTITY_PATTERN = re.compile(r"^(\d+)\s*[xX]?\s+(.*)$")
+# Arena/Moxfield printing details after the name: ' (M11) 149', ' (CMM) 464 *F*', ' [KHC] 73'
+_PRINTING_PATTERN = re.compile(r"\s+[(\[][A-Za-z0-9]{2,6}[)\]](\s+\S+)?(\s+\*[A-Za-z]+\*)*\s*$")
+# Trailing foil/etched markers without a set: ' *F*', ' *E*'
+_MARKER_PATTERN = re.compile(r"(\s+\*[A-Za-z]+\*)+\s*$")
+# Section headers used by Arena, Moxfield and MTGO exports
+_SECTION_HEADERS = {"deck", "main", "mainboard", "sideboard", "side", "commander", "commanders",
+                    "companion", "maybeboard", "considering", "tokens", "about"}
+
+class DecklistParseError(ValueError):
+    """Raised when a decklist contains no card lines at all."""
+
+def parse_decklist(text: str) -> list[dict]:
+    """
+    Parses a pasted decklist into entries of {'name', 'normalized_name', 'required'}.
+
+    Understands plain 'quantity name' lines ('4 Lightning Bolt', '4x Lightning Bolt'),
+    Arena/Moxfield lines with printing details ('1 Sol Ring (CMM) 464 *F*'), lines without
+    a quantity (counted as 1), section headers ('Sideboard', 'Commander:') and comments
+    ('//' or '#'). The same card listed more than once (e.g. main deck and sideboard) is summed.
+    """
+    entries = {}
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith(('//', '#')):
+            continue
+        if line.rstrip(':').strip().lower() in _SECTION_HEADERS:
+            continue
+        if line.lower().startswith('name '): # MTGO-style 'Name Deck Title' header
+            continue
+
+        quantity = 1
+        match = _QUANTITY_PATTERN.match(line)
+        if match:
+            quantity = int(match.group(1))
+            line = match.group(2)
+        name = _MARKER_PATTERN.sub('', _PRINTING_PATTERN.sub('', line)).strip()
+        if not name or quantity <= 0:
+            continue
+
+        normalized_name = normalize_name(name)
+        entry = entries.setdefault(normalized_name, {"name": name, "normalized_name": normalized_name, "required": 0})
+        entry["required"] += quantity
+
+    if not entries:
+        raise DecklistParseError("No card lines found in the decklist.")
+    return list(entries.values())
+
+def build_lookup_pipeline(entries: list[dict]) -> list[dict]:
+    """
+    Builds the aggregation answering ownership for every decklist entry in one query.
+    Names are matched on the indexed name_normalized field, either exactly or as the
+    front face of a double-faced card ('Delver of Secrets' -> 'Delver of Secrets // Insectile Aberration').
+    """
+    normalized_names = [entry["normalized_name"] for entry in entries]
+    front_face_ranges = [
+        {"name_normalized": {"$gte": f"{name} // ", "$lt": f"{name} // \uffff"}}
+        for name in normalized_names
+    ]
+    return [
+        {"$match": {"$or": [{"name_normalized": {"$in": normalized_names}}] + front_face_ranges}},
+        {"$group": {
+            "_id": "$name_normalized",
+            "name": {"$first": "$name"},
+            "owned": {"$sum": {"$ifNull": ["$quantity", 1]}},
+            "scryfall_id": {"$first": "$scryfall_id"},
+            "image_url": {"$first": "$image_url"}
+        }}
+    ]
+
+def match_lookup_results(entries: list[dict], groups: list[dict]) -> list[dict]:
+    """Combines the aggregation groups with the decklist entries they belong to."""
+    groups_by_name = {}
+    for group in groups:
+        groups_by_name.setdefault(group["_id"], []).append(group)
+        front_face = group["_id"].split(" // ")[0]
+        if front_face != group["_id"]:
+            groups_by_name.setdefault(front_face, []).append(group)
+
+    results = []
+    for entry in entries:
+        matched = groups_by_name.get(entry["normalized_name"], [])
+        owned = sum(group["owned"] for group in matched)
+        results.append({
+            "name": entry["name"],
+            "matched_name": matched[0]["name"] if matched else None,
+            "required": entry["required"],
+            "owned": owned,
+            "missing": max(0, entry["required"] - owned),
+            "scryfall_id": matched[0].get("scryfall_id") if matched else None,
+            "image_url": matched[0].get("image_url") if matched else None
+        })
+    return results
@@ -0,0 +1,269 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne, ASCENDING
+from config import (SCRYFALL_CACHE_BACKEND, SCRYFALL_CACHE_SQLITE_PATH, SCRYFALL_CACHE_TTL_SECONDS,
+                    SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS, SCRYFALL_CACHE_MAX_ENTRIES,
+                    SCRYFALL_CACHE_L1_MAXSIZE, SCRYFALL_CACHE_L1_TTL_SECONDS, SCRYFALL_CACHE_BACKEND_RETRY_SECONDS)
+
+# Setup a logger for this module
+cache_logger = logging.getLogger(__name__)
+cache_logger.setLevel(logging.INFO)
+
+# How many writes a backend accepts between two size checks; checking on every write would be wasteful.
+_EVICTION_CHECK_INTERVAL = 200
+
+def _ttl_for(image_url: str | None) -> int:
+    """Failed lookups (None) are only cached briefly so they get retried soon."""
+    return SCRYFALL_CACHE_TTL_SECONDS if image_url else SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS
+
+class MemoryImageUrlCache:
+    """
+    Per-process LRU cache with per-entry expiry.
+    Used on its own for the 'memory' backend and as the L1 layer in front of the shared backends.
+    """
+
+    def __init__(self, maxsize: int, max_ttl_seconds: int | None = None):
+        self._maxsize = maxsize
+        self._max_ttl_seconds = max_ttl_seconds
+        self._entries = OrderedDict() # scryfall_id -> (image_url, expires_at)
+        self._lock = threading.Lock()
+
+    def get_many(self, scryfall_ids: list[str]) -> dict[str, str | None]:
+        """Returns cached entries (values may be None for negative results); IDs not cached are absent."""
+        now = time.time()
+        hits = {}
+        with self._lock:
+            for scryfall_id in scryfall_ids:
+                entry = self._entries.get(scryfall_id)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[scryfall_id]
+                    continue
+                self._entries.move_to_end(scryfall_id)
+                hits[scryfall_id] = entry[0]
+        return hits
+
+    def set_many(self, entries: dict[str, str | None], expires_at: dict[str, float] | None = None):
+        """Stores entries, evicting the least recently used ones if the cache is full."""
+        now = time.time()
+        with self._lock:
+            for scryfall_id, image_url in entries.items():
+                ttl = _ttl_for(image_url)
+                if self._max_ttl_seconds is not None:
+                    ttl = min(ttl, self._max_ttl_seconds)
+                entry_expires_at = now + ttl
+                if expires_at and scryfall_id in expires_at:
+                    entry_expires_at = min(entry_expires_at, expires_at[scryfall_id])
+                self._entries[scryfall_id] = (image_url, entry_expires_at)
+                self._entries.move_to_end(scryfall_id)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+class SQLiteImageUrlCache:
+    """
+    Cache stored in a local SQLite file, shared by every worker process on the same host.
+    WAL mode lets readers in one process proceed while another process writes.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scryfall_cache ("
+            "scryfall_id TEXT PRIMARY KEY, image_url TEXT, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scryfall_cache_expires_at ON scryfall_cache (expires_at)")
+        self._conn.commit()
+        cache_logger.info(f"Image URL cache: using SQLite file '{path}'.")
+
+    def get_entries(self, scryfall_ids: list[str]) -> dict[str, tuple[str | None, float]]:
+        """Returns unexpired entries as ID -> (image URL, expiry timestamp); IDs not cached are absent."""
+        if not scryfall_ids:
+            return {}
+        placeholders = ",".join("?" * len(scryfall_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT scryfall_id, image_url, expires_at FROM scryfall_cache "
+                f"WHERE scryfall_id IN ({placeholders}) AND expires_at > ?",
+                (*scryfall_ids, time.time())
+            ).fetchall()
+        return {scryfall_id: (image_url, expires_at) for scryfall_id, image_url, expires_at in rows}
+
+    def get_many(self, scryfall_ids: list[str]) -> dict[str, str | None]:
+        """Returns unexpired entries; IDs not cached are absent."""
+        return {scryfall_id: entry[0] for scryfall_id, entry in self.get_entries(scryfall_ids).items()}
+
+    def set_many(self, entries: dict[str, str | None]):
+        """Upserts entries and trims the table back to SCRYFALL_CACHE_MAX_ENTRIES every so often."""
+        if not entries:
+            return
+        now = time.time()
+        rows = [(scryfall_id, image_url, now + _ttl_for(image_url)) for scryfall_id, image_url in entries.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scryfall_cache (scryfall_id, image_url, expires_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._writes_since_eviction += len(rows)
+            if self._writes_since_eviction >= _EVICTION_CHECK_INTERVAL:
+                self._writes_since_eviction = 0
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drops expired rows, then the rows expiring soonest until the size bound holds. Caller holds the lock."""
+        self._conn.execute("DELETE FROM scryfall_cache WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM scryfall_cache").fetchone()
+        excess = count - SCRYFALL_CACHE_MAX_ENTRIES
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM scryfall_cache WHERE scryfall_id IN "
+                "(SELECT scryfall_id FROM scryfall_cache ORDER BY expires_at LIMIT ?)",
+                (excess,)
+            )
+            cache_logger.info(f"Image URL cache: evicted {excess} entries from SQLite cache.")
+        self._conn.commit()
+
+class MongoImageUrlCache:
+    """
+    Cache stored in the 'scryfall_cache' collection of the existing MongoDB,
+    shared by every worker and every host running the service.
+    A TTL index lets MongoDB remove expired entries on its own.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        # expireAfterSeconds=0 means "expire at the time stored in the field".
+        self._collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        cache_logger.info(f"Image URL cache: using MongoDB collection '{collection.name}'.")
+
+    def get_entries(self, scryfall_ids: list[str]) -> dict[str, tuple[str | None, float]]:
+        """Returns unexpired entries as ID -> (image URL, expiry timestamp); IDs not cached are absent."""
+        if not scryfall_ids:
+            return {}
+        # MongoDB's TTL monitor only runs about once a minute, so filter out expired entries explicitly.
+        docs = self._collection.find(
+            {"_id": {"$in": scryfall_ids}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"image_url": 1, "expires_at": 1}
+        )
+        # PyMongo returns naive datetimes in UTC by default.
+        return {doc["_id"]: (doc.get("image_url"), doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()) for doc in docs}
+
+    def get_many(self, scryfall_ids: list[str]) -> dict[str, str | None]:
+        """Returns unexpired entries; IDs not cached are absent."""
+        return {scryfall_id: entry[0] for scryfall_id, entry in self.get_entries(scryfall_ids).items()}
+
+    def set_many(self, entries: dict[str, str | None]):
+        """Upserts entries with an unordered bulk write and trims the collection every so often."""
+        if not entries:
+            return
+        now = datetime.now(timezone.utc)
+        operations = [
+            ReplaceOne(
+                {"_id": scryfall_id},
+                {"image_url": image_url, "expires_at": now + timedelta(seconds=_ttl_for(image_url))},
+                upsert=True
+            )
+            for scryfall_id, image_url in entries.items()
+        ]
+        self._collection.bulk_write(operations, ordered=False)
+
+        with self._lock:
+            self._writes_since_eviction += len(operations)
+            check_size = self._writes_since_eviction >= _EVICTION_CHECK_INTERVAL
+            if check_size:
+                self._writes_since_eviction = 0
+        if check_size:
+            self._evict()
+
+    def _evict(self):
+        """Drops the entries expiring soonest until the size bound holds."""
+        excess = self._collection.estimated_document_count() - SCRYFALL_CACHE_MAX_ENTRIES
+        if excess <= 0:
+            return
+        oldest_ids = [doc["_id"] for doc in self._collection.find({}, {"_id": 1}).sort("expires_at", ASCENDING).limit(excess)]
+        result = self._collection.delete_many({"_id": {"$in": oldest_ids}})
+        cache_logger.info(f"Image URL cache: evicted {result.deleted_count} entries from MongoDB cache.")
+
+class TieredImageUrlCache:
+    """
+    An in-process L1 cache in front of a shared L2 backend (SQLite or MongoDB).
+    Reads check L1 first and only go to L2 for the rest; writes go to both.
+    L2 is built by l2_factory on first use. If that fails (e.g. MongoDB is briefly unreachable), or L2
+    fails later, the cache keeps working from L1 alone, and building L2 is retried after a backoff.
+    """
+
+    def __init__(self, l1: MemoryImageUrlCache, l2_factory, backend_name: str):
+        self._l1 = l1
+        self._l2_factory = l2_factory
+        self._backend_name = backend_name
+        self._l2 = None
+        self._l2_retry_at = 0.0
+        self._l2_lock = threading.Lock()
+
+    def _get_l2(self):
+        """Returns the shared backend, or None while it can't be set up."""
+        if self._l2 is None and time.monotonic() >= self._l2_retry_at:
+            with self._l2_lock:
+                if self._l2 is None and time.monotonic() >= self._l2_retry_at:
+                    try:
+                        self._l2 = self._l2_factory()
+                    except Exception as e:
+                        self._l2_retry_at = time.monotonic() + SCRYFALL_CACHE_BACKEND_RETRY_SECONDS
+                        cache_logger.error(f"Image URL cache: could not set up '{self._backend_name}' backend, using in-process "
+                                           f"cache only; retrying in {SCRYFALL_CACHE_BACKEND_RETRY_SECONDS}s. Details: {e}")
+        return self._l2
+
+    def get_many(self, scryfall_ids: list[str]) -> dict[str, str | None]:
+        hits = self._l1.get_many(scryfall_ids)
+        remaining = [scryfall_id for scryfall_id in scryfall_ids if scryfall_id not in hits]
+        l2 = self._get_l2() if remaining else None
+        if l2 is not None:
+            try:
+                l2_entries = l2.get_entries(remaining)
+            except Exception as e:
+                cache_logger.error(f"Image URL cache: shared backend read failed, using in-process cache only. Details: {e}")
+                l2_entries = {}
+            if l2_entries:
+                l2_hits = {scryfall_id: entry[0] for scryfall_id, entry in l2_entries.items()}
+                # Copy into L1, but never past the L2 entry's own expiry (matters for short-lived negative entries).
+                self._l1.set_many(l2_hits, expires_at={scryfall_id: entry[1] for scryfall_id, entry in l2_entries.items()})
+                hits.update(l2_hits)
+        return hits
+
+    def set_many(self, entries: dict[str, str | None]):
+        self._l1.set_many(entries)
+        l2 = self._get_l2()
+        if l2 is None:
+            return
+        try:
+            l2.set_many(entries)
+        except Exception as e:
+            cache_logger.error(f"Image URL cache: shared backend write failed. Details: {e}")
+
+def create_image_url_cache():
+    """
+    Builds the image URL cache selected by SCRYFALL_CACHE_BACKEND.
+    The shared backend is set up on first use, and retried while it can't be (see TieredImageUrlCache).
+    """
+    l1 = MemoryImageUrlCache(SCRYFALL_CACHE_L1_MAXSIZE, max_ttl_seconds=SCRYFALL_CACHE_L1_TTL_SECONDS)
+    if SCRYFALL_CACHE_BACKEND == 'mongo':
+        from database import get_scryfall_cache_collection # Imported here so the other backends don't need the database
+        return TieredImageUrlCache(l1, lambda: MongoImageUrlCache(get_scryfall_cache_collection()), 'mongo')
+    elif SCRYFALL_CACHE_BACKEND == 'sqlite':
+        return TieredImageUrlCache(l1, lambda: SQLiteImageUrlCache(SCRYFALL_CACHE_SQLITE_PATH), 'sqlite')
+    elif SCRYFALL_CACHE_BACKEND != 'memory':
+        cache_logger.warning(f"Unknown SCRYFALL_CACHE_BACKEND '{SCRYFALL_CACHE_BACKEND}'. Using in-process cache only.")
+    # Without a shared backend, the in-process cache is the only layer, so let it hold full-TTL entries.
+    return MemoryImageUrlCache(SCRYFALL_CACHE_L1_MAXSIZE)
@@ -0,0 +1,254 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from services.scryfall_api import resolve_card_image_urls, get_card_image_urls, download_card_image
+from config import (IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES, IMAGE_THUMBNAIL_WIDTH,
+                    IMAGE_RESOLUTION_DEADLINE_SECONDS, SCRYFALL_COLLECTION_BATCH_SIZE)
+
+try:
+    from PIL import Image # Optional: thumbnails are only generated if Pillow is installed
+except ImportError:
+    Image = None
+
+# Setup a logger for this module
+image_store_logger = logging.getLogger(__name__)
+image_store_logger.setLevel(logging.INFO)
+
+# Card image bytes on local disk, served by /api/images/<scryfall_id> so page loads don't go to Scryfall's CDN.
+# Files are content-addressed (named after the SHA-256 of their bytes, which is also their ETag), and a small
+# SQLite index maps (Scryfall ID, size) to a file. The store is bounded by total size: when it grows past
+# IMAGE_STORE_MAX_BYTES, the least recently used files are deleted.
+
+IMAGE_SIZES = ('normal', 'small') # 'small': a thumbnail for result grids (needs Pillow, else 'normal' is served)
+SCRYFALL_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+# Last-access times are only rewritten when older than this, so cache hits rarely write to the index.
+_ACCESS_UPDATE_INTERVAL_SECONDS = 3600
+# Eviction frees space down to this share of the limit, so it doesn't run again on the next write.
+_EVICTION_TARGET = 0.9
+
+class ImageUnavailableError(Exception):
+    """Raised when a card's image can't be fetched right now (still resolving, or the download failed)."""
+
+class ImageStore:
+    """
+    Content-addressed image files plus their SQLite index, shared by every worker process on the host.
+    Files are written to a temporary name and renamed into place, so readers never see partial files.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, size INTEGER NOT NULL, content_type TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS images (image_key TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+        self._conn.commit()
+        image_store_logger.info(f"Image store: using '{root}' (limit {max_bytes / 1024 / 1024:.0f} MB).")
+
+    @staticmethod
+    def _key(scryfall_id: str, size: str) -> str:
+        return f"{scryfall_id}:{size}"
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._root, 'blobs', digest[:2], digest)
+
+    def get(self, scryfall_id: str, size: str) -> tuple[str, str, str] | None:
+        """Returns (file path, digest, content type) of a stored image, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.digest, blobs.content_type, blobs.last_access FROM images "
+                "JOIN blobs ON blobs.digest = images.digest WHERE images.image_key = ?",
+                (self._key(scryfall_id, size),)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, content_type, last_access = row
+            path = self._blob_path(digest)
+            if not os.path.exists(path): # Evicted by another process, or deleted by hand
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                self._conn.execute("DELETE FROM images WHERE digest = ?", (digest,))
+                self._conn.commit()
+                return None
+            if now - last_access > _ACCESS_UPDATE_INTERVAL_SECONDS:
+                self._conn.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (now, digest))
+                self._conn.commit()
+        return path, digest, content_type
+
+    def has_many(self, scryfall_ids: list[str], size: str) -> set[str]:
+        """Returns the IDs that have a stored image of the given size."""
+        stored = set()
+        with self._lock:
+            for start in range(0, len(scryfall_ids), 500):
+                keys = [self._key(scryfall_id, size) for scryfall_id in scryfall_ids[start:start + 500]]
+                rows = self._conn.execute(
+                    f"SELECT image_key FROM images WHERE image_key IN ({','.join('?' * len(keys))})", keys
+                ).fetchall()
+                stored.update(image_key.rsplit(':', 1)[0] for (image_key,) in rows)
+        return stored
+
+    def put(self, scryfall_id: str, size: str, data: bytes, content_type: str) -> tuple[str, str, str]:
+        """Stores image bytes (identical images share one file) and returns (file path, digest, content type)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, content_type, last_access) VALUES (?, ?, ?, ?)",
+                (digest, len(data), content_type, time.time())
+            )
+            self._conn.execute("INSERT OR REPLACE INTO images (image_key, digest) VALUES (?, ?)",
+                               (self._key(scryfall_id, size), digest))
+            self._conn.commit()
+            self._evict()
+        return path, digest, content_type
+
+    def _evict(self):
+        """Deletes the least recently used files until the store fits its size limit. Caller holds the lock."""
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        if total <= self._max_bytes:
+            return
+        target = self._max_bytes * _EVICTION_TARGET
+        evicted = 0
+        for digest, size in self._conn.execute("SELECT digest, size FROM blobs ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._conn.execute("DELETE FROM images WHERE digest = ?", (digest,))
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._conn.commit()
+        image_store_logger.info(f"Image store: evicted {evicted} images; {total / 1024 / 1024:.0f} MB in use.")
+
+# The store of this process, opened on first use (SQLite connections must not cross a fork).
+_image_store = None
+_image_store_pid = None
+_image_store_lock = threading.Lock()
+
+def get_image_store() -> ImageStore:
+    global _image_store, _image_store_pid
+    if _image_store is None or _image_store_pid != os.getpid():
+        with _image_store_lock:
+            if _image_store is None or _image_store_pid != os.getpid():
+                _image_store = ImageStore(IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES)
+                _image_store_pid = os.getpid()
+    return _image_store
+
+def make_thumbnail(data: bytes) -> bytes | None:
+    """Scales an image down to IMAGE_THUMBNAIL_WIDTH as JPEG. Returns None without Pillow."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGB')
+        image.info.clear() # Embedded comments and metadata would otherwise be copied into the thumbnail
+        image.thumbnail((IMAGE_THUMBNAIL_WIDTH, IMAGE_THUMBNAIL_WIDTH * 2))
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=82, optimize=True)
+    return output.getvalue()
+
+def _store_card_image(scryfall_id: str, image_url: str, sizes: tuple = ('normal',)) -> tuple[str, str, str] | None:
+    """Downloads a card image and stores it in the requested sizes. Returns the 'normal' entry."""
+    downloaded = download_card_image(image_url)
+    if downloaded is None:
+        return None
+    data, content_type = downloaded
+    store = get_image_store()
+    stored = store.put(scryfall_id, 'normal', data, content_type)
+    if 'small' in sizes:
+        thumbnail = make_thumbnail(data)
+        if thumbnail is not None:
+            store.put(scryfall_id, 'small', thumbnail, 'image/jpeg')
+    return stored
+
+def get_card_image_file(scryfall_id: str, size: str = 'normal') -> tuple[str, str, str] | None:
+    """
+    Returns (file path, digest, content type) of a card image, downloading it on a cache miss.
+    Returns None if the card has no image. Raises ImageUnavailableError if the image URL isn't
+    resolved within the request deadline or the download failed; the client should retry.
+    Without Pillow, 'small' falls back to the 'normal' image.
+    """
+    store = get_image_store()
+    stored = store.get(scryfall_id, size)
+    if stored is not None:
+        return stored
+    if size == 'small':
+        normal = store.get(scryfall_id, 'normal')
+        if normal is not None:
+            with open(normal[0], 'rb') as image_file:
+                thumbnail = make_thumbnail(image_file.read())
+            return store.put(scryfall_id, 'small', thumbnail, 'image/jpeg') if thumbnail is not None else normal
+
+    image_urls, pending_ids = resolve_card_image_urls([scryfall_id], timeout=IMAGE_RESOLUTION_DEADLINE_SECONDS)
+    if pending_ids:
+        raise ImageUnavailableError(f"The image URL of {scryfall_id} is still being resolved.")
+    if not image_urls.get(scryfall_id):
+        return None
+    normal = _store_card_image(scryfall_id, image_urls[scryfall_id], ('normal', size))
+    if normal is None:
+        raise ImageUnavailableError(f"Downloading the image of {scryfall_id} failed.")
+    return store.get(scryfall_id, size) or normal
+
+def prefetch_card_images(cards_collection, sizes: tuple = ('normal', 'small'), workers: int = 8) -> Counter:
+    """
+    Downloads the image of every card in the collection that isn't stored yet, e.g. after an ingest.
+    Uses the image URLs stored by the bulk data enrichment where available and resolves the rest
+    through the Scryfall API in batches. Returns counts of stored, skipped and failed images.
+    """
+    stats = Counter()
+    store = get_image_store()
+    image_urls = {}
+    for card in cards_collection.find({"scryfall_id": {"$nin": [None, ""]}}, {"scryfall_id": 1, "image_url": 1, "_id": 0}):
+        if not image_urls.get(card["scryfall_id"]):
+            image_urls[card["scryfall_id"]] = card.get("image_url")
+    stored_ids = store.has_many(list(image_urls), 'normal')
+    if 'small' in sizes and Image is not None:
+        stored_ids &= store.has_many(list(image_urls), 'small')
+    missing_ids = [scryfall_id for scryfall_id in image_urls if scryfall_id not in stored_ids]
+    stats['skipped'] = len(image_urls) - len(missing_ids)
+    image_store_logger.info(f"Image prefetch: {len(image_urls)} cards, {len(missing_ids)} images to download.")
+
+    unresolved_ids = [scryfall_id for scryfall_id in missing_ids if not image_urls[scryfall_id]]
+    for start in range(0, len(unresolved_ids), SCRYFALL_COLLECTION_BATCH_SIZE):
+        image_urls.update(get_card_image_urls(unresolved_ids[start:start + SCRYFALL_COLLECTION_BATCH_SIZE]))
+
+    def prefetch(scryfall_id):
+        if not image_urls.get(scryfall_id):
+            return 'no_image'
+        try:
+            return 'stored' if _store_card_image(scryfall_id, image_urls[scryfall_id], sizes) else 'failed'
+        except Exception as e:
+            image_store_logger.error(f"Image prefetch: could not store the image of {scryfall_id}. Details: {e}")
+            return 'failed'
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for done, outcome in enumerate(executor.map(prefetch, missing_ids), start=1):
+            stats[outcome] += 1
+            if done % 500 == 0:
+                image_store_logger.info(f"Image prefetch: {done} of {len(missing_ids)} done.")
+    image_store_logger.info(f"Image prefetch finished: {dict(stats)}")
+    return stats
@@ -0,0 +1,220 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Request instrumentation: per-request phase timings (sent as a Server-Timing header) and
+# process-wide counters and histograms, rendered in the Prometheus text format by /metrics.
+# Recording is a perf_counter() call and a few additions under a lock, so it stays cheap on the hot path.
+# Every worker process keeps its own numbers; Prometheus sums them across scrape targets.
+
+# Latency buckets (seconds) shared by the histograms below: 1ms .. 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: tuple, labels: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    """A monotonically increasing count, optionally split by label values."""
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name + _format_labels(self.labelnames, labels), value
+
+class Gauge(Counter):
+    """A value that goes up and down, e.g. connections currently checked out."""
+    type_name = 'gauge'
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+class Histogram:
+    """Counts observations into cumulative buckets, plus their sum and count, per label values."""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._buckets = tuple(buckets)
+        self._values = {} # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self._buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        for labels, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + "_bucket" + _format_labels(self.labelnames, labels, f'le="{le}"'), cumulative
+            yield self.name + "_sum" + _format_labels(self.labelnames, labels), counts[-1]
+            yield self.name + "_count" + _format_labels(self.labelnames, labels), cumulative
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(f"{sample} {_format_value(value)}" for sample, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+# --- Metrics of the catalog service ---
+
+http_request_duration = Histogram('catalog_http_request_duration_seconds', "Time spent handling HTTP requests.",
+                                  ('method', 'endpoint', 'status'))
+request_phase_duration = Histogram('catalog_request_phase_duration_seconds',
+                                   "Time each request spent per phase (mongo, scryfall, ratelimit, serialize).", ('phase',))
+mongo_command_duration = Histogram('catalog_mongo_command_duration_seconds', "Duration of MongoDB commands.", ('command',))
+mongo_command_failures = Counter('catalog_mongo_command_failures_total', "MongoDB commands that failed.", ('command',))
+mongo_pool_connections = Gauge('catalog_mongo_pool_connections', "Open connections in the MongoDB connection pool.")
+mongo_pool_checked_out = Gauge('catalog_mongo_pool_checked_out_connections', "MongoDB connections currently in use.")
+mongo_pool_checkout_wait = Histogram('catalog_mongo_pool_checkout_wait_seconds', "Time spent waiting for a pooled MongoDB connection.")
+mongo_pool_checkout_failures = Counter('catalog_mongo_pool_checkout_failures_total', "Failed MongoDB connection checkouts.", ('reason',))
+scryfall_request_duration = Histogram('catalog_scryfall_request_duration_seconds', "Duration of Scryfall API requests.",
+                                      ('method', 'status'))
+scryfall_throttled = Counter('catalog_scryfall_throttled_total', "Scryfall API responses with status 429.")
+scryfall_rate_limit_wait = Histogram('catalog_scryfall_rate_limit_wait_seconds', "Time spent waiting for the Scryfall rate limiter.")
+image_cache_lookups = Counter('catalog_image_cache_lookups_total', "Image URL cache lookups by result.", ('result',))
+response_cache_lookups = Counter('catalog_response_cache_lookups_total', "Response cache lookups by result.", ('result',))
+
+# --- Per-request phase timings ---
+
+# Phase -> seconds spent in it by the current request; None outside of a request (e.g. background threads).
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def start_request_timing():
+    """Starts collecting phase timings for the current request."""
+    _request_timings.set({})
+
+def finish_request_timing() -> dict:
+    """Stops collecting, records the request's phase totals in the histogram and returns them."""
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    if not timings:
+        return {}
+    for phase, seconds in timings.items():
+        request_phase_duration.observe(seconds, (phase,))
+    return timings
+
+def record_phase(phase: str, seconds: float):
+    """Adds time spent in a phase to the current request (no-op outside of a request)."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed(phase: str):
+    """Times the enclosed block as part of the given phase of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+def format_server_timing(timings: dict, total_seconds: float) -> str:
+    """Formats phase timings as a Server-Timing header value (durations in milliseconds)."""
+    entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+# --- MongoDB driver listeners (registered on the MongoClient in database.py) ---
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every MongoDB command, so routes get their 'mongo' phase without wrapping each query."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration.observe(seconds, (event.command_name,))
+        record_phase('mongo', seconds)
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration.observe(seconds, (event.command_name,))
+        mongo_command_failures.inc((event.command_name,))
+        record_phase('mongo', seconds)
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out pool connections and how long checkouts wait."""
+
+    def __init__(self):
+        self._checkout_started = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec()
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc((event.reason,))
+
+    def connection_checked_out(self, event):
+        mongo_pool_checked_out.inc()
+        started = getattr(self._checkout_started, 'value', None)
+        if started is not None:
+            mongo_pool_checkout_wait.observe(time.perf_counter() - started)
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec()
@@ -0,0 +1,38 @@
+import base64
+import json
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+
+# Results are ordered by the normalized name, with _id as a tie-breaker so the order is total.
+# The compound index {name_normalized: 1, _id: 1} (see services/card_search.py) serves this sort,
+# so fetching any page is an index seek plus 'limit' entries, no matter how deep the page is.
+PAGE_SORT = [("name_normalized", ASCENDING), ("_id", ASCENDING)]
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that wasn't produced by encode_cursor()."""
+
+def encode_cursor(card: dict) -> str:
+    """Builds the opaque cursor pointing just past the given card (the last card of a page)."""
+    position = [card.get("name_normalized", ""), str(card["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[str, ObjectId]:
+    """Returns the (name_normalized, _id) sort position stored in a cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        name_normalized, card_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(name_normalized), ObjectId(card_id)
+    except (ValueError, TypeError, InvalidId) as e: # json.JSONDecodeError and binascii.Error are ValueErrors
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+def apply_cursor(query_filter: dict, cursor: str | None) -> dict:
+    """Restricts a filter to the cards that sort after the cursor position (keyset pagination)."""
+    if not cursor:
+        return query_filter
+    name_normalized, card_id = decode_cursor(cursor)
+    after_cursor = {"$or": [
+        {"name_normalized": {"$gt": name_normalized}},
+        {"name_normalized": name_normalized, "_id": {"$gt": card_id}}
+    ]}
+    return {"$and": [query_filter, after_cursor]}
@@ -0,0 +1,210 @@
+import re
+from dataclasses import dataclass
+from services.card_search import build_name_filter, normalize_name, FILTER_INDEXES
+
+# Scryfall-style search syntax for /api/cards, e.g. 'set:KHC r:rare is:foil price>1 lang:en bolt'.
+# parse_query() turns the text into a SearchQuery (the AST: a list of ANDed terms) and
+# plan_query() compiles it into a MongoDB filter plus the index that should serve it.
+
+# One term: an optional '-' (negation), an optional 'key' + operator, then a quoted or bare value.
+# 'Protection:' followed by a space has no value, so it falls back to a plain word.
+_TERM_PATTERN = re.compile(
+    r'(?P<negated>-)?'
+    r'(?:(?P<key>[A-Za-z]+)(?P<operator>:|>=|<=|!=|>|<|=)(?=\S))?'
+    r'(?:"(?P<quoted>[^"]*)"?|(?P<word>\S+))'
+)
+
+# Query key -> card document field
+FIELD_ALIASES = {
+    'name': 'name', 'n': 'name',
+    'set': 'set_code', 's': 'set_code', 'e': 'set_code', 'edition': 'set_code',
+    'rarity': 'rarity', 'r': 'rarity',
+    'condition': 'condition', 'cond': 'condition',
+    'language': 'language', 'lang': 'language', 'l': 'language',
+    'binder': 'binder_name', 'b': 'binder_name',
+    'price': 'purchase_price', 'p': 'purchase_price',
+    'quantity': 'quantity', 'qty': 'quantity',
+    'is': 'foil',
+}
+
+NUMERIC_FIELDS = ('purchase_price', 'quantity')
+
+_RARITY_ABBREVIATIONS = {'c': 'common', 'u': 'uncommon', 'r': 'rare', 'm': 'mythic', 's': 'special'}
+_CONDITION_ABBREVIATIONS = {'nm': 'near_mint', 'm': 'mint'}
+# 'is:' values -> stored 'foil' field value
+_FINISHES = {'foil': 'foil', 'nonfoil': 'normal', 'normal': 'normal', 'etched': 'etched'}
+
+_RANGE_OPERATORS = {'>': '$gt', '>=': '$gte', '<': '$lt', '<=': '$lte'}
+
+# How selective a predicate on each field usually is in a personal collection, most selective first.
+# Hundreds of sets and a handful of binders split the cards finely; almost every card is English,
+# near mint and non-foil, so those predicates are checked last and aren't worth an index of their own.
+FIELD_SELECTIVITY = ('set_code', 'binder_name', 'name', 'rarity', 'purchase_price', 'quantity',
+                     'condition', 'language', 'foil')
+
+class QuerySyntaxError(ValueError):
+    """Raised when a structured search query can't be understood (bad value or operator)."""
+
+@dataclass(frozen=True)
+class QueryTerm:
+    """One ANDed condition of a search query, e.g. field='rarity', operator='=', values=('rare',)."""
+    field: str
+    operator: str
+    values: tuple
+    negated: bool = False
+
+    def canonical(self) -> str:
+        values = ",".join(str(value) for value in self.values)
+        if self.field == 'name' or self.field == 'binder_name':
+            values = f'"{values}"'
+        return f"{'-' if self.negated else ''}{self.field}{self.operator}{values}"
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """The parsed query: the structured terms, plus the free text matched against the card name."""
+    terms: tuple
+    name_text: str = ''
+
+    def canonical(self, normalize_text: bool = True) -> str:
+        """A stable spelling of the query (terms sorted, values normalized), e.g. for cache keys."""
+        name_text = normalize_name(self.name_text) if normalize_text else self.name_text
+        parts = sorted(term.canonical() for term in self.terms)
+        return " ".join(parts + ([f'"{name_text}"'] if name_text else []))
+
+    def is_empty(self) -> bool:
+        """True if nothing is left to match on (e.g. the query was only '""'), which would match every card."""
+        return not self.terms and not normalize_name(self.name_text)
+
+def _parse_number(key: str, value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise QuerySyntaxError(f"'{key}' needs a number, got '{value}'.")
+
+def _normalize_value(field: str, key: str, value: str):
+    """Brings a query value into the form it is stored in, e.g. 'khc' -> 'KHC', 'r' -> 'rare'."""
+    value = value.strip()
+    if field in NUMERIC_FIELDS:
+        return _parse_number(key, value)
+    if field == 'set_code':
+        return value.upper()
+    if field == 'rarity':
+        value = value.lower()
+        return _RARITY_ABBREVIATIONS.get(value, value)
+    if field == 'condition':
+        value = value.lower().replace(' ', '_').replace('-', '_')
+        return _CONDITION_ABBREVIATIONS.get(value, value)
+    if field == 'language':
+        return value.lower()
+    if field == 'foil':
+        finish = _FINISHES.get(value.lower())
+        if finish is None:
+            raise QuerySyntaxError(f"Unknown 'is:' value '{value}' (expected one of: {', '.join(_FINISHES)}).")
+        return finish
+    return value # binder_name: matched exactly
+
+def parse_query(text: str) -> SearchQuery:
+    """
+    Parses a search query into a SearchQuery. Supported terms:
+
+    - plain words and "quoted phrases": matched against the card name (in order, as one text)
+    - set:KHC / s: / e:, r:rare (or r:r), is:foil / is:nonfoil / is:etched, lang:en,
+      cond:near_mint (or cond:nm), binder:"Trade Binder"
+    - price>1, price<=0.5, qty>=4 (also ':' / '=' for equality)
+    - comma-separated alternatives (r:rare,mythic) and '-' to negate a term (-is:foil, -r:common)
+
+    Unknown keys are kept as words, so names like 'Circle of Protection: Red' still search as typed.
+    """
+    terms = []
+    name_words = []
+    for match in _TERM_PATTERN.finditer(text):
+        key, operator = match.group('key'), match.group('operator')
+        negated = bool(match.group('negated'))
+        value = match.group('quoted') if match.group('quoted') is not None else match.group('word')
+        field = FIELD_ALIASES.get(key.lower()) if key else None
+
+        if field is None or field == 'name':
+            if key and field is None:
+                value = f"{key}{operator}{value}" # Not a key we know: part of the name after all
+            if negated:
+                terms.append(QueryTerm('name', ':', (value,), True))
+            elif value:
+                name_words.append(value)
+            continue
+
+        if operator == '!=':
+            operator, negated = '=', not negated
+        if operator == ':':
+            operator = '='
+        if operator in _RANGE_OPERATORS and field not in NUMERIC_FIELDS:
+            raise QuerySyntaxError(f"'{key}' can't be compared with '{operator}'.")
+
+        raw_values = [value] if operator in _RANGE_OPERATORS else [v for v in value.split(',') if v.strip()]
+        if not raw_values:
+            raise QuerySyntaxError(f"'{key}' needs a value.")
+        values = tuple(dict.fromkeys(_normalize_value(field, key, raw) for raw in raw_values))
+        terms.append(QueryTerm(field, operator, values, negated))
+
+    return SearchQuery(tuple(terms), " ".join(name_words))
+
+def _term_predicate(term: QueryTerm, search_mode: str) -> dict:
+    if term.field == 'name':
+        # Excluded words: a negated regex can't use an index, so it's always checked last.
+        if search_mode == 'regex':
+            return {"name": {"$not": {"$regex": re.escape(term.values[0]), "$options": "i"}}}
+        return {"name_normalized": {"$not": {"$regex": re.escape(normalize_name(term.values[0]))}}}
+
+    if term.operator in _RANGE_OPERATORS:
+        condition = {_RANGE_OPERATORS[term.operator]: term.values[0]}
+        return {term.field: {"$not": condition} if term.negated else condition}
+    if len(term.values) == 1:
+        return {term.field: {"$ne": term.values[0]} if term.negated else term.values[0]}
+    return {term.field: {"$nin" if term.negated else "$in": list(term.values)}}
+
+def _predicate_rank(field: str, negated: bool) -> tuple:
+    # Negations match most of the collection and can't narrow an index scan: always last.
+    return (negated, FIELD_SELECTIVITY.index(field))
+
+def _choose_index(terms, existing_indexes: frozenset) -> str | None:
+    """
+    Picks the compound index covering the longest run of equality predicates, preferring
+    the one led by the most selective field. Only indexes in existing_indexes are considered.
+    Returns None to leave the choice to MongoDB (e.g. a name-only search, served by the
+    trigram or name indexes, or while the filter indexes haven't been created yet).
+    """
+    equality_fields = {term.field for term in terms if term.operator == '=' and not term.negated}
+    best_name, best_key = None, None
+    for fields, index_name in FILTER_INDEXES:
+        if index_name not in existing_indexes:
+            continue
+        covered = 0
+        for field in fields:
+            if field not in equality_fields:
+                break
+            covered += 1
+        if not covered:
+            continue
+        key = (covered, -FIELD_SELECTIVITY.index(fields[0]))
+        if best_key is None or key > best_key:
+            best_name, best_key = index_name, key
+    return best_name
+
+def plan_query(search_query: SearchQuery, search_mode: str, existing_indexes: frozenset = frozenset()) -> tuple[dict, str | None]:
+    """
+    Compiles a parsed query into (MongoDB filter, index hint).
+    Predicates are ANDed most selective first, with the name text compiled by build_name_filter()
+    for the requested mode. A query with only name text compiles to exactly the plain name filter.
+    The hint is only ever one of existing_indexes (see card_search.get_existing_indexes()).
+    """
+    predicates = []
+    if search_query.name_text:
+        predicates.append((_predicate_rank('name', False), build_name_filter(search_query.name_text, search_mode)))
+    for term in search_query.terms:
+        predicates.append((_predicate_rank(term.field, term.negated), _term_predicate(term, search_mode)))
+    predicates.sort(key=lambda predicate: predicate[0])
+
+    if not predicates:
+        return {}, None
+    if len(predicates) == 1:
+        return predicates[0][1], _choose_index(search_query.terms, existing_indexes)
+    return {"$and": [predicate for _, predicate in predicates]}, _choose_index(search_query.terms, existing_indexes)
@@ -0,0 +1,139 @@
+import logging
+import math
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl # POSIX only; without it the limiter is shared between threads but not processes
+except ImportError:
+    fcntl = None
+
+# Setup a logger for this module
+limiter_logger = logging.getLogger(__name__)
+limiter_logger.setLevel(logging.INFO)
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket shared by every thread and every process that uses the same state file.
+
+    The bucket state (available tokens, time of the last refill) lives in a small file that is
+    only read and written while holding an exclusive flock on it, so N gunicorn workers together
+    stay within one request budget instead of N budgets. Callers reserve a token under the lock
+    and then sleep outside of it, so waiting callers don't hold up each other.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int, state_path: str):
+        self._rate = rate_per_second
+        self._burst = burst
+        self._state_path = state_path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+        # In-process fallback state, used if the state file can't be opened
+        self._local_state = (float(burst), time.time())
+
+    def _get_fd(self):
+        """Opens the state file, reopening it after a fork so each worker takes its own flock."""
+        if self._fd is None or self._fd_pid != os.getpid():
+            try:
+                self._fd = os.open(self._state_path, os.O_RDWR | os.O_CREAT, 0o666)
+                self._fd_pid = os.getpid()
+            except OSError as e:
+                limiter_logger.error(f"Rate limiter: cannot open state file '{self._state_path}', limiting this process only. Details: {e}")
+                self._fd = None
+        return self._fd
+
+    def _read_state(self, fd) -> tuple[float, float]:
+        if fd is None:
+            return self._local_state
+        raw = os.pread(fd, 64, 0).decode('ascii', errors='ignore').split()
+        try:
+            return float(raw[0]), float(raw[1])
+        except (IndexError, ValueError):
+            return float(self._burst), time.time() # Fresh (or corrupt) state file: start with a full bucket
+
+    def _write_state(self, fd, tokens: float, last_refill: float):
+        if fd is None:
+            self._local_state = (tokens, last_refill)
+            return
+        data = f"{tokens:.6f} {last_refill:.6f}".encode('ascii')
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, data, 0)
+
+    def _update(self, update):
+        """Runs update(tokens, last_refill, now) -> (tokens, last_refill, result) under the thread and file locks."""
+        with self._thread_lock:
+            fd = self._get_fd()
+            if fd is not None and fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                tokens, last_refill = self._read_state(fd)
+                tokens, last_refill, result = update(tokens, last_refill, time.time())
+                self._write_state(fd, tokens, last_refill)
+                return result
+            finally:
+                if fd is not None and fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _reserve(self, tokens: float, last_refill: float, now: float):
+        # last_refill may lie in the future while the bucket is paused by block_until().
+        if now > last_refill:
+            tokens = min(float(self._burst), tokens + (now - last_refill) * self._rate)
+            last_refill = now
+        tokens -= 1
+        # A negative balance is a queue of callers that already reserved a future slot.
+        wait = (last_refill - now) + max(0.0, -tokens) / self._rate
+        return tokens, last_refill, wait
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be sent under the shared budget.
+        Returns the number of seconds the caller had to wait (recorded in /metrics by the caller).
+        """
+        wait = self._update(self._reserve)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def block_until(self, resume_at: float):
+        """
+        Pauses the whole budget (every thread and process) until resume_at, e.g. after a 429 with Retry-After.
+        The bucket restarts empty at that time, so callers resume at the steady rate instead of in a burst.
+        """
+        def pause(tokens, last_refill, now):
+            if resume_at <= last_refill:
+                return tokens, last_refill, None # Already paused at least this long
+            if now > last_refill:
+                tokens = min(float(self._burst), tokens + (now - last_refill) * self._rate)
+            # Keep any queue of already reserved slots, but drop the saved-up burst.
+            return min(tokens, 0.0), resume_at, None
+        self._update(pause)
+        limiter_logger.warning(f"Rate limiter: pausing Scryfall requests for {max(0.0, resume_at - time.time()):.2f}s.")
+
+def parse_retry_after(value: str | None, max_seconds: float) -> float | None:
+    """
+    Parses a Retry-After header (delay in seconds or an HTTP date) into a delay in seconds.
+    The delay is capped at max_seconds, so a bogus header (e.g. a day, or a date far in the future)
+    can't pause every worker sharing the budget for that long.
+    """
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    if math.isnan(delay):
+        return None
+    if delay > max_seconds:
+        limiter_logger.warning(f"Rate limiter: Retry-After '{value}' exceeds {max_seconds}s; waiting {max_seconds}s instead.")
+    return min(max(0.0, delay), float(max_seconds))
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with full jitter: a random delay in [0, min(max, base * 2^attempt)]."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
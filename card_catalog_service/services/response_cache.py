@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, Response
+from services.data_version import get_current_data_version
+from services.metrics import response_cache_lookups
+from config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_CONTROL
+
+# Setup a logger for this module
+response_cache_logger = logging.getLogger(__name__)
+response_cache_logger.setLevel(logging.INFO)
+
+# Response headers worth keeping with a cached body (e.g. the paging headers of /api/cards)
+_CACHED_HEADER_PREFIXES = ('X-', 'Link')
+
+class ResponseCache:
+    """
+    In-process LRU cache of finished JSON responses, bounded by the total size of the bodies.
+    Every entry is tagged with the data version it was built from; a lookup under a different
+    version (i.e. after an ingest) misses, and the first such lookup clears the whole cache.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (body, status, headers, etag, stored_at)
+        self._size_bytes = 0
+        self._data_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _clear(self, data_version):
+        self._entries.clear()
+        self._size_bytes = 0
+        self._data_version = data_version
+
+    def get(self, key, data_version):
+        with self._lock:
+            if data_version != self._data_version:
+                if self._entries:
+                    response_cache_logger.info(f"Response cache: data version changed to {data_version}, dropping {len(self._entries)} entries.")
+                self._clear(data_version)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[4] > self._ttl_seconds:
+                self._size_bytes -= len(entry[0])
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, data_version, body: bytes, status: int, headers: dict, etag: str):
+        if len(body) > self._max_bytes:
+            return
+        with self._lock:
+            if data_version != self._data_version:
+                return # Built from data that is already outdated
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= len(previous[0])
+            self._entries[key] = (body, status, headers, etag, time.monotonic())
+            self._size_bytes += len(body)
+            while self._size_bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted[0])
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+
+def _respond(body: bytes, status: int, headers: dict, etag: str, cache_status: str):
+    """Builds the response for a cached or freshly built body, answering conditional GETs with 304."""
+    response = Response(body, status=status, mimetype='application/json')
+    for name, value in headers.items():
+        response.headers[name] = value
+    response.set_etag(etag) # Strong ETag: identical bodies, byte for byte
+    response.headers['Cache-Control'] = RESPONSE_CACHE_CONTROL
+    response.headers['X-Cache'] = cache_status
+    return response.make_conditional(request)
+
+def cached_json_response(key_func):
+    """
+    Decorator caching a JSON view's 200 and 404 responses under key_func(), a normalized key
+    built from the request, until the collection's data version changes. Responses carry a
+    strong ETag and Cache-Control, so browsers and proxies can revalidate them with 304s.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = key_func()
+            data_version = get_current_data_version()
+            entry = response_cache.get(key, data_version)
+            if entry is not None:
+                response_cache_lookups.inc(('hit',))
+                body, status, headers, etag, _ = entry
+                return _respond(body, status, headers, etag, 'HIT')
+            response_cache_lookups.inc(('miss',))
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 404) or 'no-store' in response.headers.get('Cache-Control', ''):
+                return response # Errors and debugging output (e.g. explain) aren't cached
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            headers = {name: value for name, value in response.headers.items() if name.startswith(_CACHED_HEADER_PREFIXES)}
+            response_cache.put(key, data_version, body, response.status_code, headers, etag)
+            return _respond(body, response.status_code, headers, etag, 'MISS')
+        return wrapper
+    return decorator
@@ -1,84 +1,264 @@
 import requests
+import os
 import time
 import logging
-from functools import lru_cache # For a simple in-memory cache
-from config import SCRYFALL_API_BASE_URL, SCRYFALL_USER_AGENT, SCRYFALL_REQUEST_DELAY_SECONDS
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from config import (SCRYFALL_API_BASE_URL, SCRYFALL_USER_AGENT, SCRYFALL_COLLECTION_BATCH_SIZE,
+                    SCRYFALL_REQUEST_TIMEOUT_SECONDS, SCRYFALL_POOL_MAXSIZE,
+                    SCRYFALL_RATE_LIMIT_PER_SECOND, SCRYFALL_RATE_LIMIT_BURST, SCRYFALL_RATE_LIMIT_STATE_PATH,
+                    SCRYFALL_MAX_RETRIES, SCRYFALL_BACKOFF_BASE_SECONDS, SCRYFALL_BACKOFF_MAX_SECONDS,
+                    SCRYFALL_RETRY_AFTER_MAX_SECONDS,
+                    SCRYFALL_RESOLVER_THREADS, IMAGE_DOWNLOAD_MAX_BYTES)
+from services.image_cache import create_image_url_cache
+from services.rate_limiter import TokenBucketRateLimiter, parse_retry_after, backoff_delay
+from services.scryfall_card_fields import extract_image_url
+from services.metrics import (record_phase, timed, scryfall_request_duration, scryfall_throttled, scryfall_rate_limit_wait,
+                              image_cache_lookups)
 
 # Setup a logger for this module
 scryfall_logger = logging.getLogger(__name__)
 scryfall_logger.setLevel(logging.INFO)
 
-# A simple in-memory cache for image URLs.
-# maxsize=1024 means it will store up to 1024 unique image URLs.
-# If more are requested, the least recently used ones will be removed.
-@lru_cache(maxsize=1024)
-def _get_image_url_from_scryfall_api(scryfall_id: str) -> str | None:
+# --- Pooled HTTP Session ---
+# A single keep-alive session is shared by every request to Scryfall, so repeated lookups
+# reuse TCP/TLS connections instead of opening a new one per card.
+_session = requests.Session()
+_session.headers.update({
+    "User-Agent": SCRYFALL_USER_AGENT,
+    "Accept": "application/json"
+})
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SCRYFALL_POOL_MAXSIZE))
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=SCRYFALL_POOL_MAXSIZE))
+
+# --- Rate Limiting ---
+# One request budget shared by every thread and worker process (see services/rate_limiter.py).
+_rate_limiter = TokenBucketRateLimiter(SCRYFALL_RATE_LIMIT_PER_SECOND, SCRYFALL_RATE_LIMIT_BURST,
+                                       SCRYFALL_RATE_LIMIT_STATE_PATH)
+
+# --- Image URL Cache ---
+# Resolved image URLs live in a shared cache (MongoDB or SQLite, see SCRYFALL_CACHE_BACKEND)
+# behind a small in-process L1 layer, so every worker and every restart starts warm.
+# It is created on first use, i.e. after the database connection is up (and after any worker fork).
+_image_url_cache = None
+_image_url_cache_lock = threading.Lock()
+
+def _get_image_url_cache():
+    """Returns the image URL cache, creating it on first use."""
+    global _image_url_cache
+    if _image_url_cache is None:
+        with _image_url_cache_lock:
+            if _image_url_cache is None:
+                _image_url_cache = create_image_url_cache()
+    return _image_url_cache
+
+# --- Background Image Resolver ---
+# Cache misses are fetched by a small pool of resolver threads instead of the request thread, so a
+# request can stop waiting at its deadline while the fetch finishes in the background and fills the cache.
+# IDs already being fetched are shared: concurrent requests for the same cards wait on the same batch.
+_resolver = None
+_resolver_pid = None
+_in_flight = {} # Scryfall ID -> Future of the batch resolving it
+_in_flight_lock = threading.Lock()
+
+def _get_resolver() -> ThreadPoolExecutor:
+    """Returns this process's resolver pool (pool threads don't survive a fork, so each worker makes its own)."""
+    global _resolver, _resolver_pid
+    if _resolver is None or _resolver_pid != os.getpid():
+        with _in_flight_lock:
+            if _resolver is None or _resolver_pid != os.getpid():
+                _in_flight.clear()
+                _resolver = ThreadPoolExecutor(max_workers=SCRYFALL_RESOLVER_THREADS, thread_name_prefix="scryfall-resolver")
+                _resolver_pid = os.getpid()
+    return _resolver
+
+def _send_scryfall_request(method: str, url: str, **kwargs) -> requests.Response:
     """
-    Internal function to fetch an image URL directly from the Scryfall API.
-    This function is rate-limited and cached.
+    Sends a request to Scryfall under the shared rate budget.
+    429 and 5xx responses are retried up to SCRYFALL_MAX_RETRIES times, waiting for Retry-After
+    if Scryfall sends one and with jittered exponential backoff otherwise. A 429 pauses the
+    budget for every worker, not just this caller. Returns the last response received.
     """
-    # Implement rate limiting before making the request
-    time.sleep(SCRYFALL_REQUEST_DELAY_SECONDS)
-    
-    url = f"{SCRYFALL_API_BASE_URL}/cards/{scryfall_id}"
-    headers = {
-        "User-Agent": SCRYFALL_USER_AGENT,
-        "Accept": "application/json"
-    }
+    attempt = 0
+    while True:
+        waited = _rate_limiter.acquire()
+        scryfall_rate_limit_wait.observe(waited)
+        if waited > 0:
+            record_phase('ratelimit', waited)
+            scryfall_logger.debug(f"Waited {waited:.3f}s for the Scryfall rate limiter before {method} {url}.")
+
+        started = time.perf_counter()
+        try:
+            response = _session.request(method, url, timeout=SCRYFALL_REQUEST_TIMEOUT_SECONDS, **kwargs) # Add a timeout for external requests
+        finally:
+            elapsed = time.perf_counter() - started
+            record_phase('scryfall', elapsed)
+        scryfall_request_duration.observe(elapsed, (method, response.status_code))
+        if response.status_code == 429:
+            scryfall_throttled.inc()
+        if response.status_code != 429 and response.status_code < 500:
+            return response
+        if attempt >= SCRYFALL_MAX_RETRIES:
+            scryfall_logger.error(f"Giving up on {method} {url} after {attempt + 1} attempts. Last status: {response.status_code}")
+            return response
+
+        delay = parse_retry_after(response.headers.get('Retry-After'), SCRYFALL_RETRY_AFTER_MAX_SECONDS)
+        if delay is None:
+            delay = backoff_delay(attempt, SCRYFALL_BACKOFF_BASE_SECONDS, SCRYFALL_BACKOFF_MAX_SECONDS)
+        if response.status_code == 429:
+            scryfall_logger.warning(f"Scryfall API rate limit hit (429) for {method} {url}. Retrying in {delay:.2f}s.")
+            _rate_limiter.block_until(time.time() + delay)
+        else:
+            scryfall_logger.warning(f"Scryfall API error {response.status_code} for {method} {url}. Retrying in {delay:.2f}s.")
+            time.sleep(delay)
+            record_phase('ratelimit', delay) # Backing off, like waiting for the limiter
+        attempt += 1
+
+def _get_image_urls_from_scryfall_collection(scryfall_ids: list[str]) -> dict[str, str | None] | None:
+    """
+    Internal function to resolve up to SCRYFALL_COLLECTION_BATCH_SIZE IDs with a single
+    POST to Scryfall's /cards/collection endpoint.
+    Returns a dict of ID -> image URL (None for cards Scryfall doesn't know),
+    or None if the request itself failed and nothing should be cached.
+    """
+    url = f"{SCRYFALL_API_BASE_URL}/cards/collection"
+    payload = {"identifiers": [{"id": scryfall_id} for scryfall_id in scryfall_ids]}
 
     try:
-        scryfall_logger.info(f"Fetching image URL for Scryfall ID: {scryfall_id} from external API.")
-        response = requests.get(url, headers=headers, timeout=5) # Add a timeout for external requests
+        scryfall_logger.info(f"Fetching image URLs for {len(scryfall_ids)} Scryfall IDs from external API in one batch.")
+        response = _send_scryfall_request("POST", url, json=payload)
         response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        
+
         data = response.json()
-        
-        # Scryfall provides different image URIs. 'normal' is usually a good default.
-        # Check Scryfall API docs for other options like 'large', 'art_crop', 'png'.
-        image_url = data.get('image_uris', {}).get('normal')
-        
-        if image_url:
-            scryfall_logger.info(f"Successfully retrieved image URL for {scryfall_id}.")
-            return image_url
-        else:
-            scryfall_logger.warning(f"No 'normal' image_uri found for Scryfall ID: {scryfall_id}. Full response: {data}")
-            return None
+
+        # Every requested ID gets an entry; IDs listed in 'not_found' (or missing a usable image) stay None.
+        results = {scryfall_id: None for scryfall_id in scryfall_ids}
+        for card_data in data.get('data', []):
+            card_id = card_data.get('id')
+            if card_id in results:
+                results[card_id] = extract_image_url(card_data)
+
+        not_found = data.get('not_found', [])
+        if not_found:
+            scryfall_logger.warning(f"{len(not_found)} Scryfall IDs in batch were not found on Scryfall API: {not_found}")
+        return results
 
     except requests.exceptions.HTTPError as http_err:
-        scryfall_logger.error(f"HTTP error fetching image for {scryfall_id}: {http_err}. Status: {http_err.response.status_code}")
-        if http_err.response.status_code == 404:
-            scryfall_logger.warning(f"Card with Scryfall ID {scryfall_id} not found on Scryfall API (404).")
-        elif http_err.response.status_code == 429:
-            scryfall_logger.error(f"Scryfall API rate limit hit for {scryfall_id}. Consider increasing delay or implementing exponential backoff.")
+        scryfall_logger.error(f"HTTP error fetching image batch: {http_err}. Status: {http_err.response.status_code}")
+        if http_err.response.status_code == 429:
+            scryfall_logger.error(f"Scryfall API rate limit still hit for image batch after {SCRYFALL_MAX_RETRIES} retries.")
         return None
     except requests.exceptions.ConnectionError as conn_err:
-        scryfall_logger.error(f"Connection error fetching image for {scryfall_id}: {conn_err}. Is Scryfall API reachable?")
+        scryfall_logger.error(f"Connection error fetching image batch: {conn_err}. Is Scryfall API reachable?")
         return None
     except requests.exceptions.Timeout as timeout_err:
-        scryfall_logger.error(f"Timeout error fetching image for {scryfall_id}: {timeout_err}. Scryfall API took too long to respond.")
+        scryfall_logger.error(f"Timeout error fetching image batch: {timeout_err}. Scryfall API took too long to respond.")
         return None
     except requests.exceptions.RequestException as req_err:
-        scryfall_logger.error(f"An unexpected request error occurred fetching image for {scryfall_id}: {req_err}", exc_info=True)
+        scryfall_logger.error(f"An unexpected request error occurred fetching image batch: {req_err}", exc_info=True)
         return None
     except Exception as e:
-        scryfall_logger.error(f"An unexpected error occurred processing Scryfall response for {scryfall_id}: {e}", exc_info=True)
+        scryfall_logger.error(f"An unexpected error occurred processing Scryfall batch response: {e}", exc_info=True)
         return None
 
-def get_card_image_url(scryfall_id: str) -> str | None:
+def _resolve_batch(batch: list[str]) -> dict[str, str | None]:
+    """Fetches one batch of image URLs on a resolver thread and stores the results in the cache."""
+    try:
+        batch_results = _get_image_urls_from_scryfall_collection(batch)
+        if batch_results is None:
+            # The whole request failed (timeout, 429, ...); cache it as a short-lived negative result
+            # so a Scryfall outage doesn't turn every search into another failing request.
+            batch_results = {scryfall_id: None for scryfall_id in batch}
+        _get_image_url_cache().set_many(batch_results)
+        return batch_results
+    finally:
+        with _in_flight_lock:
+            for scryfall_id in batch:
+                _in_flight.pop(scryfall_id, None)
+
+def resolve_card_image_urls(scryfall_ids: list[str], timeout: float | None = None) -> tuple[dict[str, str | None], set[str]]:
+    """
+    Gets image URLs for many cards at once, e.g. a whole page of search results, waiting at most
+    'timeout' seconds (None: until every fetch has finished).
+    Cached IDs are answered from the cache; the remaining IDs are resolved concurrently by the
+    resolver threads, with as few /cards/collection requests as possible (up to
+    SCRYFALL_COLLECTION_BATCH_SIZE IDs each), all under the shared rate budget.
+    Returns (ID -> image URL, None if it couldn't be retrieved; IDs still being fetched at the deadline).
+    Pending IDs keep being fetched in the background, so a later request finds them in the cache.
     """
-    Public function to get a card's image URL.
-    Uses an internal cache and fetches from Scryfall API if not cached.
+    requested_ids = [scryfall_id for scryfall_id in dict.fromkeys(scryfall_ids) if scryfall_id] # De-duplicate while preserving order
+    results = _get_image_url_cache().get_many(requested_ids)
+    missing_ids = [scryfall_id for scryfall_id in requested_ids if scryfall_id not in results]
+    image_cache_lookups.inc(('hit',), len(results))
+    image_cache_lookups.inc(('miss',), len(missing_ids))
+    if not missing_ids:
+        return results, set()
+
+    scryfall_logger.debug(f"{len(results)} image URLs served from cache, {len(missing_ids)} to fetch from Scryfall.")
+    resolver = _get_resolver()
+    futures = {} # Scryfall ID -> Future of the batch resolving it
+    with _in_flight_lock:
+        new_ids = []
+        for scryfall_id in missing_ids:
+            if scryfall_id in _in_flight:
+                futures[scryfall_id] = _in_flight[scryfall_id] # Already being fetched for another request
+            else:
+                new_ids.append(scryfall_id)
+        for start in range(0, len(new_ids), SCRYFALL_COLLECTION_BATCH_SIZE):
+            batch = new_ids[start:start + SCRYFALL_COLLECTION_BATCH_SIZE]
+            future = resolver.submit(_resolve_batch, batch)
+            for scryfall_id in batch:
+                _in_flight[scryfall_id] = future
+                futures[scryfall_id] = future
+
+    with timed('images'):
+        done, _ = wait(set(futures.values()), timeout=timeout)
+    pending_ids = set()
+    for scryfall_id, future in futures.items():
+        if future not in done:
+            pending_ids.add(scryfall_id)
+            results[scryfall_id] = None
+        elif future.exception() is not None:
+            scryfall_logger.error(f"Resolving the image URL of {scryfall_id} failed. Details: {future.exception()}")
+            results[scryfall_id] = None
+        else:
+            results[scryfall_id] = future.result().get(scryfall_id)
+    if pending_ids:
+        scryfall_logger.info(f"{len(pending_ids)} image URLs not resolved within {timeout}s; they are still being fetched.")
+    return results, pending_ids
+
+def get_card_image_urls(scryfall_ids: list[str]) -> dict[str, str | None]:
     """
-    if not scryfall_id:
-        scryfall_logger.warning("Received empty Scryfall ID for image lookup.")
-        return None # Or a URL to a generic placeholder image
-
-    # Try to get from cache first (lru_cache handles this automatically for _get_image_url_from_scryfall_api)
-    image_url = _get_image_url_from_scryfall_api(scryfall_id)
-    
-    if image_url:
-        scryfall_logger.debug(f"Returning image URL for {scryfall_id}.")
-        return image_url
-    else:
-        scryfall_logger.warning(f"Could not retrieve image URL for Scryfall ID: {scryfall_id}. Returning None.")
-        return None # Or a URL to a generic "image not available" placeholder
\ No newline at end of file
+    Public function to get image URLs for many cards at once, waiting until all of them are resolved.
+    Returns a dict of ID -> image URL (None if it couldn't be retrieved).
+    """
+    return resolve_card_image_urls(scryfall_ids)[0]
+
+def download_card_image(image_url: str) -> tuple[bytes, str] | None:
+    """
+    Downloads a card image from Scryfall's image CDN, reusing the pooled session.
+    Image files aren't served by the API, so they don't count against the API rate limit.
+    Returns (image bytes, content type), or None if the download failed or isn't an image.
+    """
+    started = time.perf_counter()
+    try:
+        with _session.get(image_url, headers={"Accept": "image/*"}, timeout=SCRYFALL_REQUEST_TIMEOUT_SECONDS, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+            if not content_type.startswith('image/'):
+                scryfall_logger.error(f"Unexpected content type '{content_type}' downloading {image_url}.")
+                return None
+            chunks, received = [], 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                received += len(chunk)
+                if received > IMAGE_DOWNLOAD_MAX_BYTES:
+                    scryfall_logger.error(f"Image at {image_url} exceeds {IMAGE_DOWNLOAD_MAX_BYTES} bytes; not downloaded.")
+                    return None
+                chunks.append(chunk)
+        return b"".join(chunks), content_type
+    except requests.exceptions.RequestException as req_err:
+        scryfall_logger.error(f"Error downloading card image {image_url}: {req_err}")
+        return None
+    finally:
+        record_phase('scryfall', time.perf_counter() - started)
@@ -0,0 +1,44 @@
+# Helpers for picking fields out of Scryfall card objects.
+# Shared by the live API client (services/scryfall_api.py) and the offline bulk-data
+# enrichment (ingestion-script/enrich_data.py), so both store and serve the same image URL.
+# Only uses the standard library, so the ingestion script can import it without the service's dependencies.
+
+# Card fields copied from Scryfall bulk data onto the card documents at ingest time.
+ENRICHMENT_FIELDS = (
+    "image_uris", "oracle_text", "type_line", "mana_cost", "cmc",
+    "colors", "color_identity", "layout", "scryfall_uri"
+)
+
+# Fields kept for each face of double-faced / split cards.
+CARD_FACE_FIELDS = ("name", "image_uris", "oracle_text", "type_line", "mana_cost")
+
+def extract_image_url(card_data: dict) -> str | None:
+    """
+    Picks the 'normal' image URL out of a Scryfall card object.
+    Double-faced cards have no top-level 'image_uris', so fall back to the front face.
+    """
+    # Scryfall provides different image URIs. 'normal' is usually a good default.
+    # Check Scryfall API docs for other options like 'large', 'art_crop', 'png'.
+    image_url = (card_data.get('image_uris') or {}).get('normal')
+    if not image_url:
+        card_faces = card_data.get('card_faces') or []
+        if card_faces:
+            image_url = (card_faces[0].get('image_uris') or {}).get('normal')
+    return image_url
+
+def build_enrichment_fields(card_data: dict) -> dict:
+    """
+    Returns the fields to store on a card document from a Scryfall card object,
+    including the resolved 'image_url' so search results don't need the live API.
+    """
+    fields = {field: card_data[field] for field in ENRICHMENT_FIELDS if field in card_data}
+    if card_data.get('card_faces'):
+        fields['card_faces'] = [
+            {field: face[field] for field in CARD_FACE_FIELDS if field in face}
+            for face in card_data['card_faces']
+        ]
+        # Multi-faced cards keep their rules text per face
+        if 'oracle_text' not in fields and any(face.get('oracle_text') for face in card_data['card_faces']):
+            fields['oracle_text'] = "\n//\n".join(face.get('oracle_text', '') for face in card_data['card_faces'])
+    fields['image_url'] = extract_image_url(card_data)
+    return fields
@@ -0,0 +1,209 @@
+import bisect
+import logging
+import threading
+from collections import Counter
+from database import get_cards_collection, get_data_version
+from services.card_search import normalize_name
+from config import SUGGEST_REFRESH_INTERVAL_SECONDS, SUGGEST_RETRY_INTERVAL_SECONDS
+
+# Setup a logger for this module
+suggest_logger = logging.getLogger(__name__)
+suggest_logger.setLevel(logging.INFO)
+
+def _padded_trigrams(normalized_name: str) -> set[str]:
+    """
+    Trigrams of a normalized name padded with spaces, so the start and end of a name
+    carry extra weight in the similarity score.
+    """
+    padded = f"  {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameSuggestIndex:
+    """
+    In-process index of the distinct card names in the collection, for autocomplete.
+
+    - Prefix matches come from a sorted array of normalized names (binary search).
+    - Typo-tolerant matches come from trigram posting lists, ranked by trigram similarity.
+
+    Lookups only touch memory. The index is filled with build() and kept current with
+    apply_changes(), which only touches the names that were added or removed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sorted_keys = [] # Normalized names, sorted, for prefix lookups
+        self._display_names = {} # normalized name -> display names (e.g. 'Lim-Dûl' and 'Lim-Dul' normalize alike)
+        self._trigram_postings = {} # trigram -> set of normalized names containing it
+        self._trigram_counts = {} # normalized name -> number of trigrams, for similarity scoring
+        self.data_version = None
+        self.built = False # Set by the first build(), even if the collection had no names
+
+    def __len__(self):
+        return len(self._display_names)
+
+    def build(self, names, data_version=None):
+        """Replaces the whole index with the given names."""
+        display_names = {}
+        for name in names:
+            if name:
+                display_names.setdefault(normalize_name(name), set()).add(name)
+        trigram_postings = {}
+        trigram_counts = {}
+        for key in display_names:
+            trigrams = _padded_trigrams(key)
+            trigram_counts[key] = len(trigrams)
+            for trigram in trigrams:
+                trigram_postings.setdefault(trigram, set()).add(key)
+        with self._lock:
+            self._sorted_keys = sorted(display_names)
+            self._display_names = display_names
+            self._trigram_postings = trigram_postings
+            self._trigram_counts = trigram_counts
+            self.data_version = data_version
+            self.built = True
+
+    def names(self) -> set[str]:
+        """Returns every display name in the index."""
+        with self._lock:
+            return {name for names in self._display_names.values() for name in names}
+
+    def apply_changes(self, added_names, removed_names, data_version=None):
+        """Adds and removes individual names without rebuilding the rest of the index."""
+        with self._lock:
+            for name in removed_names:
+                key = normalize_name(name)
+                variants = self._display_names.get(key)
+                if not variants:
+                    continue
+                variants.discard(name)
+                if variants:
+                    continue # Another spelling still maps to this key
+                del self._display_names[key]
+                del self._trigram_counts[key]
+                index = bisect.bisect_left(self._sorted_keys, key)
+                if index < len(self._sorted_keys) and self._sorted_keys[index] == key:
+                    del self._sorted_keys[index]
+                for trigram in _padded_trigrams(key):
+                    postings = self._trigram_postings.get(trigram)
+                    if postings is not None:
+                        postings.discard(key)
+                        if not postings:
+                            del self._trigram_postings[trigram]
+            for name in added_names:
+                if not name:
+                    continue
+                key = normalize_name(name)
+                if key in self._display_names:
+                    self._display_names[key].add(name)
+                    continue
+                self._display_names[key] = {name}
+                bisect.insort(self._sorted_keys, key)
+                trigrams = _padded_trigrams(key)
+                self._trigram_counts[key] = len(trigrams)
+                for trigram in trigrams:
+                    self._trigram_postings.setdefault(trigram, set()).add(key)
+            self.data_version = data_version
+
+    def suggest(self, query: str, limit: int, min_similarity: float) -> list[str]:
+        """
+        Returns up to 'limit' card names for a partially typed query:
+        names starting with the query first (alphabetically), then the closest
+        trigram matches, which also catch typos and words in the middle of a name.
+        """
+        normalized_query = normalize_name(query)
+        if not normalized_query or limit <= 0:
+            return []
+
+        with self._lock:
+            results = []
+            seen = set()
+
+            # 1. Prefix matches: a contiguous slice of the sorted array
+            position = bisect.bisect_left(self._sorted_keys, normalized_query)
+            while position < len(self._sorted_keys) and len(results) < limit:
+                key = self._sorted_keys[position]
+                if not key.startswith(normalized_query):
+                    break
+                results.append(key)
+                seen.add(key)
+                position += 1
+
+            # 2. Typo-tolerant matches, scored by how many of the query's trigrams a name contains;
+            #    ties go to the shorter (closer) name. A name must share at least one trigram of the
+            #    query's own text: the padding trigrams alone (e.g. '  t', ' ta' for 'tat') would
+            #    score every name starting with the same letters. Queries under 3 characters have
+            #    none and only get prefix matches.
+            content_trigrams = {normalized_query[i:i + 3] for i in range(len(normalized_query) - 2)}
+            if len(results) < limit and content_trigrams:
+                candidates = set()
+                for trigram in content_trigrams:
+                    candidates.update(self._trigram_postings.get(trigram, ()))
+                query_trigrams = _padded_trigrams(normalized_query)
+                shared_counts = Counter()
+                for trigram in query_trigrams:
+                    shared_counts.update(self._trigram_postings.get(trigram, ()))
+                scored = []
+                for key, shared in shared_counts.items():
+                    similarity = shared / len(query_trigrams)
+                    if key in candidates and key not in seen and similarity >= min_similarity:
+                        scored.append((-similarity, self._trigram_counts[key], key))
+                scored.sort()
+                results.extend(key for _, _, key in scored[:limit - len(results)])
+
+            return [min(self._display_names[key]) for key in results]
+
+# --- Shared Index Instance ---
+# One index per process, refreshed by a background thread when the collection's data version changes.
+suggest_index = NameSuggestIndex()
+_refresher_thread = None
+_refresher_stop = threading.Event() # Set by stop_suggest_index()
+
+def refresh_suggest_index():
+    """
+    Brings the suggestion index up to date with the cards collection.
+    Does nothing if the data version hasn't changed; otherwise only the names that
+    were added or removed since the last refresh are applied.
+    """
+    data_version = get_data_version()
+    if suggest_index.built and data_version == suggest_index.data_version:
+        return
+    current_names = {name for name in get_cards_collection().distinct("name") if isinstance(name, str)}
+    if not suggest_index.built:
+        suggest_index.build(current_names, data_version)
+        suggest_logger.info(f"Suggest: built index of {len(suggest_index)} distinct card names (data version {data_version}).")
+        return
+    indexed_names = suggest_index.names()
+    added_names = current_names - indexed_names
+    removed_names = indexed_names - current_names
+    suggest_index.apply_changes(added_names, removed_names, data_version)
+    suggest_logger.info(f"Suggest: data version {data_version}, added {len(added_names)} and removed {len(removed_names)} card names.")
+
+def _refresh_loop(stop_event: threading.Event):
+    while True:
+        try:
+            refresh_suggest_index()
+        except Exception as e:
+            suggest_logger.error(f"Suggest ERROR: could not refresh the suggestion index. Details: {e}")
+        if stop_event.wait(SUGGEST_REFRESH_INTERVAL_SECONDS if suggest_index.built else SUGGEST_RETRY_INTERVAL_SECONDS):
+            return
+
+def start_suggest_index():
+    """
+    Starts the daemon thread that builds the suggestion index and keeps it current.
+    Called once per process (threads don't survive a fork); until the first build succeeds,
+    it is retried every SUGGEST_RETRY_INTERVAL_SECONDS and /api/cards/suggest answers 503.
+    """
+    global _refresher_thread, _refresher_stop
+    if _refresher_thread is None or not _refresher_thread.is_alive():
+        _refresher_stop = threading.Event()
+        _refresher_thread = threading.Thread(target=_refresh_loop, args=(_refresher_stop,),
+                                             name="suggest-index-refresher", daemon=True)
+        _refresher_thread.start()
+
+def stop_suggest_index(timeout: float | None = None):
+    """Stops the refresher thread (waiting for a refresh in progress, up to timeout seconds). The index keeps its names."""
+    global _refresher_thread
+    _refresher_stop.set()
+    if _refresher_thread is not None and _refresher_thread is not threading.current_thread():
+        _refresher_thread.join(timeout)
+    _refresher_thread = None
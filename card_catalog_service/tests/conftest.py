@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# The service imports its modules as top-level packages ('config', 'services.*'), as when run from its directory;
+# the fake Scryfall API lives with the benchmarks.
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, os.path.join(SERVICE_DIR, '..', 'benchmarks'))
+
+# Settings read when config.py is imported: keep resolved image URLs in memory instead of MongoDB,
+# and don't share a rate limiter state file with a service running on this machine.
+os.environ.setdefault('SCRYFALL_CACHE_BACKEND', 'memory')
+os.environ.setdefault('SCRYFALL_RATE_LIMIT_STATE_PATH', os.path.join(tempfile.mkdtemp(), 'rate_limit.state'))
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instead of blocking."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+@pytest.fixture
+def fake_clock():
+    """A FakeClock; tests install it with monkeypatch.setattr(<module>, 'time', fake_clock)."""
+    return FakeClock()
@@ -0,0 +1,75 @@
+import pytest
+
+from services.decklist import parse_decklist, build_lookup_pipeline, match_lookup_results, DecklistParseError
+
+def _required(entries: list[dict]) -> dict:
+    return {entry["name"]: entry["required"] for entry in entries}
+
+def test_plain_lines_with_and_without_quantity():
+    entries = parse_decklist("4 Lightning Bolt\n2x Counterspell\n3X Llanowar Elves\nSol Ring\n")
+    assert _required(entries) == {"Lightning Bolt": 4, "Counterspell": 2, "Llanowar Elves": 3, "Sol Ring": 1}
+    assert entries[0]["normalized_name"] == "lightning bolt"
+
+def test_arena_printing_suffixes_are_dropped():
+    entries = parse_decklist("4 Lightning Bolt (M11) 149\n1 Rhys the Exiled (KHC) 73\n1 Sol Ring (CMM) 464 *F*")
+    assert _required(entries) == {"Lightning Bolt": 4, "Rhys the Exiled": 1, "Sol Ring": 1}
+
+def test_moxfield_lines():
+    entries = parse_decklist("1 Bounty of Skemfar [KHC] 12\n1 Arcane Signet *E*\n1x Command Tower (CMR) 350 *F*")
+    assert _required(entries) == {"Bounty of Skemfar": 1, "Arcane Signet": 1, "Command Tower": 1}
+
+def test_headers_and_comments_are_skipped():
+    text = """Name Elves Deck
+// Main deck
+Commander:
+1 Rhys the Exiled
+Deck
+4 Llanowar Elves
+# a comment
+
+Sideboard
+2 Naturalize
+SIDEBOARD:
+Maybeboard
+1 Elvish Mystic
+"""
+    assert _required(parse_decklist(text)) == {"Rhys the Exiled": 1, "Llanowar Elves": 4, "Naturalize": 2, "Elvish Mystic": 1}
+
+def test_quantities_of_the_same_card_are_summed():
+    entries = parse_decklist("3 Lightning Bolt\n\nSideboard\n1 lightning bolt (M11) 149\n0 Shock")
+    assert _required(entries) == {"Lightning Bolt": 4}
+
+def test_split_card_names_are_kept_whole():
+    assert _required(parse_decklist("1 Fire // Ice (MH2) 290")) == {"Fire // Ice": 1}
+
+@pytest.mark.parametrize('text', ["", "\n\n", "Sideboard\n// nothing here\n"])
+def test_lists_without_cards_raise(text):
+    with pytest.raises(DecklistParseError):
+        parse_decklist(text)
+
+def test_lookup_pipeline_matches_names_and_front_faces():
+    entries = parse_decklist("1 Delver of Secrets")
+    match_stage = build_lookup_pipeline(entries)[0]["$match"]
+    assert match_stage == {"$or": [
+        {"name_normalized": {"$in": ["delver of secrets"]}},
+        {"name_normalized": {"$gte": "delver of secrets // ", "$lt": "delver of secrets // \uffff"}},
+    ]}
+
+def test_results_match_full_names_and_front_faces():
+    entries = parse_decklist("2 Fire // Ice\n1 Fire\n4 Delver of Secrets\n1 Black Lotus")
+    groups = [
+        {"_id": "fire // ice", "name": "Fire // Ice", "owned": 1, "scryfall_id": "fire-id"},
+        {"_id": "delver of secrets // insectile aberration", "name": "Delver of Secrets // Insectile Aberration",
+         "owned": 2, "scryfall_id": "delver-id", "image_url": "https://example.test/delver.jpg"},
+        {"_id": "delver of secrets", "name": "Delver of Secrets", "owned": 1},
+    ]
+    results = {result["name"]: result for result in match_lookup_results(entries, groups)}
+
+    assert results["Fire // Ice"]["matched_name"] == "Fire // Ice"
+    assert (results["Fire // Ice"]["owned"], results["Fire // Ice"]["missing"]) == (1, 1)
+    assert results["Fire"]["matched_name"] == "Fire // Ice" # Front face
+    assert results["Fire"]["scryfall_id"] == "fire-id"
+    # Owned copies are summed over every matching name
+    assert (results["Delver of Secrets"]["owned"], results["Delver of Secrets"]["missing"]) == (3, 1)
+    assert results["Black Lotus"] == {"name": "Black Lotus", "matched_name": None, "required": 1, "owned": 0,
+                                      "missing": 1, "scryfall_id": None, "image_url": None}
@@ -0,0 +1,122 @@
+import pytest
+
+from services import image_cache
+from services.image_cache import MemoryImageUrlCache, SQLiteImageUrlCache, TieredImageUrlCache
+from config import (SCRYFALL_CACHE_TTL_SECONDS, SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS, SCRYFALL_CACHE_L1_TTL_SECONDS,
+                    SCRYFALL_CACHE_BACKEND_RETRY_SECONDS)
+
+URL = "https://cards.scryfall.io/normal/front/a.jpg"
+
+@pytest.fixture
+def clock(monkeypatch, fake_clock):
+    monkeypatch.setattr(image_cache, 'time', fake_clock)
+    return fake_clock
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / "scryfall_cache.sqlite3")
+
+def test_memory_entries_expire_after_their_ttl(clock):
+    cache = MemoryImageUrlCache(maxsize=10)
+    cache.set_many({"found": URL, "failed": None})
+    assert cache.get_many(["found", "failed", "unknown"]) == {"found": URL, "failed": None}
+
+    clock.now += SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS
+    assert cache.get_many(["found", "failed"]) == {"found": URL} # Failed lookups are retried soon
+    clock.now += SCRYFALL_CACHE_TTL_SECONDS
+    assert cache.get_many(["found"]) == {}
+
+def test_memory_max_ttl_caps_every_entry(clock):
+    cache = MemoryImageUrlCache(maxsize=10, max_ttl_seconds=SCRYFALL_CACHE_L1_TTL_SECONDS)
+    cache.set_many({"found": URL})
+    clock.now += SCRYFALL_CACHE_L1_TTL_SECONDS
+    assert cache.get_many(["found"]) == {}
+
+def test_memory_entries_never_outlive_a_given_expiry(clock):
+    cache = MemoryImageUrlCache(maxsize=10)
+    cache.set_many({"found": URL}, expires_at={"found": clock.now + 5})
+    clock.now += 5
+    assert cache.get_many(["found"]) == {}
+
+def test_memory_cache_evicts_the_least_recently_used_entry(clock):
+    cache = MemoryImageUrlCache(maxsize=2)
+    cache.set_many({"a": URL, "b": URL})
+    cache.get_many(["a"])
+    cache.set_many({"c": URL})
+    assert cache.get_many(["a", "b", "c"]) == {"a": URL, "c": URL}
+
+def test_sqlite_entries_expire_after_their_ttl(clock, sqlite_path):
+    cache = SQLiteImageUrlCache(sqlite_path)
+    cache.set_many({"found": URL, "failed": None})
+    assert cache.get_many(["found", "failed", "unknown"]) == {"found": URL, "failed": None}
+    assert cache.get_entries(["failed"]) == {"failed": (None, clock.now + SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS)}
+
+    clock.now += SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS
+    assert cache.get_many(["found", "failed"]) == {"found": URL}
+    clock.now += SCRYFALL_CACHE_TTL_SECONDS
+    assert cache.get_many(["found"]) == {}
+
+def test_sqlite_cache_is_shared_through_the_file(clock, sqlite_path):
+    # Like another worker process on the same host
+    SQLiteImageUrlCache(sqlite_path).set_many({"found": URL})
+    assert SQLiteImageUrlCache(sqlite_path).get_many(["found"]) == {"found": URL}
+
+def test_sqlite_cache_trims_to_its_size_bound(clock, sqlite_path, monkeypatch):
+    monkeypatch.setattr(image_cache, 'SCRYFALL_CACHE_MAX_ENTRIES', 3)
+    monkeypatch.setattr(image_cache, '_EVICTION_CHECK_INTERVAL', 5)
+    cache = SQLiteImageUrlCache(sqlite_path)
+    for number in range(5):
+        cache.set_many({f"id{number}": URL})
+        clock.now += 1
+    # The entries expiring soonest (the oldest ones here) go first
+    assert set(cache.get_many([f"id{number}" for number in range(5)])) == {"id2", "id3", "id4"}
+
+def test_tiered_cache_copies_l2_hits_into_l1_until_their_expiry(clock, sqlite_path):
+    l2 = SQLiteImageUrlCache(sqlite_path)
+    l2.set_many({"failed": None})
+    l1 = MemoryImageUrlCache(maxsize=10)
+    cache = TieredImageUrlCache(l1, lambda: l2, 'sqlite')
+
+    clock.now += 100
+    assert cache.get_many(["failed"]) == {"failed": None}
+    assert l1.get_many(["failed"]) == {"failed": None}
+    l2.set_many({"failed": URL}) # e.g. resolved by another worker
+    # The L1 copy of the negative entry expires with the L2 entry, not a full TTL after it was copied
+    clock.now += SCRYFALL_CACHE_NEGATIVE_TTL_SECONDS - 100
+    assert cache.get_many(["failed"]) == {"failed": URL}
+
+    cache.set_many({"found": URL})
+    assert l1.get_many(["found"]) == {"found": URL}
+    assert l2.get_many(["found"]) == {"found": URL}
+
+def test_tiered_cache_falls_back_to_l1_and_retries_the_backend(clock, sqlite_path):
+    attempts = []
+    def l2_factory():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise ConnectionError("MongoDB is unreachable")
+        return SQLiteImageUrlCache(sqlite_path)
+
+    cache = TieredImageUrlCache(MemoryImageUrlCache(maxsize=10), l2_factory, 'sqlite')
+    cache.set_many({"found": URL})
+    assert cache.get_many(["found", "unknown"]) == {"found": URL} # Served from L1
+    assert len(attempts) == 1 # Not retried before the backoff is over
+
+    clock.now += SCRYFALL_CACHE_BACKEND_RETRY_SECONDS
+    cache.set_many({"later": URL})
+    assert len(attempts) == 2
+    assert SQLiteImageUrlCache(sqlite_path).get_many(["found", "later"]) == {"later": URL}
+    cache.get_many(["unknown"])
+    assert len(attempts) == 2 # Built once it succeeded
+
+def test_tiered_cache_survives_l2_read_and_write_errors(clock):
+    class BrokenBackend:
+        def get_entries(self, scryfall_ids):
+            raise OSError("disk I/O error")
+
+        def set_many(self, entries):
+            raise OSError("disk I/O error")
+
+    cache = TieredImageUrlCache(MemoryImageUrlCache(maxsize=10), BrokenBackend, 'sqlite')
+    cache.set_many({"found": URL})
+    assert cache.get_many(["found", "unknown"]) == {"found": URL}
@@ -0,0 +1,70 @@
+import base64
+import json
+
+import pytest
+from bson import ObjectId
+
+from services.pagination import PAGE_SORT, encode_cursor, decode_cursor, apply_cursor, InvalidCursorError
+
+def _encode_raw(position) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _matches(card: dict, query: dict) -> bool:
+    """Evaluates the filters apply_cursor() builds: $and, $or, $gt and equality."""
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(_matches(card, part) for part in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches(card, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not card[field] > condition["$gt"]:
+                return False
+        elif card[field] != condition:
+            return False
+    return True
+
+def _read_page(cards: list[dict], cursor: str | None, limit: int) -> list[dict]:
+    """What /api/cards does with MongoDB: filter past the cursor, sort by PAGE_SORT, limit."""
+    matching = [card for card in cards if _matches(card, apply_cursor({}, cursor))]
+    return sorted(matching, key=lambda card: tuple(card[field] for field, _ in PAGE_SORT))[:limit]
+
+def test_cursor_round_trip():
+    card = {"_id": ObjectId(), "name_normalized": "lim-dul's vault"}
+    cursor = encode_cursor(card)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("lim-dul's vault", card["_id"])
+
+def test_no_cursor_leaves_the_filter_alone():
+    assert apply_cursor({"set_code": "KHC"}, None) == {"set_code": "KHC"}
+
+@pytest.mark.parametrize('cursor', [
+    "not a cursor!",
+    "é",
+    _encode_raw(["bolt"]), # Too short
+    _encode_raw(["bolt", "not-an-object-id"]),
+    _encode_raw(["bolt", 42]),
+    _encode_raw({"name": "bolt"}),
+    _encode_raw(7),
+    encode_cursor({"_id": ObjectId(), "name_normalized": "bolt"})[:-3], # Truncated
+])
+def test_malformed_or_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        apply_cursor({}, cursor)
+    assert issubclass(InvalidCursorError, ValueError)
+
+def test_walking_all_pages_returns_every_card_once_when_names_tie():
+    # Many printings of the same card share a name; _id orders them
+    names = ["forest"] * 7 + ["island"] * 5 + ["lightning bolt", "mountain", "mountain"]
+    cards = [{"_id": ObjectId(), "name_normalized": name} for name in names]
+    seen_ids = []
+    cursor = None
+    while True:
+        page = _read_page(cards, cursor, limit=3)
+        seen_ids += [card["_id"] for card in page]
+        if len(page) < 3:
+            break
+        cursor = encode_cursor(page[-1])
+    assert sorted(seen_ids) == sorted(card["_id"] for card in cards)
+    assert len(set(seen_ids)) == len(cards)
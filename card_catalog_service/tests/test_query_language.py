@@ -0,0 +1,90 @@
+import pytest
+
+from services.card_search import FILTER_INDEXES
+from services.query_language import parse_query, plan_query, QueryTerm, QuerySyntaxError, _choose_index
+
+ALL_FILTER_INDEXES = frozenset(name for _, name in FILTER_INDEXES)
+
+def test_plain_words_and_phrases_are_name_text():
+    query = parse_query('lightning  "Fire // Ice"')
+    assert query.terms == ()
+    assert query.name_text == "lightning Fire // Ice"
+
+def test_keys_are_parsed_into_normalized_terms():
+    query = parse_query('set:khc r:r,m is:nonfoil lang:EN cond:nm binder:"Trade Binder" price>=0.5 qty=4')
+    assert query.name_text == ''
+    assert query.terms == (
+        QueryTerm('set_code', '=', ('KHC',)),
+        QueryTerm('rarity', '=', ('rare', 'mythic')),
+        QueryTerm('foil', '=', ('normal',)),
+        QueryTerm('language', '=', ('en',)),
+        QueryTerm('condition', '=', ('near_mint',)),
+        QueryTerm('binder_name', '=', ('Trade Binder',)),
+        QueryTerm('purchase_price', '>=', (0.5,)),
+        QueryTerm('quantity', '=', (4.0,)),
+    )
+
+def test_negations():
+    query = parse_query('-is:foil r!=common -goblin')
+    assert query.terms == (
+        QueryTerm('foil', '=', ('foil',), negated=True),
+        QueryTerm('rarity', '=', ('common',), negated=True),
+        QueryTerm('name', ':', ('goblin',), negated=True),
+    )
+    assert query.name_text == ''
+
+def test_unknown_keys_stay_part_of_the_name():
+    query = parse_query('Circle of Protection: Red foo:bar')
+    assert query.terms == ()
+    assert query.name_text == "Circle of Protection: Red foo:bar"
+
+@pytest.mark.parametrize('text', ['price>cheap', 'r>rare', 'is:shiny', 'set:,'])
+def test_invalid_terms_raise(text):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(text)
+
+@pytest.mark.parametrize('text', ['""', '"" ""', '"   "'])
+def test_queries_without_terms_are_empty(text):
+    assert parse_query(text).is_empty()
+
+@pytest.mark.parametrize('text', ['bolt', 'r:rare', '-goblin'])
+def test_queries_with_terms_are_not_empty(text):
+    assert not parse_query(text).is_empty()
+
+def test_canonical_spelling_ignores_order_case_and_aliases():
+    first = parse_query('Bolt r:rare set:khc')
+    second = parse_query(' set:KHC  rarity:Rare  BOLT ')
+    assert first.canonical() == second.canonical() == 'rarity=rare set_code=KHC "bolt"'
+    # The legacy regex mode matches the name as typed, so its cache key keeps the spelling
+    assert first.canonical(normalize_text=False) != second.canonical(normalize_text=False)
+
+def test_name_only_query_compiles_to_the_plain_name_filter():
+    query_filter, hint = plan_query(parse_query('Bolt'), 'prefix', ALL_FILTER_INDEXES)
+    assert query_filter == {"name_normalized": {"$gte": "bolt", "$lt": "bolt\uffff"}}
+    assert hint is None
+
+def test_predicates_are_ordered_most_selective_first():
+    query_filter, hint = plan_query(parse_query('-is:foil price>1 r:rare,mythic set:KHC'), 'substring', ALL_FILTER_INDEXES)
+    assert query_filter == {"$and": [
+        {"set_code": "KHC"},
+        {"rarity": {"$in": ["rare", "mythic"]}},
+        {"purchase_price": {"$gt": 1.0}},
+        {"foil": {"$ne": "foil"}},
+    ]}
+    assert hint == "set_code_1_name_normalized_1__id_1"
+
+def test_empty_query_compiles_to_no_filter():
+    assert plan_query(parse_query('""'), 'substring', ALL_FILTER_INDEXES) == ({}, None)
+
+def test_index_led_by_the_most_selective_equality_field_is_hinted():
+    terms = parse_query('r:rare binder:Trades set:KHC').terms
+    assert _choose_index(terms, ALL_FILTER_INDEXES) == "set_code_1_name_normalized_1__id_1"
+    assert _choose_index(parse_query('r:rare binder:Trades').terms, ALL_FILTER_INDEXES) == "binder_name_1_name_normalized_1__id_1"
+
+def test_negated_and_range_terms_get_no_hint():
+    assert _choose_index(parse_query('-set:KHC price>1').terms, ALL_FILTER_INDEXES) is None
+
+def test_only_existing_indexes_are_hinted():
+    terms = parse_query('r:rare set:KHC').terms
+    assert _choose_index(terms, frozenset()) is None
+    assert _choose_index(terms, frozenset({"rarity_1_name_normalized_1__id_1"})) == "rarity_1_name_normalized_1__id_1"
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from services import rate_limiter
+from services.rate_limiter import TokenBucketRateLimiter, parse_retry_after, backoff_delay
+
+@pytest.fixture
+def clock(monkeypatch, fake_clock):
+    monkeypatch.setattr(rate_limiter, 'time', fake_clock)
+    return fake_clock
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "rate_limit.state")
+
+def test_burst_is_free_then_requests_are_spaced_at_the_rate(clock, state_path):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, burst=3, state_path=state_path)
+    waits = [limiter.acquire() for _ in range(5)]
+    assert waits == pytest.approx([0, 0, 0, 0.5, 0.5])
+
+def test_idle_time_refills_the_bucket_up_to_the_burst(clock, state_path):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, burst=3, state_path=state_path)
+    for _ in range(3):
+        limiter.acquire()
+    clock.now += 60
+    assert [limiter.acquire() for _ in range(4)] == pytest.approx([0, 0, 0, 0.5])
+
+def test_block_until_pauses_the_budget_and_restarts_it_empty(clock, state_path):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, burst=3, state_path=state_path)
+    limiter.block_until(clock.now + 5)
+    # Nothing goes out during the pause, and the saved-up burst is gone afterwards
+    assert limiter.acquire() == pytest.approx(5.5)
+    assert limiter.acquire() == pytest.approx(0.5)
+
+def test_shorter_pause_does_not_cut_a_longer_one_short(clock, state_path):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, burst=3, state_path=state_path)
+    limiter.block_until(clock.now + 10)
+    limiter.block_until(clock.now + 1)
+    assert limiter.acquire() == pytest.approx(10.5)
+
+def test_limiters_sharing_a_state_file_share_one_budget(clock, state_path):
+    # Like two worker processes on one host
+    first = TokenBucketRateLimiter(rate_per_second=2, burst=2, state_path=state_path)
+    second = TokenBucketRateLimiter(rate_per_second=2, burst=2, state_path=state_path)
+    assert [first.acquire(), second.acquire(), first.acquire()] == pytest.approx([0, 0, 0.5])
+    second.block_until(clock.now + 3)
+    assert first.acquire() == pytest.approx(3.5)
+
+def test_unwritable_state_file_limits_this_process_only(clock, tmp_path):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, burst=1, state_path=str(tmp_path / "missing" / "state"))
+    assert [limiter.acquire(), limiter.acquire()] == pytest.approx([0, 0.5])
+
+def test_retry_after_seconds(clock):
+    assert parse_retry_after('2', 60) == 2.0
+    assert parse_retry_after('-1', 60) == 0.0
+    assert parse_retry_after(None, 60) is None
+    assert parse_retry_after('soon', 60) is None
+    assert parse_retry_after('nan', 60) is None
+
+def test_retry_after_http_date(clock):
+    resume_at = datetime.fromtimestamp(clock.now + 30, tz=timezone.utc)
+    assert parse_retry_after(format_datetime(resume_at, usegmt=True), 60) == pytest.approx(30)
+    past = datetime.fromtimestamp(clock.now - 30, tz=timezone.utc)
+    assert parse_retry_after(format_datetime(past, usegmt=True), 60) == 0.0
+
+def test_retry_after_is_capped(clock):
+    assert parse_retry_after('86400', 60) == 60.0
+    far_future = datetime.fromtimestamp(clock.now + 365 * 86400, tz=timezone.utc)
+    assert parse_retry_after(format_datetime(far_future, usegmt=True), 60) == 60.0
+
+def test_backoff_delay_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, 'uniform', lambda low, high: high) # Always the longest delay
+    assert [backoff_delay(attempt, 0.5, 3) for attempt in range(5)] == [0.5, 1.0, 2.0, 3, 3]
+
+def test_backoff_delay_is_jittered():
+    delays = {backoff_delay(2, 0.5, 10) for _ in range(20)}
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(delays) > 1
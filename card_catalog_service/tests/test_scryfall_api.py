@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+
+from fake_scryfall import start_fake_scryfall
+from services import scryfall_api
+
+def _new_ids(count: int) -> list[str]:
+    # Resolved URLs stay in the process's cache, so every test asks for IDs of its own
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+@pytest.fixture
+def fake_scryfall(monkeypatch):
+    server = start_fake_scryfall(latency_ms=5)
+    monkeypatch.setattr(scryfall_api, 'SCRYFALL_API_BASE_URL', server.base_url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_ids_are_resolved_in_batches_of_75(fake_scryfall):
+    ids = _new_ids(160)
+    results, pending = scryfall_api.resolve_card_image_urls(ids)
+    assert pending == set()
+    assert sorted(fake_scryfall.collection_batch_sizes) == [10, 75, 75]
+    assert results == {scryfall_id: f"{fake_scryfall.base_url}/images/normal/{scryfall_id}.jpg" for scryfall_id in ids}
+
+    # Answered from the cache the second time
+    assert scryfall_api.resolve_card_image_urls(ids) == (results, set())
+    assert len(fake_scryfall.collection_batch_sizes) == 3
+
+def test_not_found_ids_resolve_to_none(fake_scryfall):
+    found, missing = _new_ids(2)
+    fake_scryfall.not_found_ids.add(missing)
+    results, pending = scryfall_api.resolve_card_image_urls([found, missing, found])
+    assert pending == set()
+    assert results == {found: f"{fake_scryfall.base_url}/images/normal/{found}.jpg", missing: None}
+
+def test_double_faced_cards_use_the_front_face_image(fake_scryfall):
+    (scryfall_id,) = _new_ids(1)
+    fake_scryfall.double_faced_ids.add(scryfall_id)
+    results = scryfall_api.get_card_image_urls([scryfall_id])
+    assert results == {scryfall_id: f"{fake_scryfall.base_url}/images/normal/front/{scryfall_id}.jpg"}
+
+def test_ids_unresolved_at_the_deadline_are_pending(fake_scryfall):
+    fake_scryfall.latency_ms = 500
+    ids = _new_ids(3)
+    results, pending = scryfall_api.resolve_card_image_urls(ids, timeout=0.05)
+    assert pending == set(ids)
+    assert results == dict.fromkeys(ids) # Placeholders until the background fetch is done
+
+    # The fetch finishes in the background and fills the cache for the next request
+    results, pending = scryfall_api.resolve_card_image_urls(ids)
+    assert pending == set()
+    assert all(results[scryfall_id] for scryfall_id in ids)
+    assert len(fake_scryfall.collection_batch_sizes) == 1
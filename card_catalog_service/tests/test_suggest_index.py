@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from services import suggest_index as suggest_module
+from services.suggest_index import NameSuggestIndex
+
+NAMES = ["Lightning Bolt", "Lightning Helix", "Chain Lightning", "Lim-Dûl's Vault", "Rhys the Exiled",
+         "Tail Swipe", "Take Flight", "Tatyova, Benthic Druid"]
+
+@pytest.fixture
+def index():
+    name_index = NameSuggestIndex()
+    name_index.build(NAMES, data_version=1)
+    return name_index
+
+def test_prefix_matches_come_first_in_alphabetical_order(index):
+    assert index.suggest("light", 10, 0.5)[:2] == ["Lightning Bolt", "Lightning Helix"]
+
+def test_matching_ignores_case_and_accents(index):
+    assert index.suggest("LIM-DUL", 10, 0.5) == ["Lim-Dûl's Vault"]
+
+def test_typos_and_words_inside_names_match(index):
+    assert index.suggest("lightnig bolt", 10, 0.5)[0] == "Lightning Bolt"
+    assert "Chain Lightning" in index.suggest("lightning", 10, 0.3)
+    assert index.suggest("rhys exled", 10, 0.5) == ["Rhys the Exiled"]
+
+def test_names_sharing_only_the_first_letters_are_not_suggested(index):
+    assert index.suggest("tat", 10, 0.5) == ["Tatyova, Benthic Druid"]
+
+def test_short_queries_get_prefix_matches_only(index):
+    assert index.suggest("ta", 10, 0.0) == ["Tail Swipe", "Take Flight", "Tatyova, Benthic Druid"]
+
+def test_limit_and_empty_queries(index):
+    assert len(index.suggest("l", 2, 0.5)) == 2
+    assert index.suggest("   ", 10, 0.5) == []
+    assert index.suggest("bolt", 0, 0.5) == []
+
+def test_spellings_normalizing_alike_share_one_entry():
+    name_index = NameSuggestIndex()
+    name_index.build(["Lim-Dûl's Vault", "Lim-Dul's Vault", "", None])
+    assert len(name_index) == 1
+    assert name_index.names() == {"Lim-Dûl's Vault", "Lim-Dul's Vault"}
+
+def test_apply_changes_adds_and_removes_names(index):
+    index.apply_changes(added_names={"Lightning Strike"}, removed_names={"Lightning Helix", "Not Indexed"}, data_version=2)
+    assert index.data_version == 2
+    assert index.suggest("lightning", 10, 0.5)[:2] == ["Lightning Bolt", "Lightning Strike"]
+    assert "Lightning Helix" not in index.suggest("helix", 10, 0.3)
+    assert "Lightning Helix" not in index.names()
+
+def test_apply_changes_keeps_a_name_while_another_spelling_remains():
+    name_index = NameSuggestIndex()
+    name_index.build(["Lim-Dûl's Vault", "Lim-Dul's Vault"])
+    name_index.apply_changes(added_names=(), removed_names={"Lim-Dul's Vault"})
+    assert name_index.suggest("lim", 10, 0.5) == ["Lim-Dûl's Vault"]
+    name_index.apply_changes(added_names=(), removed_names={"Lim-Dûl's Vault"})
+    assert name_index.suggest("lim", 10, 0.5) == []
+    assert len(name_index) == 0
+
+def test_apply_changes_matches_a_rebuild(index):
+    index.apply_changes(added_names={"Fire // Ice"}, removed_names={"Tail Swipe"})
+    rebuilt = NameSuggestIndex()
+    rebuilt.build(index.names())
+    for query in ("fire", "ice", "ta", "tail", "lightning", "exiled"):
+        assert index.suggest(query, 10, 0.3) == rebuilt.suggest(query, 10, 0.3)
+
+class FakeCardsCollection:
+    def __init__(self, names):
+        self.names = names
+        self.distinct_calls = 0
+
+    def distinct(self, field):
+        self.distinct_calls += 1
+        return list(self.names)
+
+@pytest.fixture
+def shared_index(monkeypatch):
+    """The module's shared index, reading from a fake collection instead of MongoDB."""
+    name_index = NameSuggestIndex()
+    collection = FakeCardsCollection([])
+    data_version = {"value": 1}
+    monkeypatch.setattr(suggest_module, 'suggest_index', name_index)
+    monkeypatch.setattr(suggest_module, 'get_cards_collection', lambda: collection)
+    monkeypatch.setattr(suggest_module, 'get_data_version', lambda: data_version["value"])
+    yield name_index, collection, data_version
+    suggest_module.stop_suggest_index(timeout=5)
+
+def test_empty_collection_counts_as_built(shared_index):
+    name_index, collection, _ = shared_index
+    suggest_module.refresh_suggest_index()
+    assert name_index.built and len(name_index) == 0
+    # Nothing changed: not read again
+    suggest_module.refresh_suggest_index()
+    assert collection.distinct_calls == 1
+
+def test_refresh_applies_changes_when_the_data_version_changes(shared_index):
+    name_index, collection, data_version = shared_index
+    suggest_module.refresh_suggest_index()
+    collection.names = ["Lightning Bolt", 42]
+    data_version["value"] = 2
+    suggest_module.refresh_suggest_index()
+    assert name_index.names() == {"Lightning Bolt"}
+    assert name_index.data_version == 2
+
+def test_refresher_thread_stops(shared_index):
+    name_index, _, _ = shared_index
+    suggest_module.start_suggest_index()
+    thread = suggest_module._refresher_thread
+    deadline = time.monotonic() + 5
+    while not name_index.built and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert name_index.built
+    suggest_module.stop_suggest_index(timeout=5)
+    assert not thread.is_alive()
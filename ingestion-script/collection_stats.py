@@ -0,0 +1,134 @@
+from pymongo import UpdateOne, ReplaceOne
+from collections import defaultdict
+import logging
+
+# Setup a logger for the statistics stage of the ingestion
+stats_logger = logging.getLogger(__name__)
+stats_logger.setLevel(logging.INFO)
+
+# Summary collection read by the catalog service's /api/stats endpoints
+STATS_COLLECTION_NAME = 'collection_stats'
+
+# Statistics dimension -> card document field it groups by.
+# 'total' groups every card into a single bucket.
+STAT_DIMENSIONS = {
+    'total': None,
+    'set': 'set_code',
+    'rarity': 'rarity',
+    'foil': 'foil',
+    'binder': 'binder_name',
+}
+
+# Card fields the summaries depend on; fetched whenever a change has to be subtracted
+STAT_SOURCE_FIELDS = ['quantity', 'purchase_price'] + [field for field in STAT_DIMENSIONS.values() if field]
+
+def _summary_id(dimension: str, value) -> str:
+    return f"{dimension}:{value}"
+
+class StatsDelta:
+    """
+    Accumulates the changes a sync makes to the summaries: each written or deleted card
+    adds or subtracts its entry count, card quantity and purchase value for every dimension.
+    """
+
+    def __init__(self):
+        self._changes = defaultdict(lambda: [0, 0, 0.0]) # (dimension, value) -> [entries, cards, purchase_price_total]
+
+    def __bool__(self):
+        return bool(self._changes)
+
+    def add(self, card_doc: dict, sign: int = 1):
+        quantity = card_doc.get('quantity')
+        quantity = 1 if quantity is None else quantity
+        price = card_doc.get('purchase_price') or 0.0
+        for dimension, field in STAT_DIMENSIONS.items():
+            value = 'all' if field is None else card_doc.get(field)
+            change = self._changes[(dimension, value)]
+            change[0] += sign
+            change[1] += sign * quantity
+            change[2] += sign * price * quantity
+
+    def remove(self, card_doc: dict):
+        self.add(card_doc, -1)
+
+    def apply(self, stats_collection) -> int:
+        """Applies the accumulated changes with $inc upserts and drops buckets that became empty."""
+        operations = [
+            UpdateOne(
+                {"_id": _summary_id(dimension, value)},
+                {"$inc": {"entries": entries, "cards": cards, "purchase_price_total": price_total},
+                 "$set": {"dimension": dimension, "value": value}},
+                upsert=True
+            )
+            for (dimension, value), (entries, cards, price_total) in self._changes.items()
+            if entries or cards or price_total
+        ]
+        if operations:
+            stats_collection.bulk_write(operations, ordered=False)
+            stats_collection.delete_many({"entries": {"$lte": 0}})
+        return len(operations)
+
+def _aggregate_summaries(cards_collection) -> list[dict]:
+    """Computes every summary document from scratch with one $group pipeline per dimension."""
+    summaries = []
+    for dimension, field in STAT_DIMENSIONS.items():
+        pipeline = [
+            {"$group": {
+                "_id": "all" if field is None else f"${field}",
+                "entries": {"$sum": 1},
+                "cards": {"$sum": {"$ifNull": ["$quantity", 1]}},
+                "purchase_price_total": {"$sum": {"$multiply": [
+                    {"$ifNull": ["$purchase_price", 0]}, {"$ifNull": ["$quantity", 1]}
+                ]}}
+            }}
+        ]
+        for group in cards_collection.aggregate(pipeline):
+            summaries.append({
+                "_id": _summary_id(dimension, group["_id"]),
+                "dimension": dimension,
+                "value": group["_id"],
+                "entries": group["entries"],
+                "cards": group["cards"],
+                "purchase_price_total": group["purchase_price_total"]
+            })
+    return summaries
+
+def recompute_stats(cards_collection, verify: bool = True) -> int:
+    """
+    Rebuilds the summary collection from the cards collection.
+    With verify=True, first compares the stored summaries with the recomputed ones and
+    logs every bucket that differs. Returns the number of buckets that differed.
+    """
+    stats_collection = cards_collection.database[STATS_COLLECTION_NAME]
+    summaries = _aggregate_summaries(cards_collection)
+    mismatches = 0
+    if verify:
+        stored = {doc["_id"]: doc for doc in stats_collection.find()}
+        for summary in summaries:
+            current = stored.pop(summary["_id"], None)
+            if (current is None or current.get("entries") != summary["entries"] or current.get("cards") != summary["cards"]
+                    or abs(current.get("purchase_price_total", 0) - summary["purchase_price_total"]) > 0.005):
+                mismatches += 1
+                stats_logger.warning(f"Stats mismatch for {summary['_id']}: stored {current}, recomputed {summary}")
+        for stale_id in stored:
+            mismatches += 1
+            stats_logger.warning(f"Stats mismatch for {stale_id}: stored bucket has no cards anymore.")
+        stats_logger.info(f"Stats verification: {mismatches} of {len(summaries)} buckets differed from a full recompute.")
+
+    if summaries:
+        stats_collection.bulk_write([ReplaceOne({"_id": summary["_id"]}, summary, upsert=True) for summary in summaries], ordered=False)
+    stats_collection.delete_many({"_id": {"$nin": [summary["_id"] for summary in summaries]}})
+    stats_logger.info(f"Recomputed {len(summaries)} statistics buckets from the cards collection.")
+    return mismatches
+
+def update_stats(cards_collection, stats_delta: StatsDelta):
+    """
+    Brings the summaries up to date after an ingest: applies the accumulated delta,
+    or recomputes everything if there are no summaries yet (e.g. the first run).
+    """
+    stats_collection = cards_collection.database[STATS_COLLECTION_NAME]
+    if stats_collection.estimated_document_count() == 0:
+        recompute_stats(cards_collection, verify=False)
+    elif stats_delta:
+        updated = stats_delta.apply(stats_collection)
+        stats_logger.info(f"Updated {updated} statistics buckets incrementally.")
@@ -0,0 +1,151 @@
+from pymongo import MongoClient, UpdateMany
+from pymongo.errors import ConnectionFailure, OperationFailure, BulkWriteError
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+
+# Share the Scryfall field helpers with the catalog service, so the stored image URL
+# is picked exactly the way the service picks it from live API responses.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'card_catalog_service'))
+from services.scryfall_card_fields import build_enrichment_fields
+
+# Setup a logger for this enrichment script
+enrich_logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(name)s: %(message)s')
+enrich_logger.setLevel(logging.INFO)
+
+# --- 1. MongoDB Connection Details for HOST-BASED ENRICHMENT ---
+# Same as ingest_data.py: connect through the port exposed on the host.
+MONGO_HOST_INGESTION = os.environ.get('MONGO_HOST', 'localhost')
+MONGO_PORT_INGESTION = int(os.environ.get('MONGO_PORT', 27017))
+DB_NAME = os.environ.get('MONGO_DB_NAME', 'mtg_collection_db')
+COLLECTION_NAME = 'cards'
+
+# --- 2. Path to a Scryfall Bulk Data File ---
+# Download 'Default Cards' (or 'All Cards') from https://scryfall.com/docs/api/bulk-data.
+# The file is parsed incrementally, so its size doesn't matter for memory use.
+BULK_DATA_FILE_PATH = 'default-cards.json'
+
+# --- 3. Streaming Settings ---
+READ_BLOCK_SIZE = 1 << 20 # Bytes read from the bulk data file at a time
+UPDATE_BATCH_SIZE = 1000 # Card updates per unordered bulk write
+
+def iter_json_array(file_path: str, block_size: int = READ_BLOCK_SIZE):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the file in blocks.
+    Only the current block and the element being decoded are held in memory, so a
+    multi-hundred-MB bulk data file can be processed without loading it whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as bulk_file:
+        buffer = bulk_file.read(block_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"'{file_path}' does not contain a JSON array.")
+        position = 1
+        end_of_file = False
+        while True:
+            # Skip the separators between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                element, next_position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element continues in the next block (or the file is truncated)
+                if end_of_file:
+                    raise
+                block = bulk_file.read(block_size)
+                end_of_file = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            yield element
+            position = next_position
+            # Drop what has been consumed once the buffer has grown past a block
+            if position > block_size:
+                buffer = buffer[position:]
+                position = 0
+
+def enrich_from_bulk_data(cards_collection, bulk_data_path: str = BULK_DATA_FILE_PATH) -> int:
+    """
+    Joins a Scryfall bulk data file to the collection by 'scryfall_id' and stores
+    image_uris (including double-faced card_faces), the resolved image_url and other
+    card details directly on the card documents.
+    Returns the number of card documents whose details changed.
+    """
+    if not os.path.exists(bulk_data_path):
+        enrich_logger.error(f"ERROR: Scryfall bulk data file not found at '{bulk_data_path}'.")
+        return 0
+
+    enrich_logger.info(f"\n--- Enriching cards from Scryfall bulk data '{bulk_data_path}' ---")
+    start_time = time.perf_counter()
+
+    # Only the IDs in the collection matter; everything else in the dump is skipped without building updates.
+    wanted_ids = {scryfall_id for scryfall_id in cards_collection.distinct("scryfall_id") if scryfall_id}
+    enrich_logger.info(f"{len(wanted_ids)} distinct Scryfall IDs in the collection.")
+
+    cards_scanned = 0
+    matched_ids = set()
+    documents_updated = 0
+    operations = []
+    enriched_at = datetime.now(timezone.utc)
+
+    try:
+        for card_data in iter_json_array(bulk_data_path):
+            cards_scanned += 1
+            scryfall_id = card_data.get('id')
+            if scryfall_id not in wanted_ids:
+                continue
+            matched_ids.add(scryfall_id)
+            fields = build_enrichment_fields(card_data)
+            # Only documents whose details differ are matched, so re-running with the same dump modifies
+            # nothing and doesn't bump the data version; enriched_at records when the details last changed.
+            changed = {"scryfall_id": scryfall_id, "$or": [{field: {"$ne": value}} for field, value in fields.items()]}
+            operations.append(UpdateMany(changed, {"$set": {**fields, "enriched_at": enriched_at}}))
+            if len(operations) >= UPDATE_BATCH_SIZE:
+                documents_updated += cards_collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                enrich_logger.info(f"Progress: {cards_scanned} bulk data cards scanned, {len(matched_ids)} matched.")
+        if operations:
+            documents_updated += cards_collection.bulk_write(operations, ordered=False).modified_count
+    except (ValueError, json.JSONDecodeError) as je:
+        enrich_logger.error(f"ERROR: Problem parsing Scryfall bulk data file: {je}")
+    except BulkWriteError as bwe:
+        enrich_logger.error(f"ERROR: MongoDB bulk write failed during enrichment. Details: {bwe.details}", exc_info=True)
+    except OperationFailure as of:
+        enrich_logger.error(f"ERROR: MongoDB Operation Failure during enrichment. Details: {of}", exc_info=True)
+
+    elapsed = time.perf_counter() - start_time
+    missing = len(wanted_ids) - len(matched_ids)
+    enrich_logger.info(f"Scanned {cards_scanned} bulk data cards in {elapsed:.2f}s; matched {len(matched_ids)} Scryfall IDs "
+                       f"and updated {documents_updated} card documents.")
+    if missing:
+        enrich_logger.warning(f"{missing} Scryfall IDs were not in the bulk data file; their images will be fetched from the Scryfall API.")
+    return documents_updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store Scryfall card details from a bulk data file on the card documents.")
+    parser.add_argument('bulk_data_file', nargs='?', default=BULK_DATA_FILE_PATH,
+                        help=f"Scryfall bulk data JSON file (default: {BULK_DATA_FILE_PATH})")
+    args = parser.parse_args()
+
+    try:
+        client = MongoClient(MONGO_HOST_INGESTION, MONGO_PORT_INGESTION, serverSelectionTimeoutMS=5000)
+        client.admin.command('ping')
+    except ConnectionFailure as cf:
+        enrich_logger.error(f"ERROR: MongoDB Connection Failure. Is the Dockerized MongoDB server running and port "
+                            f"{MONGO_PORT_INGESTION} exposed on host? Details: {cf}")
+        sys.exit(1)
+    # Imported here, as ingest_data.py imports this module for its --bulk-data option
+    from ingest_data import bump_data_version
+    cards_collection = client[DB_NAME][COLLECTION_NAME]
+    if enrich_from_bulk_data(cards_collection, args.bulk_data_file):
+        bump_data_version(cards_collection)
+    client.close()
+    enrich_logger.info("MongoDB connection closed.")
@@ -1,9 +1,24 @@
 import pandas as pd
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import MongoClient, ReturnDocument, InsertOne, UpdateOne, ASCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import Counter
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
 import logging
 
+# Share the card search helpers with the catalog service, so the stored search fields
+# are computed exactly the way the service normalizes queries.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'card_catalog_service'))
+from services.card_search import build_search_fields, prepare_card_search
+from enrich_data import enrich_from_bulk_data
+from collection_stats import StatsDelta, STAT_SOURCE_FIELDS, update_stats, recompute_stats
+
 # Setup a logger for this ingestion script
 ingest_logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -14,16 +29,52 @@ ingest_logger.setLevel(logging.INFO)
 # IMPORTANT: When running this script directly on your host machine (not in Docker Compose),
 # you must connect to MongoDB via 'localhost' and the exposed port.
 # The 'mongodb' hostname is only resolvable within the Docker network.
-MONGO_HOST_INGESTION = 'localhost'
-MONGO_PORT_INGESTION = 27017
-DB_NAME = 'mtg_collection_db'
+MONGO_HOST_INGESTION = os.environ.get('MONGO_HOST', 'localhost')
+MONGO_PORT_INGESTION = int(os.environ.get('MONGO_PORT', 27017))
+DB_NAME = os.environ.get('MONGO_DB_NAME', 'mtg_collection_db')
 COLLECTION_NAME = 'cards'
+METADATA_COLLECTION_NAME = 'collection_metadata' # Data version stamp read by the catalog service
 
 # --- 2. Path to Your Magic: The Gathering CSV File ---
 # IMPORTANT: REPLACE THIS with the actual full path to your CSV file!
 # Example: CSV_FILE_PATH = '/Users/yourusername/Documents/my_mtg_collection.csv'
 CSV_FILE_PATH = 'ManaBox_Collection.csv'
 
+# --- 3. Streaming Ingestion Settings ---
+# The CSV is read and written in chunks of this many rows, so memory use stays flat
+# no matter how large the export is. Each chunk becomes one unordered bulk write.
+CSV_CHUNK_SIZE = 5000
+
+# ManaBox CSV column -> MongoDB document field
+CSV_COLUMN_MAP = {
+    'Binder Name': 'binder_name',
+    'Binder Type': 'binder_type',
+    'Name': 'name', # This is the primary card name
+    'Set code': 'set_code',
+    'Set name': 'set_name',
+    'Collector number': 'collector_number',
+    'Foil': 'foil',
+    'Rarity': 'rarity',
+    'Quantity': 'quantity',
+    'ManaBox ID': 'manabox_id',
+    'Scryfall ID': 'scryfall_id',
+    'Purchase price': 'purchase_price',
+    'Misprint': 'misprint',
+    'Altered': 'altered',
+    'Condition': 'condition',
+    'Language': 'language',
+    'Purchase price currency': 'purchase_price_currency'
+}
+
+# Every column is read as text, so identifiers keep their exact spelling (e.g. collector number '073')
+# and every chunk yields the same types; the fields below are then parsed explicitly.
+INTEGER_FIELDS = ('quantity',)
+DECIMAL_FIELDS = ('purchase_price',)
+BOOLEAN_FIELDS = ('misprint', 'altered')
+
+# Fields identifying a collection entry across re-ingests (see natural_key())
+NATURAL_KEY_FIELDS = ('manabox_id', 'foil', 'condition', 'language')
+
 def connect_to_mongodb_for_ingestion():
     """Connects to your local MongoDB server for data ingestion."""
     client = None
@@ -46,72 +97,269 @@ def connect_to_mongodb_for_ingestion():
         ingest_logger.error(f"ERROR: An unexpected error occurred during MongoDB connection for ingestion. Details: {e}", exc_info=True)
     return None, None
 
-def ingest_csv_data(cards_collection):
-    """Reads CSV and loads card data into MongoDB."""
-    if not os.path.exists(CSV_FILE_PATH):
-        ingest_logger.error(f"ERROR: CSV file not found at '{CSV_FILE_PATH}'. Please update the path.")
-        return
+def natural_key(card_doc: dict, occurrence: int = 1) -> str:
+    """
+    Identifies a collection entry across re-ingests: the same printing (ManaBox ID)
+    in the same finish, condition and language is the same entry.
+    ManaBox exports such a printing on several rows when e.g. its copies were bought at different
+    prices; the second and later rows are told apart by their occurrence in the file ('...|#2').
+    """
+    key = "|".join(str(card_doc.get(field, '')) for field in NATURAL_KEY_FIELDS)
+    return key if occurrence == 1 else f"{key}|#{occurrence}"
+
+def content_hash(card_doc: dict) -> str:
+    """
+    Hashes the CSV-derived fields of a document, to tell whether a row changed since the last sync.
+    Values are hashed with their JSON types ('12' and 12 differ), so documents must be typed the same
+    way no matter which chunk a row was read in (see prepare_chunk_documents).
+    """
+    canonical = json.dumps({field: card_doc[field] for field in CSV_COLUMN_MAP.values() if field in card_doc},
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+def _parse_numbers(column: pd.Series, field: str, first_row_number: int, integer: bool) -> pd.Series:
+    """Parses a text column into numbers; cells that aren't numbers (or whole numbers) are logged and left empty."""
+    numbers = pd.to_numeric(column, errors='coerce')
+    invalid = numbers.isna() & column.notna()
+    if integer:
+        invalid |= numbers.notna() & (numbers % 1 != 0)
+    for position in invalid.to_numpy().nonzero()[0]:
+        ingest_logger.warning(f"Ignoring invalid '{field}' value {column.iloc[position]!r} in row {first_row_number + position}.")
+    numbers = numbers.mask(invalid)
+    return numbers.astype('Int64') if integer else numbers
+
+def prepare_chunk_documents(chunk: pd.DataFrame, first_row_number: int, key_counts: Counter | None = None) -> list[dict]:
+    """
+    Maps one chunk of CSV rows to card documents, column-wise instead of row by row.
+    Rows without a card name are skipped; empty cells are left out of the documents.
+    key_counts counts the rows seen per natural key so far (across chunks), to number repeated keys.
+    """
+    if key_counts is None:
+        key_counts = Counter()
+    chunk = chunk.rename(columns=CSV_COLUMN_MAP)
+    chunk = chunk[[field for field in CSV_COLUMN_MAP.values() if field in chunk.columns]].copy()
+
+    for field in INTEGER_FIELDS + DECIMAL_FIELDS:
+        if field in chunk.columns:
+            chunk[field] = _parse_numbers(chunk[field], field, first_row_number, integer=field in INTEGER_FIELDS)
+    for field in BOOLEAN_FIELDS:
+        if field in chunk.columns:
+            chunk[field] = chunk[field].astype(str).str.strip().str.lower().map({'true': True, 'false': False})
+
+    # Ensure 'name' is present, or add more robust validation
+    missing_name = chunk['name'].isna() | (chunk['name'].astype(str).str.strip() == '')
+    if missing_name.any():
+        for position in missing_name.to_numpy().nonzero()[0]:
+            ingest_logger.warning(f"Skipping row {first_row_number + position} due to missing 'Name'.")
+        chunk = chunk[~missing_name]
+
+    # pandas' NaN isn't valid JSON; turn it into None so the empty cells can be dropped below
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    search_fields = chunk['name'].map(build_search_fields)
+
+    documents = []
+    for card_doc, card_search_fields in zip(chunk.to_dict('records'), search_fields):
+        # Remove any fields that might be None to keep documents cleaner
+        card_doc = {k: v for k, v in card_doc.items() if v is not None}
+        # Identity and change detection for incremental syncs
+        base_key = natural_key(card_doc)
+        key_counts[base_key] += 1
+        card_doc["natural_key"] = natural_key(card_doc, key_counts[base_key])
+        card_doc["content_hash"] = content_hash(card_doc)
+        # Add the normalized name fields used by the indexed search
+        card_doc.update(card_search_fields)
+        documents.append(card_doc)
+    return documents
+
+def insert_chunk(cards_collection, documents: list[dict], stats_delta: StatsDelta) -> Counter:
+    """Inserts one chunk of documents with an unordered bulk write."""
+    if not documents:
+        return Counter()
+    result = cards_collection.bulk_write([InsertOne(document) for document in documents], ordered=False)
+    for document in documents:
+        stats_delta.add(document)
+    return Counter(inserted=result.inserted_count)
+
+def sync_chunk(cards_collection, documents: list[dict], stats_delta: StatsDelta) -> Counter:
+    """
+    Upserts only the documents of one chunk that are new or whose content hash changed.
+    Unchanged rows cost one indexed lookup of their stored hash and no write.
+    Fields added to documents by later stages (e.g. enrichment) are left untouched.
+    Written rows are recorded in stats_delta (old values out, new values in).
+    """
+    if not documents:
+        return Counter()
+    keys = [document["natural_key"] for document in documents]
+    stored_docs = {
+        doc["natural_key"]: doc
+        for doc in cards_collection.find({"natural_key": {"$in": keys}},
+                                         ["natural_key", "content_hash"] + STAT_SOURCE_FIELDS)
+    }
+    stored_hashes = {key: doc.get("content_hash") for key, doc in stored_docs.items()}
+
+    stats = Counter()
+    operations = []
+    for document in documents:
+        key = document["natural_key"]
+        if key in stored_hashes and stored_hashes[key] == document["content_hash"]:
+            stats["unchanged"] += 1
+            continue
+        stats["updated" if key in stored_hashes else "inserted"] += 1
+        if key in stored_docs:
+            stats_delta.remove(stored_docs[key])
+        stats_delta.add(document)
+        update = {"$set": document}
+        # CSV cells that became empty have to be removed from the stored document as well
+        emptied_fields = {field: "" for field in CSV_COLUMN_MAP.values() if field not in document}
+        if emptied_fields:
+            update["$unset"] = emptied_fields
+        operations.append(UpdateOne({"natural_key": key}, update, upsert=True))
+
+    if operations:
+        cards_collection.bulk_write(operations, ordered=False)
+    return stats
+
+def ingest_csv_data(cards_collection, csv_file_path: str = CSV_FILE_PATH, chunk_size: int = CSV_CHUNK_SIZE,
+                    mode: str = 'sync', seen_keys: set | None = None, stats_delta: StatsDelta | None = None,
+                    key_counts: Counter | None = None) -> Counter:
+    """
+    Streams a CSV into MongoDB: reads it in chunks of chunk_size rows and writes each chunk
+    with an unordered bulk write on a background thread while the next chunk is parsed.
+    At most one chunk is being written and one parsed at a time, so memory use stays flat.
+
+    mode='sync' upserts new and changed rows only (see sync_chunk); mode='insert' inserts every row.
+    The natural keys of all rows read are added to seen_keys, for pruning removed rows afterwards,
+    and the changes to the collection statistics are accumulated in stats_delta.
+    key_counts numbers repeated natural keys (see natural_key()); share it when loading several files.
+    Returns counts of inserted/updated/unchanged documents ('failed_files' is set if the file couldn't be fully loaded).
+    """
+    stats = Counter()
+    if key_counts is None:
+        key_counts = Counter()
+    if not os.path.exists(csv_file_path):
+        ingest_logger.error(f"ERROR: CSV file not found at '{csv_file_path}'. Please update the path.")
+        stats['failed_files'] += 1
+        return stats
+
+    ingest_logger.info(f"\n--- Starting CSV Data Ingestion from '{csv_file_path}' (mode: {mode}) ---")
+    write_chunk = partial(sync_chunk if mode == 'sync' else insert_chunk,
+                          stats_delta=stats_delta if stats_delta is not None else StatsDelta())
+    start_time = time.perf_counter()
+    rows_read = 0
+    pending_write = None
 
-    ingest_logger.info(f"\n--- Starting CSV Data Ingestion from '{CSV_FILE_PATH}' ---")
     try:
-        df = pd.read_csv(CSV_FILE_PATH)
-        ingest_logger.info(f"Successfully loaded {len(df)} rows from CSV.")
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer") as writer:
+            with pd.read_csv(csv_file_path, chunksize=chunk_size, dtype=str) as reader:
+                for chunk in reader:
+                    if 'Name' not in chunk.columns:
+                        ingest_logger.error("ERROR: CSV file has no 'Name' column. Is this a ManaBox export?")
+                        stats['failed_files'] += 1
+                        break
+                    documents = prepare_chunk_documents(chunk, rows_read, key_counts)
+                    rows_read += len(chunk)
+                    if seen_keys is not None:
+                        seen_keys.update(document["natural_key"] for document in documents)
 
-        if df.empty:
+                    # Wait for the previous chunk's write before queueing this one
+                    if pending_write is not None:
+                        stats += pending_write.result()
+                    pending_write = writer.submit(write_chunk, cards_collection, documents)
+
+                    elapsed = time.perf_counter() - start_time
+                    ingest_logger.info(f"Progress: {rows_read} rows read, {sum(stats.values())} documents processed "
+                                       f"({rows_read / elapsed:.0f} rows/s).")
+            if pending_write is not None:
+                stats += pending_write.result()
+
+        elapsed = time.perf_counter() - start_time
+        if rows_read == 0:
             ingest_logger.warning("CSV file loaded successfully, but it appears to be empty or contains no data rows.")
-            return # Exit if DataFrame is empty
-
-        documents_to_insert = []
-        for index, row in df.iterrows():
-            card_doc = {
-                # Mapped all provided CSV keys to MongoDB document fields
-                "binder_name": row.get('Binder Name', None),
-                "binder_type": row.get('Binder Type', None),
-                "name": row.get('Name', 'Unknown Card Name'), # This is the primary card name
-                "set_code": row.get('Set code', None),
-                "set_name": row.get('Set name', None),
-                "collector_number": row.get('Collector number', None),
-                "foil": row.get('Foil', None),
-                "rarity": row.get('Rarity', None),
-                "quantity": row.get('Quantity', None),
-                "manabox_id": row.get('ManaBox ID', None),
-                "scryfall_id": row.get('Scryfall ID', None),
-                "purchase_price": row.get('Purchase price', None),
-                "misprint": row.get('Misprint', None),
-                "altered": row.get('Altered', None),
-                "condition": row.get('Condition', None),
-                "language": row.get('Language', None),
-                "purchase_price_currency": row.get('Purchase price currency', None)
-            }
-            
-            # Ensure at least 'name' is present, or add more robust validation
-            if not card_doc["name"] or card_doc["name"] == 'Unknown Card Name':
-                ingest_logger.warning(f"Skipping row {index} due to missing or unknown 'Name'. Row data: {row.to_dict()}")
-                continue # Skip this row if card name is missing
-
-            # Remove any fields that might be None to keep documents cleaner
-            card_doc = {k: v for k, v in card_doc.items() if v is not None}
-            documents_to_insert.append(card_doc)
-        
-        ingest_logger.info(f"Prepared {len(documents_to_insert)} documents for insertion after processing CSV rows.")
-
-        if documents_to_insert:
-            try:
-                result = cards_collection.insert_many(documents_to_insert)
-                ingest_logger.info(f"Successfully inserted {len(result.inserted_ids)} card documents into MongoDB. First 3 IDs: {result.inserted_ids[:3]}...")
-            except OperationFailure as of:
-                ingest_logger.error(f"ERROR: MongoDB Operation Failure during insert_many. Check database permissions or data integrity. Details: {of}", exc_info=True)
-            except Exception as e:
-                ingest_logger.error(f"ERROR: An unexpected error occurred during insert_many: {e}", exc_info=True)
-        else:
-            ingest_logger.info("No documents were prepared for insertion. Check your CSV and mapping logic.")
+            return stats
+        ingest_logger.info(f"Processed {rows_read} CSV rows in {elapsed:.2f}s ({rows_read / elapsed:.0f} rows/s): "
+                           f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged.")
 
     except pd.errors.EmptyDataError:
         ingest_logger.error("ERROR: The CSV file is empty.")
+        stats['failed_files'] += 1
     except pd.errors.ParserError as pe:
         ingest_logger.error(f"ERROR: Problem parsing CSV file: {pe}. Check CSV format (e.g., delimiters, quotes).")
+        stats['failed_files'] += 1
+    except BulkWriteError as bwe:
+        ingest_logger.error(f"ERROR: MongoDB bulk write failed. Check database permissions or data integrity. Details: {bwe.details}", exc_info=True)
+        stats['failed_files'] += 1
+    except OperationFailure as of:
+        ingest_logger.error(f"ERROR: MongoDB Operation Failure during bulk write. Check database permissions or data integrity. Details: {of}", exc_info=True)
+        stats['failed_files'] += 1
     except Exception as e:
         ingest_logger.error(f"An unexpected error occurred during CSV ingestion: {e}", exc_info=True)
+        stats['failed_files'] += 1
+    return stats
+
+def ensure_sync_indexes(cards_collection):
+    """
+    Creates the natural key index used to look up stored hashes and upsert rows.
+    It isn't unique, because collections built with the old insert-only ingestion may contain duplicates.
+    """
+    cards_collection.create_index([("natural_key", ASCENDING)], name="natural_key_1")
+
+def adopt_legacy_documents(cards_collection) -> int:
+    """
+    Gives documents written by the old insert-only ingestion, which have no natural key, their
+    natural key and content hash, so the first sync matches them instead of inserting a second
+    copy of every card. Repeated keys are numbered in insertion order, like repeated CSV rows,
+    after any documents that already have the key.
+    Returns the number of documents adopted.
+    """
+    legacy_docs = sorted(cards_collection.find({"natural_key": {"$exists": False}}, list(CSV_COLUMN_MAP.values())),
+                         key=lambda doc: doc["_id"])
+    if not legacy_docs:
+        return 0
+    key_counts = Counter(doc["natural_key"].split("|#")[0]
+                         for doc in cards_collection.find({"natural_key": {"$exists": True}}, ["natural_key"]))
+    operations = []
+    for doc in legacy_docs:
+        base_key = natural_key(doc)
+        key_counts[base_key] += 1
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"natural_key": natural_key(doc, key_counts[base_key]),
+                                                                   "content_hash": content_hash(doc)}}))
+    for start in range(0, len(operations), CSV_CHUNK_SIZE):
+        cards_collection.bulk_write(operations[start:start + CSV_CHUNK_SIZE], ordered=False)
+    ingest_logger.info(f"Adopted {len(legacy_docs)} documents from an earlier insert-only ingestion for syncing.")
+    return len(legacy_docs)
+
+def prune_removed_cards(cards_collection, seen_keys: set, stats_delta: StatsDelta) -> int:
+    """
+    Deletes documents whose natural key wasn't in any of the ingested CSVs, including
+    documents from the old insert-only ingestion that have no natural key at all.
+    Returns the number of documents deleted.
+    """
+    removed_keys = []
+    for doc in cards_collection.find({}, ["natural_key"] + STAT_SOURCE_FIELDS):
+        if doc.get("natural_key") not in seen_keys:
+            stats_delta.remove(doc)
+            if doc.get("natural_key") is not None:
+                removed_keys.append(doc["natural_key"])
+    deleted = 0
+    for start in range(0, len(removed_keys), CSV_CHUNK_SIZE):
+        deleted += cards_collection.delete_many({"natural_key": {"$in": removed_keys[start:start + CSV_CHUNK_SIZE]}}).deleted_count
+    deleted += cards_collection.delete_many({"natural_key": {"$exists": False}}).deleted_count
+    ingest_logger.info(f"Pruned {deleted} documents that are no longer in the CSV.")
+    return deleted
+
+def bump_data_version(cards_collection):
+    """
+    Increments the data version of the cards collection, telling the catalog service
+    that its in-memory indexes and caches are out of date.
+    """
+    metadata_collection = cards_collection.database[METADATA_COLLECTION_NAME]
+    metadata = metadata_collection.find_one_and_update(
+        {"_id": COLLECTION_NAME},
+        {"$inc": {"data_version": 1}, "$currentDate": {"updated_at": True}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    ingest_logger.info(f"Collection data version is now {metadata['data_version']}.")
 
 def verify_ingestion(cards_collection):
     """Checks if data was loaded correctly into MongoDB."""
@@ -127,6 +375,22 @@ def verify_ingestion(cards_collection):
         ingest_logger.warning("No cards found in the collection. Ingestion might have failed.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load ManaBox CSV exports into MongoDB.")
+    parser.add_argument('csv_files', nargs='*', default=[CSV_FILE_PATH],
+                        help=f"ManaBox CSV exports to load (default: {CSV_FILE_PATH})")
+    parser.add_argument('--chunk-size', type=int, default=CSV_CHUNK_SIZE,
+                        help=f"Rows per chunk / bulk write (default: {CSV_CHUNK_SIZE})")
+    parser.add_argument('--mode', choices=('sync', 'insert'), default='sync',
+                        help="'sync' (default) upserts only new or changed rows and can be re-run safely; "
+                             "'insert' inserts every row, as older versions of this script did")
+    parser.add_argument('--prune', action='store_true',
+                        help="In sync mode, delete cards that are no longer in the given CSV files")
+    parser.add_argument('--recompute-stats', action='store_true',
+                        help="Rebuild the collection statistics from scratch and report any bucket the incremental updates got wrong")
+    parser.add_argument('--bulk-data', metavar='JSON_FILE',
+                        help="Scryfall bulk data file (e.g. default-cards.json) to store images and card details from")
+    args = parser.parse_args()
+
     ingest_logger.info("Starting ingestion script...")
     client, cards_collection = connect_to_mongodb_for_ingestion()
     if client is not None and cards_collection is not None:
@@ -135,9 +399,48 @@ if __name__ == "__main__":
         #cards_collection.delete_many({})
         #ingest_logger.info("Collection cleared.")
 
-        ingest_csv_data(cards_collection)
+        ensure_sync_indexes(cards_collection)
+        if args.mode == 'sync':
+            # Collections loaded by older versions of this script (e.g. the MongoDB image's dump) have no natural keys
+            adopt_legacy_documents(cards_collection)
+        seen_keys = set()
+        key_counts = Counter()
+        stats_delta = StatsDelta()
+        total_stats = Counter()
+        for csv_file in args.csv_files:
+            total_stats += ingest_csv_data(cards_collection, csv_file, args.chunk_size, args.mode, seen_keys, stats_delta,
+                                           key_counts)
+        if args.prune and args.mode == 'sync':
+            if total_stats['failed_files']:
+                # An incomplete read would make every unread card look removed
+                ingest_logger.warning("Skipping prune because not every CSV file was loaded completely.")
+            else:
+                total_stats['deleted'] = prune_removed_cards(cards_collection, seen_keys, stats_delta)
+        if args.bulk_data:
+            total_stats['enriched'] = enrich_from_bulk_data(cards_collection, args.bulk_data)
+        # Keep the /api/stats summaries in step with the cards
+        if args.recompute_stats:
+            total_stats['stats_mismatches'] = recompute_stats(cards_collection, verify=True)
+        else:
+            update_stats(cards_collection, stats_delta)
+        # Backfill search fields (e.g. on adopted legacy documents) and create the search indexes,
+        # so the catalog service doesn't have to
+        search_ready = prepare_card_search(cards_collection)
+        # Only tell the catalog service to refresh if something actually changed
+        if (total_stats['inserted'] or total_stats['updated'] or total_stats['deleted']
+                or total_stats['enriched'] or total_stats['stats_mismatches']):
+            bump_data_version(cards_collection)
+        else:
+            ingest_logger.info("No changes; collection data version left as is.")
         verify_ingestion(cards_collection)
         client.close()
         ingest_logger.info("MongoDB connection closed.")
+        if total_stats['failed_files']:
+            ingest_logger.error(f"{total_stats['failed_files']} CSV file(s) could not be loaded completely; see the errors above.")
+            sys.exit(1)
+        if not search_ready:
+            ingest_logger.error("The search fields/indexes could not be prepared; see the errors above.")
+            sys.exit(1)
     else:
-        ingest_logger.error("Failed to establish MongoDB connection. Cannot proceed with ingestion.")
\ No newline at end of file
+        ingest_logger.error("Failed to establish MongoDB connection. Cannot proceed with ingestion.")
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from pymongo import InsertOne, UpdateOne, UpdateMany
+
+# The ingestion scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ManaBox_Collection.csv')
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(document, alternative) for alternative in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$exists" in condition and (field in document) != condition["$exists"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+class InMemoryCollection:
+    """
+    The small part of the PyMongo collection API the ingestion scripts use, kept in a list:
+    find/count/delete with equality, $in, $ne, $exists and $or filters, and bulk writes.
+    """
+
+    def __init__(self):
+        self.documents = []
+        self._next_id = 1
+
+    def _insert(self, document: dict):
+        document = dict(document)
+        document.setdefault("_id", self._next_id)
+        self._next_id += 1
+        self.documents.append(document)
+
+    def insert_many(self, documents: list[dict]):
+        for document in documents:
+            self._insert(document)
+
+    def find(self, query: dict | None = None, projection=None):
+        query = {field: {**condition, "$in": set(condition["$in"])} if isinstance(condition, dict) and "$in" in condition else condition
+                 for field, condition in (query or {}).items()}
+        found = [dict(document) for document in self.documents if _matches(document, query)]
+        if projection is not None:
+            fields = set(projection) | {"_id"}
+            found = [{field: value for field, value in document.items() if field in fields} for document in found]
+        return found
+
+    def distinct(self, field: str) -> list:
+        return list({document[field] for document in self.documents if field in document})
+
+    def count_documents(self, query: dict) -> int:
+        return len(self.find(query))
+
+    def delete_many(self, query: dict):
+        kept = [document for document in self.documents if not _matches(document, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def _update(self, query: dict, update: dict, upsert: bool, many: bool) -> int:
+        modified = 0
+        for document in self.documents:
+            if not _matches(document, query):
+                continue
+            before = dict(document)
+            document.update(update.get("$set", {}))
+            for field in update.get("$unset", {}):
+                document.pop(field, None)
+            modified += document != before
+            if not many:
+                return modified
+        if upsert and not any(_matches(document, query) for document in self.documents):
+            self._insert({**{field: value for field, value in query.items() if not isinstance(value, dict)},
+                          **update.get("$set", {})})
+        return modified
+
+    def bulk_write(self, operations: list, ordered: bool = True):
+        inserted = modified = 0
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+                inserted += 1
+            elif isinstance(operation, (UpdateOne, UpdateMany)):
+                modified += self._update(operation._filter, operation._doc, operation._upsert, isinstance(operation, UpdateMany))
+            else:
+                raise NotImplementedError(type(operation).__name__)
+        return SimpleNamespace(inserted_count=inserted, modified_count=modified)
+
+@pytest.fixture
+def cards_collection():
+    return InMemoryCollection()
+
+@pytest.fixture
+def sample_csv(tmp_path):
+    """The header and first rows of the repository's ManaBox export."""
+    with open(CSV_PATH, encoding='utf-8') as csv_file:
+        lines = csv_file.readlines()[:6]
+    path = tmp_path / "sample.csv"
+    path.write_text("".join(lines), encoding='utf-8')
+    return str(path)
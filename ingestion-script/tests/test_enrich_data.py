@@ -0,0 +1,34 @@
+import json
+
+from enrich_data import enrich_from_bulk_data
+
+BULK_CARDS = [
+    {"id": "85004079-f9fa-4a05-904d-a77782c4165c", "name": "Rhys the Exiled", "type_line": "Legendary Creature — Elf Warrior",
+     "image_uris": {"normal": "https://cards.scryfall.io/normal/front/8/5/85004079.jpg"}},
+    {"id": "3185a67e-648c-48a8-9aad-180e1ca0f4ae", "name": "Bounty of Skemfar", "type_line": "Sorcery",
+     "image_uris": {"normal": "https://cards.scryfall.io/normal/front/3/1/3185a67e.jpg"}},
+    {"id": "00000000-0000-0000-0000-000000000000", "name": "Not In The Collection"},
+]
+
+def _write_bulk_data(tmp_path, cards) -> str:
+    path = tmp_path / "default-cards.json"
+    path.write_text(json.dumps(cards), encoding='utf-8')
+    return str(path)
+
+def test_enrichment_only_counts_changed_documents(cards_collection, tmp_path):
+    cards_collection.insert_many([
+        {"name": "Rhys the Exiled", "scryfall_id": BULK_CARDS[0]["id"]},
+        {"name": "Rhys the Exiled", "scryfall_id": BULK_CARDS[0]["id"], "foil": "foil"},
+        {"name": "Bounty of Skemfar", "scryfall_id": BULK_CARDS[1]["id"]},
+    ])
+    bulk_data = _write_bulk_data(tmp_path, BULK_CARDS)
+    assert enrich_from_bulk_data(cards_collection, bulk_data) == 3
+    assert cards_collection.documents[0]["image_url"] == BULK_CARDS[0]["image_uris"]["normal"]
+    enriched_at = cards_collection.documents[0]["enriched_at"]
+
+    # The same dump again changes nothing, so the data version doesn't have to be bumped
+    assert enrich_from_bulk_data(cards_collection, bulk_data) == 0
+    assert cards_collection.documents[0]["enriched_at"] == enriched_at
+
+    changed = [dict(BULK_CARDS[0], type_line="Legendary Creature — Elf Druid")] + BULK_CARDS[1:]
+    assert enrich_from_bulk_data(cards_collection, _write_bulk_data(tmp_path, changed)) == 2
@@ -0,0 +1,112 @@
+import os
+from collections import Counter
+
+import ingest_data
+from collection_stats import StatsDelta
+
+# The repository's ManaBox export (the sample_csv fixture holds its first rows)
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(ingest_data.__file__)), 'ManaBox_Collection.csv')
+
+def test_prepare_chunk_documents_maps_csv_columns(sample_csv):
+    import pandas as pd
+    documents = ingest_data.prepare_chunk_documents(pd.read_csv(sample_csv, dtype=str), 0)
+    assert len(documents) == 5
+    first = documents[0]
+    assert first["name"] == "Rhys the Exiled"
+    assert first["set_code"] == "KHC"
+    assert first["collector_number"] == "73"
+    assert first["quantity"] == 1
+    assert first["purchase_price"] == 0.71
+    assert first["misprint"] is False
+    assert first["natural_key"] == "57241|normal|near_mint|en"
+    assert first["name_normalized"] == "rhys the exiled"
+    assert "Name" not in first
+
+def test_every_chunk_stores_the_same_field_types(cards_collection):
+    ingest_data.ingest_csv_data(cards_collection, CSV_PATH, chunk_size=500, mode='insert')
+    field_types = {}
+    for document in cards_collection.documents:
+        for field in ingest_data.CSV_COLUMN_MAP.values():
+            if field in document:
+                field_types.setdefault(field, set()).add(type(document[field]))
+    assert field_types['collector_number'] == {str}
+    assert field_types['manabox_id'] == {str}
+    assert field_types['quantity'] == {int}
+    assert field_types['purchase_price'] == {float}
+    assert all(len(types) == 1 for types in field_types.values())
+
+def test_insert_mode_writes_every_row(cards_collection, sample_csv):
+    stats = ingest_data.ingest_csv_data(cards_collection, sample_csv, chunk_size=2, mode='insert')
+    assert stats == Counter(inserted=5)
+    assert len(cards_collection.documents) == 5
+
+def test_sync_mode_writes_new_rows_then_nothing(cards_collection, sample_csv):
+    stats = ingest_data.ingest_csv_data(cards_collection, sample_csv, chunk_size=2)
+    assert stats == Counter(inserted=5)
+    stats = ingest_data.ingest_csv_data(cards_collection, sample_csv, chunk_size=2)
+    assert stats == Counter(unchanged=5)
+    assert len(cards_collection.documents) == 5
+
+def test_missing_file_is_reported_as_failed(cards_collection, tmp_path):
+    stats = ingest_data.ingest_csv_data(cards_collection, str(tmp_path / "missing.csv"), stats_delta=StatsDelta())
+    assert stats['failed_files'] == 1
+
+def _csv_quantity_total() -> int:
+    import csv
+    with open(CSV_PATH, newline='', encoding='utf-8') as csv_file:
+        return sum(int(row['Quantity']) for row in csv.DictReader(csv_file))
+
+def test_resync_of_full_export_is_idempotent(cards_collection):
+    # The export repeats some natural keys (same printing bought at different prices)
+    first = ingest_data.ingest_csv_data(cards_collection, CSV_PATH, chunk_size=500)
+    rows = first['inserted']
+    assert len({document["natural_key"] for document in cards_collection.documents}) == rows
+    assert sum(document["quantity"] for document in cards_collection.documents) == _csv_quantity_total()
+
+    for _ in range(2):
+        stats = ingest_data.ingest_csv_data(cards_collection, CSV_PATH, chunk_size=500)
+        assert stats == Counter(unchanged=rows)
+    assert len(cards_collection.documents) == rows
+
+def test_repeated_keys_are_numbered_across_chunks(cards_collection, tmp_path):
+    with open(CSV_PATH, encoding='utf-8') as csv_file:
+        header, row = csv_file.readline(), csv_file.readline()
+    path = tmp_path / "repeated.csv"
+    path.write_text(header + row * 3, encoding='utf-8')
+    stats_delta = StatsDelta()
+    stats = ingest_data.ingest_csv_data(cards_collection, str(path), chunk_size=2, stats_delta=stats_delta)
+    assert stats == Counter(inserted=3)
+    assert sorted(document["natural_key"] for document in cards_collection.documents) == [
+        "57241|normal|near_mint|en", "57241|normal|near_mint|en|#2", "57241|normal|near_mint|en|#3"]
+    assert stats_delta._changes[('total', 'all')][0] == 3
+
+def test_first_sync_adopts_legacy_documents(cards_collection, sample_csv):
+    # Documents as written by the old insert-only ingestion: no natural key or content hash
+    ingest_data.ingest_csv_data(cards_collection, sample_csv, mode='insert')
+    for document in cards_collection.documents:
+        del document["natural_key"], document["content_hash"]
+
+    assert ingest_data.adopt_legacy_documents(cards_collection) == 5
+    stats = ingest_data.ingest_csv_data(cards_collection, sample_csv)
+    assert stats == Counter(unchanged=5)
+    assert len(cards_collection.documents) == 5
+    assert ingest_data.adopt_legacy_documents(cards_collection) == 0
+
+def test_resync_of_reordered_export_updates_nothing(cards_collection, tmp_path):
+    # Rows land in different chunks than before, so any type inferred per chunk would change their hashes
+    import csv
+    with open(CSV_PATH, newline='', encoding='utf-8') as csv_file:
+        reader = csv.DictReader(csv_file)
+        fieldnames, rows = reader.fieldnames, list(reader)
+    # A stable sort keeps rows that repeat a natural key in file order, so their numbering is unchanged
+    reordered = sorted(rows, key=lambda row: row['Name'], reverse=True)
+    assert reordered != rows
+    path = tmp_path / "reordered.csv"
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames)
+        writer.writeheader()
+        writer.writerows(reordered)
+
+    ingest_data.ingest_csv_data(cards_collection, CSV_PATH, chunk_size=500)
+    stats = ingest_data.ingest_csv_data(cards_collection, str(path), chunk_size=500)
+    assert stats == Counter(unchanged=len(rows))